@@ -0,0 +1,77 @@
+from settings import AUTOSAVE_DEBOUNCE
+from storage import atomic_write
+
+import os
+import threading
+import time
+
+
+class AutosaveWorker(threading.Thread):
+    # Writes files off the UI thread. Each schedule() pushes the write back by
+    # the debounce window, so a burst of edits ends in a single write.
+    def __init__(self, debounce=AUTOSAVE_DEBOUNCE):
+        super().__init__(daemon=True)
+        self.debounce = debounce
+        self.condition = threading.Condition()
+        # Target file -> callable returning the data to write
+        self.pending = {}
+        self.deadline = 0
+        self.stopped = False
+        self.writing = False
+        # (target file, exception) for failed writes, until take_errors()
+        self.errors = []
+
+    def schedule(self, target_file, serialize):
+        with self.condition:
+            self.pending[target_file] = serialize
+            self.deadline = time.monotonic() + self.debounce
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and (
+                    not self.pending or time.monotonic() < self.deadline
+                ):
+                    if self.pending:
+                        self.condition.wait(self.deadline - time.monotonic())
+                    else:
+                        self.condition.wait()
+                if not self.pending:
+                    return
+                pending = self.pending
+                self.pending = {}
+                self.writing = True
+
+            # Serialising here can race an edit on the UI thread, but that edit
+            # schedules another write, so the last write is always consistent
+            errors = []
+            for target_file, serialize in pending.items():
+                try:
+                    os.makedirs(os.path.dirname(target_file), exist_ok=True)
+                    atomic_write(target_file, serialize())
+                except Exception as e:
+                    errors.append((target_file, e))
+            with self.condition:
+                self.errors += errors
+                self.writing = False
+
+    def busy(self):
+        # Whether writes are waiting or under way, check before take_errors()
+        # so no error of a finished write is missed
+        with self.condition:
+            return self.writing or bool(self.pending)
+
+    def take_errors(self):
+        with self.condition:
+            errors = self.errors
+            self.errors = []
+        return errors
+
+    def stop(self, flush=True):
+        with self.condition:
+            self.stopped = True
+            if not flush:
+                self.pending = {}
+            self.condition.notify()
+        self.join()
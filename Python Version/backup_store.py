@@ -0,0 +1,232 @@
+from settings import (
+    BACKUP_CHUNK_ENTRIES,
+    BACKUP_KEEP_LAST,
+    BACKUP_KEEP_DAILY,
+    BACKUP_KEEP_WEEKLY,
+)
+from storage import atomic_write
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+# Entries in saved ledgers and lineups are separated by this
+ENTRY_SEPARATOR = "}, {"
+TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+# Backups run on task threads, every store on a directory shares its lock
+STORE_LOCKS = {}
+STORE_LOCKS_GUARD = threading.Lock()
+
+
+def store_lock(backup_dir):
+    with STORE_LOCKS_GUARD:
+        return STORE_LOCKS.setdefault(os.path.abspath(backup_dir), threading.RLock())
+
+
+def write_object(object_path, data):
+    # Existing objects are trusted, so never leave a partial one. The temp
+    # file is unique, concurrent writers of the same chunk both succeed.
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(object_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, object_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def split_chunks(data, chunk_entries=BACKUP_CHUNK_ENTRIES):
+    # Cut after entries whose checksum lands on a boundary. Boundaries only
+    # depend on the entry before them, so an edit changes the chunk holding it
+    # and every other chunk is shared with the previous version.
+    chunks = []
+    chunk_start = 0
+    entry_start = 0
+    while True:
+        separator = data.find(ENTRY_SEPARATOR, entry_start)
+        if separator == -1:
+            break
+        entry_end = separator + len(ENTRY_SEPARATOR) - 1
+        entry = data[entry_start:entry_end]
+        if zlib.crc32(entry.encode("utf-8")) % chunk_entries == 0:
+            chunks.append(data[chunk_start:entry_end])
+            chunk_start = entry_end
+        entry_start = entry_end
+    chunks.append(data[chunk_start:])
+    return chunks
+
+
+class BackupStore:
+    # Versions of saved files, stored as compressed chunks named by their hash
+    # so identical payloads and unchanged parts of a file are only kept once
+    def __init__(self, backup_dir):
+        self.backup_dir = backup_dir
+        self.objects_dir = os.path.join(backup_dir, "objects")
+        self.versions_dir = os.path.join(backup_dir, "versions")
+        # Held across add, prune and garbage collection, so no chunk is
+        # collected between being written and being listed in a manifest
+        self.lock = store_lock(backup_dir)
+
+    def add(self, name, data, timestamp=None):
+        # Store a version of name, returning its id. Saving the same payload
+        # as the latest version of name only returns that version. Binary
+        # data is kept as a single chunk.
+        with self.lock:
+            binary = isinstance(data, bytes)
+            payload_hash = hashlib.sha256(data if binary else data.encode("utf-8")).hexdigest()
+            versions = self.list_versions(name)
+            if versions and self.read_manifest(versions[-1])["hash"] == payload_hash:
+                return versions[-1]
+
+            os.makedirs(self.objects_dir, exist_ok=True)
+            os.makedirs(self.versions_dir, exist_ok=True)
+            chunk_hashes = []
+            for chunk in [data] if binary else split_chunks(data):
+                chunk_bytes = chunk if binary else chunk.encode("utf-8")
+                chunk_hash = hashlib.sha256(chunk_bytes).hexdigest()
+                object_path = os.path.join(self.objects_dir, chunk_hash)
+                if not os.path.exists(object_path):
+                    write_object(object_path, zlib.compress(chunk_bytes))
+                chunk_hashes.append(chunk_hash)
+
+            timestamp = time.time() if timestamp is None else timestamp
+            stamp = time.strftime(TIME_FORMAT, time.localtime(timestamp))
+            sequence = 1
+            while os.path.exists(self.manifest_path(f"{stamp}-{sequence}-{name}")):
+                sequence += 1
+            version_id = f"{stamp}-{sequence}-{name}"
+            manifest = {
+                "name": name,
+                "time": timestamp,
+                "hash": payload_hash,
+                "chunks": chunk_hashes,
+                "binary": binary,
+            }
+            atomic_write(self.manifest_path(version_id), json.dumps(manifest))
+            return version_id
+
+    def manifest_path(self, version_id):
+        return os.path.join(self.versions_dir, version_id + ".json")
+
+    def read_manifest(self, version_id):
+        with open(self.manifest_path(version_id), "r") as f:
+            return json.load(f)
+
+    def list_versions(self, name=None):
+        # Oldest first, only reads the directory listing
+        if not os.path.isdir(self.versions_dir):
+            return []
+        versions = []
+        for file_name in os.listdir(self.versions_dir):
+            if not file_name.endswith(".json"):
+                continue
+            version_id = file_name[: -len(".json")]
+            if name is None or self.version_name(version_id) == name:
+                versions.append(version_id)
+        versions.sort(key=lambda version_id: self.parse_version(version_id)[:2])
+        return versions
+
+    def parse_version(self, version_id):
+        # Ids are <date>-<time>-<sequence within that second>-<file name>
+        sequence, name = version_id[16:].split("-", 1)
+        return version_id[:15], int(sequence), name
+
+    def version_name(self, version_id):
+        return self.parse_version(version_id)[2]
+
+    def version_time(self, version_id):
+        return time.mktime(time.strptime(version_id[:15], TIME_FORMAT))
+
+    def restore(self, version_id):
+        manifest = self.read_manifest(version_id)
+        chunks = []
+        for chunk_hash in manifest["chunks"]:
+            with open(os.path.join(self.objects_dir, chunk_hash), "rb") as f:
+                chunks.append(zlib.decompress(f.read()))
+        data = b"".join(chunks)
+        if hashlib.sha256(data).hexdigest() != manifest["hash"]:
+            raise Exception(f"Backup {version_id} is corrupted")
+        if manifest.get("binary"):
+            return data
+        return data.decode("utf-8")
+
+    def restore_to(self, version_id, target_file):
+        atomic_write(target_file, self.restore(version_id))
+
+    def prune(
+        self,
+        keep_last=BACKUP_KEEP_LAST,
+        keep_daily=BACKUP_KEEP_DAILY,
+        keep_weekly=BACKUP_KEEP_WEEKLY,
+    ):
+        # Per file name keep the newest keep_last versions, plus the newest
+        # version of each of the last keep_daily days and keep_weekly weeks,
+        # then drop chunks no remaining version uses
+        with self.lock:
+            names = {}
+            for version_id in self.list_versions():
+                names.setdefault(self.version_name(version_id), []).append(version_id)
+
+            removed = []
+            for versions in names.values():
+                versions.reverse()
+                keep = set(versions[:keep_last])
+                days = []
+                weeks = []
+                for version_id in versions:
+                    day = version_id[:8]
+                    week = time.strftime(
+                        "%G-%V", time.localtime(self.version_time(version_id))
+                    )
+                    if day not in days and len(days) < keep_daily:
+                        days.append(day)
+                        keep.add(version_id)
+                    if week not in weeks and len(weeks) < keep_weekly:
+                        weeks.append(week)
+                        keep.add(version_id)
+                for version_id in versions:
+                    if version_id not in keep:
+                        os.remove(self.manifest_path(version_id))
+                        removed.append(version_id)
+
+            if removed:
+                self.collect_garbage()
+            return removed
+
+    def collect_garbage(self):
+        with self.lock:
+            used = set()
+            for version_id in self.list_versions():
+                used.update(self.read_manifest(version_id)["chunks"])
+            for chunk_hash in os.listdir(self.objects_dir):
+                if chunk_hash not in used:
+                    os.remove(os.path.join(self.objects_dir, chunk_hash))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List or restore backups")
+    parser.add_argument("backup_dir", help="e.g. ledgers_backup or lineup_backup")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    list_parser = subparsers.add_parser("list")
+    list_parser.add_argument("name", nargs="?")
+    restore_parser = subparsers.add_parser("restore")
+    restore_parser.add_argument("version")
+    restore_parser.add_argument("target_file")
+    args = parser.parse_args()
+
+    store = BackupStore(args.backup_dir)
+    if args.command == "list":
+        for version_id in store.list_versions(args.name):
+            print(version_id)
+    else:
+        store.restore_to(args.version, args.target_file)
@@ -0,0 +1,545 @@
+# Timing helpers for the slow paths of the assistant.
+# Usage: python benchmark.py <benchmark> [args]
+from media_probe import PROBE_BACKENDS
+from ledger import Ledger, splice_json
+from lineup import Lineup
+from lineup_dj import LineupDJ
+from ledger_dj import LedgerDJ
+from ledger_promo import LedgerPromo
+from storage import atomic_write
+from ledger_journal import LedgerJournal
+from loaders import load_ledger, load_lineup
+from ledger_sqlite import SqliteLedger
+from ledger_stream import stream_ledger
+from schema import validate_ledger
+from ledger_index import sort_key, sort_by
+from container_probe import make_info
+from media_probe import ProbeCache, PROBE_CACHE_VERSION
+from session_snapshot import (
+    file_stamp,
+    save_snapshot,
+    load_snapshot,
+    restore_ledger,
+    restore_lineup,
+    restore_probe_entries,
+)
+
+import argparse
+from functools import partial
+import json
+import math
+import os
+import tempfile
+import time
+import tracemalloc
+
+
+def timed(func, *args, repeat=1):
+    # Best of repeat runs, in milliseconds, with the last result
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_probe(args):
+    # Header parsing against a full OpenCV open for the same files
+    totals = {backend: 0.0 for backend in PROBE_BACKENDS}
+    for path in args.files:
+        print(path)
+        for backend, probe in PROBE_BACKENDS.items():
+            elapsed, info = timed(probe, path, repeat=args.repeat)
+            totals[backend] += elapsed
+            print(f"  {backend:>8}: {elapsed:9.2f} ms  {info}")
+    for backend, total in totals.items():
+        print(f"{backend:>10} total: {total:9.2f} ms")
+
+
+def linear_has_dj(dj_entries, dj_name):
+    # The scan Lineup.has_dj used before it kept a name index
+    for dj_entry in dj_entries:
+        if dj_name == dj_entry.name:
+            return dj_entry
+
+
+def bench_lineup(args):
+    # Name lookups on the last entry, where a scan is slowest
+    for size in args.sizes:
+        lineup = Lineup([], [], Ledger())
+        for i in range(size):
+            lineup.add_dj(f"dj-{i}")
+        last_name = f"dj-{size - 1}"
+        lookups = args.lookups
+
+        def indexed():
+            for _ in range(lookups):
+                lineup.update_dj(last_name, True)
+
+        def scanned():
+            for _ in range(lookups):
+                found_dj = linear_has_dj(lineup.dj_entries, last_name)
+                lineup.dj_entries[lineup.dj_entries.index(found_dj)].is_live = True
+
+        indexed_ms, _ = timed(indexed, repeat=args.repeat)
+        scanned_ms, _ = timed(scanned, repeat=args.repeat)
+        print(
+            f"{size:>7} entries: indexed {indexed_ms / lookups * 1000:10.2f} us/update,"
+            f" scan {scanned_ms / lookups * 1000:10.2f} us/update"
+        )
+
+
+def make_ledger_data(size):
+    # Synthetic ledger, one promo per ten djs
+    return {
+        "djs": [
+            {
+                "name": f"dj-{i}",
+                "logo_path": f"C:/hijack/logos/dj-{i}.png",
+                "recording_path": f"C:/hijack/recordings/dj-{i}.mp4" if i % 2 else "",
+                "rtmp_server": "us-east" if i % 2 else "",
+                "stream_key": f"key-{i}" if i % 2 else "",
+                "last_live_resolution": [1920, 1080] if i % 2 else "",
+            }
+            for i in range(size)
+        ],
+        "promos": [
+            {"name": f"promo-{i}", "path": f"C:/hijack/promos/promo-{i}.mp4"}
+            for i in range(size // 10)
+        ],
+    }
+
+
+def measure_records(data, dj_class, promo_class, entry_factory):
+    # Peak traced memory of the records alone, excluding the source data
+    tracemalloc.start()
+    djs = [
+        dj_class(
+            dj_entry["name"],
+            dj_entry["logo_path"],
+            dj_entry["recording_path"],
+            dj_entry["rtmp_server"],
+            dj_entry["stream_key"],
+            dj_entry["last_live_resolution"],
+        )
+        for dj_entry in data["djs"]
+    ]
+    promos = [promo_class(promo["name"], promo["path"]) for promo in data["promos"]]
+    entries = [entry_factory(dj_entry["name"], False) for dj_entry in data["djs"]]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del djs, promos, entries
+    return size
+
+
+def bench_memory(args):
+    # Slotted records against the same fields on dict-backed objects
+    data = make_ledger_data(args.size)
+    DictLedgerDJ = type("DictLedgerDJ", (), {"__init__": LedgerDJ.__init__})
+    DictLedgerPromo = type("DictLedgerPromo", (), {"__init__": LedgerPromo.__init__})
+
+    before = measure_records(
+        data, DictLedgerDJ, DictLedgerPromo, lambda name, is_live: [name, is_live]
+    )
+    after = measure_records(data, LedgerDJ, LedgerPromo, LineupDJ)
+    print(f"{args.size} djs, {args.size // 10} promos, {args.size} lineup entries")
+    print(f"  dict-backed: {before / 1024 / 1024:8.2f} MiB")
+    print(f"  slotted:     {after / 1024 / 1024:8.2f} MiB")
+
+
+def naive_validate_ledger(data):
+    # Field by field checks with every path built up front, what loaders
+    # did before schema.py
+    errors = []
+    for key, fields in (
+        ("djs", ("logo_path", "recording_path", "rtmp_server", "stream_key")),
+        ("promos", ("path",)),
+    ):
+        entries = data.get(key)
+        if not isinstance(entries, list):
+            errors.append(f"$.{key}: expected array")
+            continue
+        names = set()
+        for index, entry in enumerate(entries):
+            path = f"$.{key}[{index}]"
+            if not isinstance(entry, dict):
+                errors.append(f"{path}: expected object")
+                continue
+            name = entry.get("name")
+            if not isinstance(name, str) or not name:
+                errors.append(f"{path}.name: expected string")
+            elif name in names:
+                errors.append(f"{path}.name: duplicate name")
+            names.add(name)
+            for field in fields:
+                if field in entry and not isinstance(entry[field], (str, type(None))):
+                    errors.append(f"{path}.{field}: expected string or null")
+            resolution = entry.get("last_live_resolution")
+            if isinstance(resolution, list) and (
+                len(resolution) != 2
+                or not all(isinstance(size, (int, float)) for size in resolution)
+            ):
+                errors.append(f"{path}.last_live_resolution: expected [width, height]")
+    return errors
+
+
+def bench_schema(args):
+    data = make_ledger_data(args.size)
+    schema_ms, errors = timed(validate_ledger, data, repeat=args.repeat)
+    naive_ms, naive_errors = timed(naive_validate_ledger, data, repeat=args.repeat)
+    print(f"{args.size} djs, {args.size // 10} promos")
+    print(f"  schema.py:  {schema_ms:9.2f} ms, {len(errors or [])} errors")
+    print(f"  paths first:{naive_ms:9.2f} ms, {len(naive_errors)} errors")
+
+
+def scan_djs(ledger, text, region):
+    # Filter by walking every entry, what the ledger page did before indexes
+    text = text.lower()
+    return [
+        name
+        for name, dj in ledger.djs.items()
+        if text in name.lower() and (dj.rtmp_server or "") == region
+    ]
+
+
+def bench_query(args):
+    ledger = Ledger()
+    ledger.load_data(make_ledger_data(args.size))
+    build_ms, _ = timed(ledger.dj_search.build)
+    print(f"{args.size} djs, index built in {build_ms:.2f} ms")
+    for text in args.text:
+        scan_ms, scanned = timed(scan_djs, ledger, text, "us-east", repeat=args.repeat)
+        query_ms, queried = timed(
+            partial(ledger.query_djs, text=text, region="us-east"), repeat=args.repeat
+        )
+        print(f"  {text!r:<12} scan {scan_ms:8.2f} ms, index {query_ms:8.2f} ms, {len(queried)} matches")
+        if scanned != queried:
+            print("  index and scan disagree")
+
+    dj_rows, _ = ledger.to_treeview_values()
+    for column in range(len(dj_rows[0])):
+        key_ms, by_key = timed(
+            partial(sorted, dj_rows, key=lambda row: sort_key(row[column])),
+            repeat=args.repeat,
+        )
+        column_ms, by_column = timed(
+            partial(sort_by, dj_rows, [row[column] for row in dj_rows]),
+            repeat=args.repeat,
+        )
+        print(f"  sort column {column}  sort_key {key_ms:8.2f} ms, by column {column_ms:8.2f} ms")
+        if by_key != by_column:
+            print("  sorts disagree")
+
+
+def timed_cold(func, *args, entries, repeat=1):
+    # Like timed, with every entry's cached fragments dropped before each run
+    best = None
+    result = None
+    for _ in range(repeat):
+        for entry in entries:
+            entry.saved = None
+            entry.exported = None
+        elapsed, result = timed(func, *args)
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def break_even(dump_ms, cold_ms, edit_ms):
+    # Saves after which fragments have cost less in total than json.dumps,
+    # the first one cold and the rest after a small edit
+    if edit_ms >= dump_ms:
+        return None
+    return max(1, math.ceil((cold_ms - edit_ms) / (dump_ms - edit_ms)))
+
+
+def dump_ledger(ledger):
+    # Ledger.save before per-entry fragments
+    return json.dumps(
+        {
+            "djs": [dj.save() for dj in ledger.djs.values()],
+            "promos": [promo.save() for promo in ledger.promos.values()],
+        }
+    )
+
+
+def dump_export(djs, promos, probes):
+    # Lineup.export before per-entry fragments
+    return json.dumps(
+        {
+            "djs": [dj.export(is_live, probes) for dj, is_live in djs],
+            "promos": [promo.export(probes) for promo in promos],
+        }
+    )
+
+
+def splice_export(djs, promos, probes):
+    return splice_json(
+        {
+            "djs": [dj.export_json(is_live, probes) for dj, is_live in djs],
+            "promos": [promo.export_json(probes) for promo in promos],
+        }
+    )
+
+
+def bench_serialise(args):
+    ledger = Ledger()
+    ledger.load_data(make_ledger_data(args.size))
+    print(f"{args.size} djs, {args.size // 10} promos")
+
+    entries = [*ledger.djs.values(), *ledger.promos.values()]
+    dump_ms, dumped = timed(dump_ledger, ledger, repeat=args.repeat)
+    cold_ms, saved = timed_cold(ledger.save, entries=entries, repeat=args.repeat)
+    warm_ms, _ = timed(ledger.save, repeat=args.repeat)
+    edited = ledger.djs["dj-0"]
+    edited.stream_key = "edited"
+    edited.mark_dirty()
+    edit_ms, _ = timed(ledger.save)
+    print(f"  ledger save, json.dumps:  {dump_ms:9.2f} ms")
+    print(f"  fragments, first save:    {cold_ms:9.2f} ms")
+    print(f"  fragments, unchanged:     {warm_ms:9.2f} ms")
+    print(f"  fragments, one edit:      {edit_ms:9.2f} ms")
+    print(f"  break-even after:         {break_even(dump_ms, cold_ms, edit_ms)} saves")
+    if saved != dumped:
+        print("  spliced save differs from json.dumps")
+
+    # Every other dj live, the rest with a probed recording
+    info = make_info(1920, 1080, 60, 3600, "h264")
+    djs = [(dj, index % 2 == 0) for index, dj in enumerate(ledger.djs.values())]
+    promos = list(ledger.promos.values())
+    probes = {dj.recording_path: info for dj in ledger.djs.values()}
+    probes.update({promo.path: info for promo in promos})
+    dump_ms, dumped = timed(dump_export, djs, promos, probes, repeat=args.repeat)
+    cold_ms, exported = timed_cold(
+        splice_export, djs, promos, probes, entries=entries, repeat=args.repeat
+    )
+    warm_ms, _ = timed(splice_export, djs, promos, probes, repeat=args.repeat)
+    djs[1] = (djs[1][0], not djs[1][1])
+    edit_ms, _ = timed(splice_export, djs, promos, probes)
+    print(f"  lineup export, json.dumps:{dump_ms:9.2f} ms")
+    print(f"  fragments, first export:  {cold_ms:9.2f} ms")
+    print(f"  fragments, unchanged:     {warm_ms:9.2f} ms")
+    print(f"  fragments, one edit:      {edit_ms:9.2f} ms")
+    print(f"  break-even after:         {break_even(dump_ms, cold_ms, edit_ms)} exports")
+    if exported != dumped:
+        print("  spliced export differs from json.dumps")
+
+
+def bench_journal(args):
+    ledger = Ledger()
+    ledger.load_data(make_ledger_data(args.size))
+    directory = args.directory or tempfile.mkdtemp()
+    ledger_path = os.path.join(directory, "ledger.json")
+    print(f"{args.size} djs in {directory}")
+
+    def full_save():
+        ledger.update_dj("dj-0", "dj-0", "", "", "japan", "edited")
+        atomic_write(ledger_path, ledger.save())
+
+    full_ms, _ = timed(full_save, repeat=args.repeat)
+    print(f"  edit + full save:     {full_ms:9.2f} ms")
+
+    journal = LedgerJournal(ledger, ledger_path, compact_bytes=1 << 30)
+    start_ms, _ = timed(journal.start)
+    first_ms, _ = timed(ledger.update_dj, "dj-0", "dj-0", "", "", "japan", "first")
+    journal.compactor.join()
+    edit_ms, _ = timed(
+        partial(ledger.update_dj, "dj-0", "dj-0", "", "", "us-west", "edited"),
+        repeat=args.repeat,
+    )
+    handoff_ms, _ = timed(journal.compact)
+    journal.compactor.join()
+    compact_ms, _ = timed(partial(journal.compact, wait=True))
+    journal.stop()
+    print(f"  journal start:        {start_ms:9.2f} ms")
+    print(f"  first edit:           {first_ms:9.2f} ms (then written in the background)")
+    print(f"  edit + journal append:{edit_ms:9.2f} ms (fsynced)")
+    print(f"  compaction, UI thread:{handoff_ms:9.2f} ms")
+    print(f"  compaction, written:  {compact_ms:9.2f} ms")
+
+
+def load_json_show(ledger_path, names):
+    ledger = Ledger()
+    for _ in stream_ledger(ledger_path, ledger):
+        pass
+    return [ledger.get_dj_by_name(name) for name in names]
+
+
+def load_sqlite_show(db_path, names):
+    ledger = SqliteLedger(db_path)
+    try:
+        return [ledger.get_dj_by_name(name) for name in names]
+    finally:
+        ledger.close()
+
+
+def bench_sqlite(args):
+    # Open a ledger and fetch one show's worth of djs
+    directory = args.directory or tempfile.mkdtemp()
+    ledger_path = os.path.join(directory, "ledger.json")
+    db_path = os.path.join(directory, "ledger.db")
+    with open(ledger_path, "w") as f:
+        json.dump(make_ledger_data(args.size), f)
+    sqlite_ledger = SqliteLedger(db_path)
+    import_ms, _ = timed(sqlite_ledger.import_file, ledger_path)
+    sqlite_ledger.close()
+    names = [f"dj-{i}" for i in range(0, args.size, max(args.size // args.show, 1))]
+    print(f"{args.size} djs in {directory}, fetching {len(names)}")
+
+    json_ms, _ = timed(load_json_show, ledger_path, names, repeat=args.repeat)
+    sqlite_ms, _ = timed(load_sqlite_show, db_path, names, repeat=args.repeat)
+    print(f"  import into sqlite:   {import_ms:9.2f} ms")
+    print(f"  json load + fetch:    {json_ms:9.2f} ms")
+    print(f"  sqlite open + fetch:  {sqlite_ms:9.2f} ms")
+
+
+def cold_start(ledger_path, lineup_path, probe_cache_path):
+    # What opening the same files by hand costs
+    ledger = load_ledger(ledger_path)
+    return ledger, load_lineup(lineup_path, ledger), ProbeCache(probe_cache_path)
+
+
+def warm_start(snapshot_path, probe_cache_path):
+    session = load_snapshot(snapshot_path)
+    ledger = restore_ledger(session)
+    lineup = restore_lineup(session, ledger)
+    entries = restore_probe_entries(session, probe_cache_path)
+    return ledger, lineup, ProbeCache(probe_cache_path, entries=entries)
+
+
+def bench_startup(args):
+    # Restoring the last session from its snapshot against reading the files
+    directory = args.directory or tempfile.mkdtemp()
+    ledger_path = os.path.join(directory, "ledger.json")
+    lineup_path = os.path.join(directory, "lineup.json")
+    probe_cache_path = os.path.join(directory, "probe_cache.json")
+    snapshot_path = os.path.join(directory, "session.snapshot")
+    data = make_ledger_data(args.size)
+    with open(ledger_path, "w") as f:
+        json.dump(data, f)
+    show = data["djs"][: args.show]
+    with open(lineup_path, "w") as f:
+        json.dump(
+            {
+                "djs": [{"name": dj["name"]} for dj in show],
+                "promos": [{"name": promo["name"]} for promo in data["promos"][:4]],
+            },
+            f,
+        )
+    probes = {
+        dj["recording_path"]: {
+            "version": PROBE_CACHE_VERSION,
+            "size": 1 << 30,
+            "mtime": 0,
+            "info": make_info(1920, 1080, 60, 3600, "h264"),
+        }
+        for dj in data["djs"]
+        if dj["recording_path"]
+    }
+    with open(probe_cache_path, "w") as f:
+        json.dump(probes, f)
+
+    cold_ms, (ledger, lineup, probe_cache) = timed(
+        cold_start, ledger_path, lineup_path, probe_cache_path, repeat=args.repeat
+    )
+    sources = {path: file_stamp(path) for path in (ledger_path, lineup_path)}
+    save_ms, _ = timed(
+        save_snapshot,
+        snapshot_path,
+        ledger,
+        ledger_path,
+        lineup,
+        lineup_path,
+        sources,
+        probe_cache,
+        repeat=args.repeat,
+    )
+    warm_ms, (warm_ledger, warm_lineup, _) = timed(
+        warm_start, snapshot_path, probe_cache_path, repeat=args.repeat
+    )
+    if warm_ledger.save() != ledger.save() or warm_lineup.save() != lineup.save():
+        raise Exception("Restored session differs from the files")
+    print(
+        f"{args.size} djs, {len(show)} in the lineup, {len(probes)} probe results in {directory}"
+    )
+    print(f"  snapshot size:        {os.path.getsize(snapshot_path) / 1024:9.0f} KiB")
+    print(f"  write snapshot:       {save_ms:9.2f} ms")
+    print(f"  open the files:       {cold_ms:9.2f} ms")
+    print(f"  restore snapshot:     {warm_ms:9.2f} ms")
+
+
+BENCHMARKS = {
+    "probe": bench_probe,
+    "lineup": bench_lineup,
+    "memory": bench_memory,
+    "schema": bench_schema,
+    "query": bench_query,
+    "serialise": bench_serialise,
+    "journal": bench_journal,
+    "sqlite": bench_sqlite,
+    "startup": bench_startup,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shizu Assistant benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    probe_parser = subparsers.add_parser("probe", help="Compare probe backends")
+    probe_parser.add_argument("files", nargs="+")
+    probe_parser.add_argument("--repeat", type=int, default=3)
+
+    lineup_parser = subparsers.add_parser("lineup", help="Lineup name lookups")
+    lineup_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 1000, 100000]
+    )
+    lineup_parser.add_argument("--lookups", type=int, default=100)
+    lineup_parser.add_argument("--repeat", type=int, default=3)
+
+    memory_parser = subparsers.add_parser("memory", help="Ledger record memory")
+    memory_parser.add_argument("--size", type=int, default=50000)
+
+    schema_parser = subparsers.add_parser("schema", help="Ledger validation")
+    schema_parser.add_argument("--size", type=int, default=50000)
+    schema_parser.add_argument("--repeat", type=int, default=3)
+
+    query_parser = subparsers.add_parser("query", help="Ledger search and sort")
+    query_parser.add_argument("--size", type=int, default=20000)
+    query_parser.add_argument("--text", nargs="+", default=["dj-1", "99", "dj-19999", "x"])
+    query_parser.add_argument("--repeat", type=int, default=5)
+
+    serialise_parser = subparsers.add_parser(
+        "serialise", help="Ledger save and lineup export fragments"
+    )
+    serialise_parser.add_argument("--size", type=int, default=20000)
+    serialise_parser.add_argument("--repeat", type=int, default=3)
+
+    journal_parser = subparsers.add_parser("journal", help="Ledger journal appends")
+    journal_parser.add_argument("--size", type=int, default=20000)
+    journal_parser.add_argument("--repeat", type=int, default=5)
+    journal_parser.add_argument(
+        "--directory", help="Where to write, defaults to a temp directory"
+    )
+
+    sqlite_parser = subparsers.add_parser("sqlite", help="SQLite ledger partial loads")
+    sqlite_parser.add_argument("--size", type=int, default=100000)
+    sqlite_parser.add_argument("--show", type=int, default=40, help="djs to fetch")
+    sqlite_parser.add_argument("--repeat", type=int, default=3)
+    sqlite_parser.add_argument(
+        "--directory", help="Where to write, defaults to a temp directory"
+    )
+
+    startup_parser = subparsers.add_parser(
+        "startup", help="Session snapshot restore against opening files"
+    )
+    startup_parser.add_argument("--size", type=int, default=100000)
+    startup_parser.add_argument("--show", type=int, default=40, help="djs in the lineup")
+    startup_parser.add_argument("--repeat", type=int, default=3)
+    startup_parser.add_argument(
+        "--directory", help="Where to write, defaults to a temp directory"
+    )
+
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
@@ -0,0 +1,79 @@
+from collections import namedtuple
+from contextlib import contextmanager
+
+CHANGE_CREATE = "create"
+CHANGE_UPDATE = "update"
+CHANGE_RENAME = "rename"
+CHANGE_DELETE = "delete"
+CHANGE_ADD = "add"
+CHANGE_REMOVE = "remove"
+CHANGE_MOVE = "move"
+CHANGE_RESET = "reset"
+
+KIND_DJ = "dj"
+KIND_PROMO = "promo"
+
+# new_name is only set for renames
+ChangeEvent = namedtuple(
+    "ChangeEvent", ["source", "action", "kind", "name", "new_name"], defaults=[None]
+)
+
+
+def coalesce_events(events):
+    # A reset supersedes everything before it, and only the last update of an
+    # entry matters to subscribers
+    for index in range(len(events) - 1, -1, -1):
+        if events[index].action == CHANGE_RESET:
+            events = events[index:]
+            break
+
+    seen_updates = set()
+    coalesced = []
+    for event in reversed(events):
+        if event.action in (CHANGE_UPDATE, CHANGE_MOVE):
+            key = (event.action, event.kind, event.name)
+            if key in seen_updates:
+                continue
+            seen_updates.add(key)
+        coalesced.append(event)
+    coalesced.reverse()
+    return coalesced
+
+
+class ChangeNotifier:
+    # Deliver lists of change events to subscribers, holding them back while
+    # inside batch() so bulk operations notify once
+    def __init__(self):
+        self.subscribers = []
+        self.batch_depth = 0
+        self.pending_events = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def notify(self, action, kind, name, new_name=None):
+        event = ChangeEvent(self, action, kind, name, new_name)
+        if self.batch_depth:
+            self.pending_events.append(event)
+        else:
+            self.dispatch([event])
+
+    @contextmanager
+    def batch(self):
+        self.batch_depth += 1
+        try:
+            yield
+        finally:
+            self.batch_depth -= 1
+            if not self.batch_depth and self.pending_events:
+                events = coalesce_events(self.pending_events)
+                self.pending_events = []
+                self.dispatch(events)
+
+    def dispatch(self, events):
+        for callback in list(self.subscribers):
+            callback(events)
@@ -0,0 +1,392 @@
+import math
+import mmap
+import struct
+
+# Header-only probing for the containers recordings come in. Only the boxes or
+# elements describing the video track are read, everything else is skipped by
+# offset so a multi-GB file costs a few pages of IO.
+
+MP4_CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+MP4_SNIFF_BOXES = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot"}
+
+EBML_HEADER = 0x1A45DFA3
+EBML_SEGMENT = 0x18538067
+EBML_INFO = 0x1549A966
+EBML_TIMESTAMP_SCALE = 0x2AD7B1
+EBML_DURATION = 0x4489
+EBML_TRACKS = 0x1654AE6B
+EBML_TRACK_ENTRY = 0xAE
+EBML_TRACK_TYPE = 0x83
+EBML_CODEC_ID = 0x86
+EBML_DEFAULT_DURATION = 0x23E383
+EBML_VIDEO = 0xE0
+EBML_PIXEL_WIDTH = 0xB0
+EBML_PIXEL_HEIGHT = 0xBA
+EBML_DISPLAY_WIDTH = 0x54B0
+EBML_DISPLAY_HEIGHT = 0x54BA
+EBML_CLUSTER = 0x1F43B675
+
+MATROSKA_CODECS = {
+    "V_MPEG4/ISO/AVC": "avc1",
+    "V_MPEGH/ISO/HEVC": "hevc",
+    "V_VP8": "VP80",
+    "V_VP9": "VP90",
+    "V_AV1": "av01",
+}
+
+FLV_SCRIPT_TAG = 18
+FLV_CODECS = {2: "FLV1", 4: "VP6F", 5: "VP6A", 7: "avc1", 12: "hevc"}
+
+
+def probe_headers(path):
+    # Returns the same fields as media_probe.probe_video, or None when the
+    # container is unknown or the headers could not be parsed
+    try:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:4] == b"\x1a\x45\xdf\xa3":
+                    return parse_matroska(data)
+                if data[:3] == b"FLV":
+                    return parse_flv(data)
+                if data[4:8] in MP4_SNIFF_BOXES:
+                    return parse_mp4(data)
+    except (OSError, ValueError, IndexError, struct.error):
+        pass
+    return None
+
+
+def make_info(width, height, fps, duration, codec, rotation=0, sample_aspect=1.0):
+    # Match OpenCV's float dimensions so exports do not depend on the backend.
+    # rotation is clockwise in degrees, sample_aspect the pixel width / height.
+    if not width or not height:
+        return None
+    if not sample_aspect or sample_aspect <= 0:
+        sample_aspect = 1.0
+    return {
+        "width": float(width),
+        "height": float(height),
+        "fps": fps,
+        "duration": duration,
+        "codec": codec,
+        "rotation": round(rotation / 90) * 90 % 360,
+        "sample_aspect": sample_aspect,
+    }
+
+
+# MP4 / MOV
+
+
+def iter_mp4_boxes(data, start, end):
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield box_type, offset + header, min(offset + size, end)
+        offset += size
+
+
+def find_mp4_box(data, start, end, path):
+    # Walk a list of nested box types, returning the payload bounds of the last
+    for box_type in path:
+        for found_type, body_start, body_end in iter_mp4_boxes(data, start, end):
+            if found_type == box_type:
+                start, end = body_start, body_end
+                break
+        else:
+            return None
+    return start, end
+
+
+def parse_mp4(data):
+    moov = find_mp4_box(data, 0, len(data), [b"moov"])
+    if not moov:
+        return None
+
+    for box_type, trak_start, trak_end in iter_mp4_boxes(data, *moov):
+        if box_type != b"trak":
+            continue
+        hdlr = find_mp4_box(data, trak_start, trak_end, [b"mdia", b"hdlr"])
+        if not hdlr or data[hdlr[0] + 8 : hdlr[0] + 12] != b"vide":
+            continue
+
+        timescale = duration = None
+        mdhd = find_mp4_box(data, trak_start, trak_end, [b"mdia", b"mdhd"])
+        if mdhd:
+            if data[mdhd[0]] == 1:
+                timescale, duration = struct.unpack_from(">IQ", data, mdhd[0] + 20)
+            else:
+                timescale, duration = struct.unpack_from(">II", data, mdhd[0] + 12)
+
+        stbl = find_mp4_box(data, trak_start, trak_end, [b"mdia", b"minf", b"stbl"])
+        if not stbl:
+            continue
+        width = height = codec = fps = None
+        sample_aspect = 1.0
+        stsd = find_mp4_box(data, stbl[0], stbl[1], [b"stsd"])
+        if stsd and struct.unpack_from(">I", data, stsd[0] + 4)[0] > 0:
+            entry = stsd[0] + 8
+            entry_size = struct.unpack_from(">I", data, entry)[0]
+            codec = data[entry + 4 : entry + 8].decode("latin-1")
+            width, height = struct.unpack_from(">HH", data, entry + 32)
+            # Child boxes such as avcC and pasp follow the 86 byte entry fields
+            pasp = find_mp4_box(
+                data, entry + 86, min(entry + entry_size, stsd[1]), [b"pasp"]
+            )
+            if pasp:
+                h_spacing, v_spacing = struct.unpack_from(">II", data, pasp[0])
+                if h_spacing and v_spacing:
+                    sample_aspect = h_spacing / v_spacing
+
+        rotation = 0
+        tkhd = find_mp4_box(data, trak_start, trak_end, [b"tkhd"])
+        if tkhd:
+            # The 3x3 matrix sits before the 16.16 width and height at the end,
+            # its first row holds the cosine and sine of the rotation
+            a, b = struct.unpack_from(">ii", data, tkhd[1] - 44)
+            rotation = math.degrees(math.atan2(b, a))
+            if not width or not height:
+                # Fall back to the track header's presentation size
+                width, height = struct.unpack_from(">II", data, tkhd[1] - 8)
+                width, height = width >> 16, height >> 16
+
+        stts = find_mp4_box(data, stbl[0], stbl[1], [b"stts"])
+        if stts and timescale:
+            count = struct.unpack_from(">I", data, stts[0] + 4)[0]
+            frames = ticks = 0
+            for i in range(count):
+                sample_count, sample_delta = struct.unpack_from(
+                    ">II", data, stts[0] + 8 + i * 8
+                )
+                frames += sample_count
+                ticks += sample_count * sample_delta
+            if ticks:
+                fps = frames * timescale / ticks
+
+        return make_info(
+            width,
+            height,
+            fps,
+            duration / timescale if timescale else None,
+            codec,
+            rotation,
+            sample_aspect,
+        )
+    return None
+
+
+# Matroska / WebM
+
+
+def read_ebml_id(data, offset):
+    first = data[offset]
+    length = 1
+    mask = 0x80
+    while length <= 4 and not first & mask:
+        length += 1
+        mask >>= 1
+    if length > 4:
+        raise ValueError("Invalid EBML element id")
+    return int.from_bytes(data[offset : offset + length], "big"), offset + length
+
+
+def read_ebml_size(data, offset):
+    first = data[offset]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        length += 1
+        mask >>= 1
+    if length > 8:
+        raise ValueError("Invalid EBML element size")
+    value = first & (mask - 1)
+    for byte in data[offset + 1 : offset + length]:
+        value = (value << 8) | byte
+    if value == (1 << (7 * length)) - 1:
+        # All ones marks an unknown size, the element runs to its parent's end
+        value = None
+    return value, offset + length
+
+
+def iter_ebml_elements(data, start, end):
+    offset = start
+    while offset < end:
+        element_id, offset = read_ebml_id(data, offset)
+        size, offset = read_ebml_size(data, offset)
+        element_end = end if size is None else min(offset + size, end)
+        yield element_id, offset, element_end, size is None
+        offset = element_end
+
+
+def read_ebml_uint(data, start, end):
+    return int.from_bytes(data[start:end], "big")
+
+
+def read_ebml_float(data, start, end):
+    if end - start == 4:
+        return struct.unpack_from(">f", data, start)[0]
+    return struct.unpack_from(">d", data, start)[0]
+
+
+def parse_matroska(data):
+    offset = 0
+    end = len(data)
+    segment = None
+    for element_id, start, element_end, _ in iter_ebml_elements(data, offset, end):
+        if element_id == EBML_SEGMENT:
+            segment = (start, element_end)
+            break
+    if not segment:
+        return None
+
+    timestamp_scale = 1000000
+    duration = None
+    video = None
+    for element_id, start, element_end, unknown in iter_ebml_elements(data, *segment):
+        if element_id == EBML_INFO:
+            for child_id, child_start, child_end, _ in iter_ebml_elements(
+                data, start, element_end
+            ):
+                if child_id == EBML_TIMESTAMP_SCALE:
+                    timestamp_scale = read_ebml_uint(data, child_start, child_end)
+                elif child_id == EBML_DURATION:
+                    duration = read_ebml_float(data, child_start, child_end)
+        elif element_id == EBML_TRACKS:
+            video = parse_matroska_tracks(data, start, element_end)
+        elif element_id == EBML_CLUSTER and (video or unknown):
+            # Media data from here on, nothing further to learn cheaply
+            break
+        if video and duration is not None:
+            break
+
+    if not video:
+        return None
+    width, height, codec_id, default_duration, sample_aspect = video
+    return make_info(
+        width,
+        height,
+        1000000000 / default_duration if default_duration else None,
+        duration * timestamp_scale / 1000000000 if duration is not None else None,
+        MATROSKA_CODECS.get(codec_id, codec_id),
+        sample_aspect=sample_aspect,
+    )
+
+
+def parse_matroska_tracks(data, start, end):
+    for element_id, entry_start, entry_end, _ in iter_ebml_elements(data, start, end):
+        if element_id != EBML_TRACK_ENTRY:
+            continue
+        track_type = width = height = codec_id = default_duration = None
+        display_width = display_height = None
+        for child_id, child_start, child_end, _ in iter_ebml_elements(
+            data, entry_start, entry_end
+        ):
+            if child_id == EBML_TRACK_TYPE:
+                track_type = read_ebml_uint(data, child_start, child_end)
+            elif child_id == EBML_CODEC_ID:
+                codec_id = data[child_start:child_end].decode("ascii").rstrip("\x00")
+            elif child_id == EBML_DEFAULT_DURATION:
+                default_duration = read_ebml_uint(data, child_start, child_end)
+            elif child_id == EBML_VIDEO:
+                for video_id, video_start, video_end, _ in iter_ebml_elements(
+                    data, child_start, child_end
+                ):
+                    if video_id == EBML_PIXEL_WIDTH:
+                        width = read_ebml_uint(data, video_start, video_end)
+                    elif video_id == EBML_PIXEL_HEIGHT:
+                        height = read_ebml_uint(data, video_start, video_end)
+                    elif video_id == EBML_DISPLAY_WIDTH:
+                        display_width = read_ebml_uint(data, video_start, video_end)
+                    elif video_id == EBML_DISPLAY_HEIGHT:
+                        display_height = read_ebml_uint(data, video_start, video_end)
+        if track_type == 1:
+            # Whatever the display unit, its width to height is the display aspect
+            sample_aspect = 1.0
+            if width and height and display_width and display_height:
+                sample_aspect = display_width * height / (display_height * width)
+            return width, height, codec_id, default_duration, sample_aspect
+    return None
+
+
+# FLV
+
+
+def read_amf_value(data, offset):
+    marker = data[offset]
+    offset += 1
+    if marker == 0x00:
+        return struct.unpack_from(">d", data, offset)[0], offset + 8
+    if marker == 0x01:
+        return data[offset] != 0, offset + 1
+    if marker == 0x02:
+        return read_amf_string(data, offset)
+    if marker == 0x03:
+        return read_amf_properties(data, offset)
+    if marker in (0x05, 0x06):
+        return None, offset
+    if marker == 0x08:
+        # ECMA array, the count is only a hint so read until the end marker
+        return read_amf_properties(data, offset + 4)
+    if marker == 0x0A:
+        count = struct.unpack_from(">I", data, offset)[0]
+        offset += 4
+        values = []
+        for _ in range(count):
+            value, offset = read_amf_value(data, offset)
+            values.append(value)
+        return values, offset
+    if marker == 0x0B:
+        return struct.unpack_from(">d", data, offset)[0], offset + 10
+    if marker == 0x0C:
+        length = struct.unpack_from(">I", data, offset)[0]
+        offset += 4
+        return data[offset : offset + length].decode("utf-8", "replace"), offset + length
+    raise ValueError(f"Unsupported AMF marker: {marker}")
+
+
+def read_amf_string(data, offset):
+    length = struct.unpack_from(">H", data, offset)[0]
+    offset += 2
+    return data[offset : offset + length].decode("utf-8", "replace"), offset + length
+
+
+def read_amf_properties(data, offset):
+    properties = {}
+    while True:
+        if data[offset : offset + 3] == b"\x00\x00\x09":
+            return properties, offset + 3
+        key, offset = read_amf_string(data, offset)
+        properties[key], offset = read_amf_value(data, offset)
+
+
+def parse_flv(data):
+    header_size = struct.unpack_from(">I", data, 5)[0]
+    offset = header_size + 4
+    # onMetaData is written first, give up after a handful of tags
+    for _ in range(8):
+        if offset + 11 > len(data):
+            break
+        tag_type = data[offset] & 0x1F
+        tag_size = int.from_bytes(data[offset + 1 : offset + 4], "big")
+        body = offset + 11
+        if tag_type == FLV_SCRIPT_TAG:
+            name, value_offset = read_amf_value(data, body)
+            if name == "onMetaData":
+                metadata, _ = read_amf_value(data, value_offset)
+                if not isinstance(metadata, dict):
+                    return None
+                return make_info(
+                    metadata.get("width"),
+                    metadata.get("height"),
+                    metadata.get("framerate"),
+                    metadata.get("duration"),
+                    FLV_CODECS.get(metadata.get("videocodecid")),
+                )
+        offset = body + tag_size + 4
+    return None
@@ -1,30 +1,127 @@
-from settings import DJ_KEY, PROMO_KEY
+from settings import DJ_KEY, PROMO_KEY, JOURNAL_KEY, LEDGER_LOAD_CHUNK
 from ledger_dj import LedgerDJ
 from ledger_promo import LedgerPromo
+from schema import check_data, validate_ledger
+from ledger_index import (
+    SearchIndex,
+    DJ_INDEX_FIELDS,
+    PROMO_INDEX_FIELDS,
+    dj_index_fields,
+    promo_index_fields,
+)
+from change_notifier import (
+    ChangeNotifier,
+    CHANGE_CREATE,
+    CHANGE_UPDATE,
+    CHANGE_RENAME,
+    CHANGE_DELETE,
+    CHANGE_RESET,
+    KIND_DJ,
+    KIND_PROMO,
+)
 
 import json
 
-class Ledger:
+def splice_json(arrays):
+    # The json.dumps output for a dict of lists, built from the json.dumps
+    # output of each item so unchanged items can reuse theirs. The first
+    # splice dumps every item on its own, about twice a single json.dumps.
+    return (
+        "{"
+        + ", ".join(
+            f"{json.dumps(key)}: [{', '.join(fragments)}]" for key, fragments in arrays.items()
+        )
+        + "}"
+    )
+
+
+def check_rename(entries, old_name, new_name):
+    # Renaming onto another entry would silently drop it
+    if old_name != new_name and new_name in entries:
+        raise Exception(f"An entry named {new_name} already exists")
+
+
+class Ledger(ChangeNotifier):
     # Interface for in memory database
+    # A renamed entry moves to the end of the ledger order
+    renames_keep_place = False
+
     def __init__(self):
+        super().__init__()
         self.djs = {}
         self.promos = {}
+        self.dj_search = SearchIndex(self.djs, dj_index_fields, DJ_INDEX_FIELDS)
+        self.promo_search = SearchIndex(self.promos, promo_index_fields, PROMO_INDEX_FIELDS)
+        # {"id", "seq"} of the journal records this ledger holds, see ledger_journal.py
+        self.journal_mark = None
 
     def load_data(self, data):
+        check_data(validate_ledger, data, "ledger")
         for dj_entry in data[DJ_KEY]:
-            self.djs[dj_entry.get("name")] = LedgerDJ(
-                dj_entry.get("name"),
-                dj_entry.get("logo_path"),
-                dj_entry.get("recording_path"),
-                dj_entry.get("rtmp_server"),
-                dj_entry.get("stream_key"),
-                dj_entry.get("last_live_resolution"),
+            self.load_entry(DJ_KEY, dj_entry)
+        for promo in data[PROMO_KEY]:
+            self.load_entry(PROMO_KEY, promo)
+        self.journal_mark = data.get(JOURNAL_KEY)
+        self.reset_search()
+        self.notify(CHANGE_RESET, None, None)
+
+    def load_stream(self, entries, chunk_size=LEDGER_LOAD_CHUNK):
+        # Build from (key, entry) pairs, yielding the count loaded after each
+        # chunk so callers can report progress between chunks
+        loaded = 0
+        for key, entry in entries:
+            self.load_entry(key, entry)
+            loaded += 1
+            if loaded % chunk_size == 0:
+                yield loaded
+        self.reset_search()
+        self.notify(CHANGE_RESET, None, None)
+        yield loaded
+
+    def load_entry(self, key, entry):
+        if key == DJ_KEY:
+            self.djs[entry.get("name")] = LedgerDJ(
+                entry.get("name"),
+                entry.get("logo_path"),
+                entry.get("recording_path"),
+                entry.get("rtmp_server"),
+                entry.get("stream_key"),
+                entry.get("last_live_resolution"),
+            )
+        elif key == PROMO_KEY:
+            self.promos[entry.get("name")] = LedgerPromo(
+                entry.get("name"), entry.get("path")
             )
 
-        for promo in data[PROMO_KEY]:
-            self.promos[promo.get("name")] = LedgerPromo(
-                promo.get("name"), promo.get("path")
+    def to_rows(self):
+        # Entry fields as plain tuples in ledger order, for session snapshots
+        dj_rows = [
+            (
+                name,
+                dj.logo_path,
+                dj.recording_path,
+                dj.rtmp_server,
+                dj.stream_key,
+                dj.last_live_resolution,
             )
+            for name, dj in list(self.djs.items())
+        ]
+        promo_rows = [(name, promo.path) for name, promo in list(self.promos.items())]
+        return dj_rows, promo_rows
+
+    def load_rows(self, dj_rows, promo_rows):
+        # Inverse of to_rows, the rows were checked when first loaded
+        for row in dj_rows:
+            self.djs[row[0]] = LedgerDJ(*row)
+        for row in promo_rows:
+            self.promos[row[0]] = LedgerPromo(*row)
+        self.reset_search()
+        self.notify(CHANGE_RESET, None, None)
+
+    def reset_search(self):
+        # Loading replaces entries wholesale, rebuild on the next query instead
+        self.dj_search.reset()
+        self.promo_search.reset()
 
     def get_dj_by_name(self, dj_name) -> "LedgerDJ":
         dj = self.djs.get(dj_name)
@@ -46,6 +143,8 @@ class Ledger:
             dj_name = f"new-dj{post_fix}"
 
         self.djs[dj_name] = LedgerDJ(dj_name)
+        self.dj_search.add(dj_name, self.djs[dj_name])
+        self.notify(CHANGE_CREATE, KIND_DJ, dj_name)
         return dj_name
 
     def create_promo_entry(self):
@@ -56,57 +155,108 @@ class Ledger:
             promo_name = f"new-dj{post_fix}"
 
         self.promos[promo_name] = LedgerPromo(promo_name)
+        self.promo_search.add(promo_name, self.promos[promo_name])
+        self.notify(CHANGE_CREATE, KIND_PROMO, promo_name)
         return promo_name
 
     def update_dj(self, dj_name, name, logo_path, recording_path, rtmp, stream_key):
         dj = self.get_dj_by_name(dj_name)
-        dj.logo_path = logo_path
-        dj.recording_path = recording_path
-        dj.rtmp_server = rtmp
-        dj.stream_key = stream_key
-        if dj_name != name:
-            dj.name = name
-            self.rename_dj(dj_name, name)
+        check_rename(self.djs, dj_name, name)
+        with self.batch():
+            dj.logo_path = logo_path
+            dj.recording_path = recording_path
+            dj.rtmp_server = rtmp
+            dj.stream_key = stream_key
+            if dj_name != name:
+                dj.name = name
+                self.rename_dj(dj_name, name)
+            else:
+                self.dj_search.update(dj_name, name, dj)
+            dj.mark_dirty()
+            self.notify(CHANGE_UPDATE, KIND_DJ, name)
 
     def update_promo(self, promo_name, name, path):
         promo = self.get_promo_by_name(promo_name)
-        promo.path = path
-        if promo_name != name:
-            promo.name = name
-            self.rename_promo(promo_name, name)
+        check_rename(self.promos, promo_name, name)
+        with self.batch():
+            promo.path = path
+            if promo_name != name:
+                promo.name = name
+                self.rename_promo(promo_name, name)
+            else:
+                self.promo_search.update(promo_name, name, promo)
+            promo.mark_dirty()
+            self.notify(CHANGE_UPDATE, KIND_PROMO, name)
 
     def rename_dj(self, old_name, new_name):
+        check_rename(self.djs, old_name, new_name)
         self.djs[new_name] = self.djs.pop(old_name)
+        self.dj_search.update(old_name, new_name, self.djs[new_name])
+        self.notify(CHANGE_RENAME, KIND_DJ, old_name, new_name)
 
     def rename_promo(self, old_name, new_name):
+        check_rename(self.promos, old_name, new_name)
         self.promos[new_name] = self.promos.pop(old_name)
+        self.promo_search.update(old_name, new_name, self.promos[new_name])
+        self.notify(CHANGE_RENAME, KIND_PROMO, old_name, new_name)
 
     def delete_dj(self, dj_name):
         self.djs.pop(dj_name)
+        self.dj_search.remove(dj_name)
+        self.notify(CHANGE_DELETE, KIND_DJ, dj_name)
 
     def delete_promo(self, promo_name):
         self.promos.pop(promo_name)
+        self.promo_search.remove(promo_name)
+        self.notify(CHANGE_DELETE, KIND_PROMO, promo_name)
+
+    def query_djs(self, text="", prefix="", **filters):
+        # Names of djs matching all of: text anywhere in the name, a name
+        # prefix, and index fields such as region="japan" or has_logo=True.
+        # Ledger order, ignoring case.
+        return self.query_entries(self.djs, self.dj_search, text, prefix, filters)
+
+    def query_promos(self, text="", prefix="", **filters):
+        return self.query_entries(self.promos, self.promo_search, text, prefix, filters)
+
+    def query_entries(self, entries, search, text, prefix, filters):
+        matches = search.query(text, prefix, **filters)
+        if matches is None:
+            return list(entries)
+        return [name for name in entries if name in matches]
+
+    def snapshot(self):
+        # The entries as they are now, copied so they can be serialised on
+        # another thread while the UI edits
+        return list(self.djs.values()), list(self.promos.values())
 
-    def save(self):
-        return json.dumps(
+    def save(self, journal_mark=None, snapshot=None):
+        # Copy the values first, autosave may serialise while the UI edits
+        djs, promos = snapshot or self.snapshot()
+        data = splice_json(
             {
-                "djs": [dj.save() for _, dj in self.djs.items()],
-                "promos": [promo.save() for _, promo in self.promos.items()],
+                "djs": [dj.save_json() for dj in djs],
+                "promos": [promo.save_json() for promo in promos],
             }
         )
+        if journal_mark is not None:
+            data = f"{data[:-1]}, {json.dumps(JOURNAL_KEY)}: {json.dumps(journal_mark)}}}"
+        return data
 
-    def to_treeview_values(self):
-        # Return values split up for treeview usage
+    def to_treeview_values(self, dj_names=None, promo_names=None):
+        # Return values split up for treeview usage, optionally only for the
+        # given names such as from query_djs and query_promos
         # DJs: "Name", "Has Logo", "RTMP", "Has Recording"
         # Promos: "Name", "Has Recording"
         dj_rows = []
         promo_rows = []
-        for name, dj in self.djs.items():
+        for name in self.djs if dj_names is None else dj_names:
+            dj = self.djs[name]
             dj_rows.append(
                 (name, dj.logo_path != "", dj.rtmp_server, dj.recording_path != "")
             )
 
-        for name, promo in self.promos.items():
-            promo_rows.append((name, promo.path != ""))
+        for name in self.promos if promo_names is None else promo_names:
+            promo_rows.append((name, self.promos[name].path != ""))
 
         return (dj_rows, promo_rows)
\ No newline at end of file
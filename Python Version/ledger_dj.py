@@ -1,9 +1,23 @@
 from settings import RTMP_BASE
+from media_probe import export_video_info
 
-import cv2
+import json
 
 class LedgerDJ:
     # Handle DJ information and live or pre-rec data
+    __slots__ = (
+        "name",
+        "logo_path",
+        "recording_path",
+        "rtmp_server",
+        "stream_key",
+        "last_live_resolution",
+        # Serialised fragments with the edit count they were built at
+        "edits",
+        "saved",
+        "exported",
+    )
+
     def __init__(
         self,
         name,
@@ -19,6 +33,13 @@ class LedgerDJ:
         self.rtmp_server = rtmp_server
         self.stream_key = stream_key
         self.last_live_resolution = last_live_resolution
+        self.edits = 0
+        self.saved = None
+        self.exported = None
+
+    def mark_dirty(self):
+        # Call after changing any field so cached fragments are rebuilt
+        self.edits += 1
 
     def get_stream_url(self):
         if self.rtmp_server and self.stream_key:
@@ -29,7 +50,7 @@ class LedgerDJ:
             )
         return None
 
-    def export(self, is_live):
+    def export(self, is_live, probes):
         data = {
             "name": self.name,
             "logo_path": self.logo_path,
@@ -39,11 +60,9 @@ class LedgerDJ:
             data["resolution"] = self.last_live_resolution
             data["url"] = self.get_stream_url()
         else:
-            vcap = cv2.VideoCapture(self.recording_path)
-            if vcap.isOpened():
-                width = vcap.get(3)
-                height = vcap.get(4)
-                data["resolution"] = [width, height]
+            info = probes.get(self.recording_path)
+            if info:
+                data.update(export_video_info(info))
             data["recording_path"] = self.recording_path
 
         return data
@@ -56,4 +75,32 @@ class LedgerDJ:
             "rtmp_server": self.rtmp_server,
             "stream_key": self.stream_key,
             "last_live_resolution": self.last_live_resolution,
-        }
\ No newline at end of file
+        }
+
+    def save_json(self):
+        # json.dumps(self.save()), reused until the next edit. The edit count
+        # is read first so an edit made while dumping is never cached over.
+        edits = self.edits
+        saved = self.saved
+        if saved is not None and saved[0] == edits:
+            return saved[1]
+        fragment = json.dumps(self.save())
+        self.saved = (edits, fragment)
+        return fragment
+
+    def export_json(self, is_live, probes):
+        # json.dumps(self.export(is_live, probes)), reused while the entry,
+        # its live flag and its probe result are unchanged
+        edits = self.edits
+        info = None if is_live else probes.get(self.recording_path)
+        exported = self.exported
+        if (
+            exported is not None
+            and exported[0] == edits
+            and exported[1] == is_live
+            and exported[2] is info
+        ):
+            return exported[3]
+        fragment = json.dumps(self.export(is_live, probes))
+        self.exported = (edits, is_live, info, fragment)
+        return fragment
@@ -0,0 +1,180 @@
+from bisect import bisect_left, insort
+
+# Secondary indexes over ledger entries, so filtering the ledger page does not
+# walk every entry. An index is built on its first query and then kept up to
+# date by Ledger on every change, loading a ledger only marks it stale.
+
+
+DJ_INDEX_FIELDS = ("region", "has_logo", "has_recording")
+PROMO_INDEX_FIELDS = ("has_recording",)
+
+
+def dj_index_fields(dj):
+    return {
+        "region": dj.rtmp_server or "",
+        "has_logo": bool(dj.logo_path),
+        "has_recording": bool(dj.recording_path),
+    }
+
+
+def promo_index_fields(promo):
+    return {"has_recording": bool(promo.path)}
+
+
+def trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def sort_key(value):
+    # Orders mixed column values by type first, so booleans, numbers and
+    # text each sort naturally and text ignores case
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    return (3, str(value).casefold())
+
+
+def column_keys(values):
+    # Sort keys for one column, skipping sort_key when all values share a type
+    kinds = set(map(type, values))
+    if kinds <= {str}:
+        return list(map(str.casefold, values))
+    if kinds <= {bool, int, float}:
+        return list(values)
+    return list(map(sort_key, values))
+
+
+def sort_by(items, values, reverse=False):
+    # items ordered by the matching column values, keeping ties in order
+    keys = column_keys(values)
+    order = sorted(range(len(items)), key=keys.__getitem__, reverse=reverse)
+    return [items[index] for index in order]
+
+
+class Descending:
+    # Wraps a sort key so it orders backwards, for bisecting a column sorted
+    # in reverse while ties stay in ascending order
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+class SearchIndex:
+    # entries is the name -> entry dict being indexed, index_fields(entry)
+    # gives the value of each of field_names for an entry
+    def __init__(self, entries, index_fields, field_names):
+        self.entries = entries
+        self.index_fields = index_fields
+        self.field_names = field_names
+        self.reset()
+
+    def reset(self):
+        # Drop everything, the next query rebuilds from entries
+        self.built = False
+        # name -> {field: value} as indexed, name -> lowercase name
+        self.indexed = {}
+        self.lowers = {}
+        # field -> value -> names, trigram of the lowercase name -> names
+        self.fields = {field: {} for field in self.field_names}
+        self.trigrams = {}
+        # Sorted (lowercase name, name) pairs for prefix searches
+        self.sorted_names = []
+
+    def build(self):
+        self.reset()
+        for name, entry in self.entries.items():
+            self.index(name, entry)
+        self.sorted_names = sorted((lower, name) for name, lower in self.lowers.items())
+        self.built = True
+
+    def index(self, name, entry):
+        lower = name.lower()
+        values = self.index_fields(entry)
+        self.indexed[name] = values
+        self.lowers[name] = lower
+        for field, value in values.items():
+            self.fields[field].setdefault(value, set()).add(name)
+        for trigram in trigrams(lower):
+            self.trigrams.setdefault(trigram, set()).add(name)
+
+    def add(self, name, entry):
+        if self.built:
+            self.index(name, entry)
+            insort(self.sorted_names, (name.lower(), name))
+
+    def remove(self, name):
+        if not self.built:
+            return
+        lower = self.lowers.pop(name)
+        values = self.indexed.pop(name)
+        for field, value in values.items():
+            self.fields[field][value].discard(name)
+        for trigram in trigrams(lower):
+            self.trigrams[trigram].discard(name)
+        del self.sorted_names[bisect_left(self.sorted_names, (lower, name))]
+
+    def update(self, old_name, name, entry):
+        self.remove(old_name)
+        self.add(name, entry)
+
+    def match_prefix(self, prefix):
+        names = set()
+        index = bisect_left(self.sorted_names, (prefix,))
+        while index < len(self.sorted_names):
+            lower, name = self.sorted_names[index]
+            if not lower.startswith(prefix):
+                break
+            names.add(name)
+            index += 1
+        return names
+
+    def query(self, text="", prefix="", **filters):
+        # Names matching every condition, None when nothing narrowed the
+        # search so callers can skip intersecting with all entries. text and
+        # prefix ignore case.
+        for field in filters:
+            if field not in self.fields:
+                raise Exception(f"Cannot filter on {field}")
+        if not text and not prefix and all(value is None for value in filters.values()):
+            return None
+        if not self.built:
+            self.build()
+
+        text = text.lower()
+        candidates = [
+            self.fields[field].get(value, set())
+            for field, value in filters.items()
+            if value is not None
+        ]
+        if prefix:
+            candidates.append(self.match_prefix(prefix.lower()))
+        candidates.sort(key=len)
+
+        if text:
+            # The rarest trigram narrows names holding the text, which are
+            # checked as a whole afterwards
+            smallest = candidates[0] if candidates else self.lowers
+            if len(text) >= 3:
+                rarest = min(
+                    (self.trigrams.get(trigram, set()) for trigram in trigrams(text)), key=len
+                )
+                if len(rarest) < len(smallest):
+                    smallest = rarest
+            lowers = self.lowers
+            if len(smallest) * 4 > len(lowers):
+                # Too broad for the index to help, checking every name is cheaper
+                matches = {name for name, lower in lowers.items() if text in lower}
+            else:
+                matches = {name for name in smallest if text in lowers[name]}
+            return matches.intersection(*candidates)
+        return candidates[0].intersection(*candidates[1:])
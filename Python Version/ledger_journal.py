@@ -0,0 +1,262 @@
+from settings import DJ_KEY, PROMO_KEY, JOURNAL_SUFFIX, JOURNAL_COMPACT_BYTES
+from storage import atomic_write
+from change_notifier import (
+    CHANGE_CREATE,
+    CHANGE_UPDATE,
+    CHANGE_RENAME,
+    CHANGE_DELETE,
+    CHANGE_RESET,
+    KIND_DJ,
+    KIND_PROMO,
+)
+
+import json
+import os
+import threading
+import uuid
+
+# Append-only log of ledger changes beside the ledger file, so saving an edit
+# writes one line instead of the whole ledger.
+#
+# The first line of <ledger file>.journal is {"journal": id}, every other line
+# one change numbered by seq: a put holding the entry's saved fields, a rename
+# or a delete. Compacting writes the ledger file with a "journal" mark of
+# {"id", "seq"} for the last change it holds, then starts the journal again
+# with only newer changes. Loading replays changes past the mark, so a crash
+# between the two writes replays nothing twice. The file can already hold some
+# changes past the mark, made while it was being serialised, replaying those
+# again leaves the same entries.
+
+JOURNAL_OP_PUT = "put"
+JOURNAL_OP_RENAME = "rename"
+JOURNAL_OP_DELETE = "delete"
+
+KIND_KEYS = {KIND_DJ: DJ_KEY, KIND_PROMO: PROMO_KEY}
+
+
+def journal_path(ledger_path):
+    return ledger_path + JOURNAL_SUFFIX
+
+
+def replay_journal(ledger, ledger_path):
+    # Apply the changes the loaded ledger file does not hold yet, returning
+    # how many were applied. A torn last line from a crash mid-append is cut
+    # off, a bad line anywhere else is an error.
+    mark = ledger.journal_mark
+    path = journal_path(ledger_path)
+    if mark is None or not os.path.exists(path):
+        return 0
+
+    with open(path, "rb+") as f:
+        lines = f.readlines()
+        if not lines or parse_line(lines[0]).get("journal") != mark["id"]:
+            # Left over from before the ledger file was saved some other way
+            return 0
+        good_length = len(lines[0])
+        seq = mark["seq"]
+        applied = 0
+        for index, line in enumerate(lines[1:], 1):
+            try:
+                record = parse_line(line)
+            except ValueError:
+                if index == len(lines) - 1:
+                    break
+                raise Exception(f"Invalid ledger journal {path}, line {index + 1} is damaged")
+            good_length += len(line)
+            if record["seq"] <= seq:
+                continue
+            apply_record(ledger, record)
+            seq = record["seq"]
+            applied += 1
+        if good_length < sum(len(line) for line in lines):
+            f.truncate(good_length)
+
+    ledger.journal_mark = {"id": mark["id"], "seq": seq}
+    if applied:
+        ledger.reset_search()
+        ledger.notify(CHANGE_RESET, None, None)
+    return applied
+
+
+def parse_line(line):
+    # Only complete lines count, a crash can leave the last one half written
+    if not line.endswith(b"\n"):
+        raise ValueError("Incomplete journal line")
+    return json.loads(line)
+
+
+def apply_record(ledger, record):
+    # Same dict operations as the Ledger method that logged the change,
+    # so entries also end up in the same order
+    entries = ledger.djs if record["kind"] == KIND_DJ else ledger.promos
+    op = record["op"]
+    if op == JOURNAL_OP_PUT:
+        ledger.load_entry(KIND_KEYS[record["kind"]], record["entry"])
+    elif op == JOURNAL_OP_RENAME:
+        if record["name"] in entries:
+            entry = entries.pop(record["name"])
+            entry.name = record["new_name"]
+            entry.mark_dirty()
+            entries[record["new_name"]] = entry
+    elif op == JOURNAL_OP_DELETE:
+        entries.pop(record["name"], None)
+    else:
+        raise Exception(f"Unknown ledger journal operation {op}")
+
+
+class LedgerJournal:
+    # Follows a ledger's changes and appends them to the journal beside
+    # ledger_path. Appends happen on the thread making the change, compacting
+    # once the journal passes compact_bytes serialises and writes the ledger
+    # file on a background thread.
+    def __init__(self, ledger, ledger_path, compact_bytes=JOURNAL_COMPACT_BYTES):
+        self.ledger = ledger
+        self.ledger_path = ledger_path
+        self.path = journal_path(ledger_path)
+        self.compact_bytes = compact_bytes
+        self.lock = threading.Lock()
+        self.file = None
+        self.id = None
+        self.seq = 0
+        # Lines appended while a compaction is writing, they go on into the
+        # journal it starts. None when no compaction is running.
+        self.carried = None
+        # False while changes are only in memory, because no journal file is
+        # open yet or the compaction that would open it failed
+        self.durable = True
+        self.renames = 0
+        self.compactor = None
+        self.last_error = None
+        # Ledger file contents written by the last successful compaction
+        self.written = None
+
+    def start(self):
+        # Continue the journal the ledger was loaded with, or pick a new id.
+        # A new journal is only written by its first compaction, which the
+        # first change triggers, so opening a ledger leaves its file alone.
+        mark = self.ledger.journal_mark
+        if mark is not None and self.journal_id() == mark["id"]:
+            self.id = mark["id"]
+            self.seq = mark["seq"]
+            self.file = open(self.path, "ab")
+        else:
+            self.id = uuid.uuid4().hex
+        self.ledger.subscribe(self.on_ledger_changed)
+
+    def journal_id(self):
+        try:
+            with open(self.path, "rb") as f:
+                return parse_line(f.readline()).get("journal")
+        except (OSError, ValueError):
+            return None
+
+    def stop(self):
+        self.ledger.unsubscribe(self.on_ledger_changed)
+        if self.compactor:
+            self.compactor.join()
+        if not self.durable:
+            # Last chance for changes a failed compaction left in memory
+            self.compact(wait=True)
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+    def busy(self):
+        with self.lock:
+            return self.carried is not None
+
+    def on_ledger_changed(self, events):
+        lines = []
+        for event in events:
+            record = self.make_record(event)
+            if record is not None:
+                self.seq += 1
+                lines.append(f'{{"seq": {self.seq}, {record}}}\n'.encode("utf-8"))
+                if event.action == CHANGE_RENAME:
+                    self.renames += 1
+        if not lines:
+            return
+        self.ledger.journal_mark = {"id": self.id, "seq": self.seq}
+
+        with self.lock:
+            compacting = self.carried is not None
+            if compacting:
+                self.carried += lines
+            if self.file:
+                self.file.write(b"".join(lines))
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                size = self.file.tell()
+            else:
+                # No journal yet, or the compaction that would have opened
+                # one failed. The next compaction writes these changes.
+                self.durable = False
+                size = None
+        if compacting:
+            return
+        if size is None or size > self.compact_bytes:
+            self.compact()
+
+    def make_record(self, event):
+        # Record body for a change, without its seq, or None to skip it
+        kind = json.dumps(event.kind)
+        entries = self.ledger.djs if event.kind == KIND_DJ else self.ledger.promos
+        if event.action in (CHANGE_CREATE, CHANGE_UPDATE):
+            entry = entries.get(event.name)
+            if entry is None:
+                # Renamed or deleted later in the same batch, logged below
+                return None
+            return f'"op": "{JOURNAL_OP_PUT}", "kind": {kind}, "entry": {entry.save_json()}'
+        if event.action == CHANGE_RENAME:
+            return (
+                f'"op": "{JOURNAL_OP_RENAME}", "kind": {kind}, '
+                f'"name": {json.dumps(event.name)}, "new_name": {json.dumps(event.new_name)}'
+            )
+        if event.action == CHANGE_DELETE:
+            return f'"op": "{JOURNAL_OP_DELETE}", "kind": {kind}, "name": {json.dumps(event.name)}'
+        return None
+
+    def compact(self, wait=False):
+        # Mark the changes logged so far and serialise and write the ledger on
+        # a background thread. Skipped while a compaction is running, the next
+        # change that needs one starts it.
+        with self.lock:
+            running = self.carried is not None
+            if not running:
+                self.carried = []
+        if not running:
+            self.last_error = None
+            self.ledger.journal_mark = {"id": self.id, "seq": self.seq}
+            self.compactor = threading.Thread(
+                target=self.write_compacted, args=(self.ledger.journal_mark,), daemon=True
+            )
+            self.compactor.start()
+        if wait:
+            self.compactor.join()
+
+    def write_compacted(self, mark):
+        try:
+            # Edits made while serialising are also in the journal past the
+            # mark and replay over the file. Only a rename could leave two
+            # entries with one name in it, so serialise again after one.
+            while True:
+                renames = self.renames
+                data = self.ledger.save(mark)
+                if renames == self.renames:
+                    break
+            atomic_write(self.ledger_path, data)
+            with self.lock:
+                header = json.dumps({"journal": self.id}).encode("utf-8") + b"\n"
+                atomic_write(self.path, header + b"".join(self.carried))
+                if self.file:
+                    self.file.close()
+                    self.file = None
+                self.file = open(self.path, "ab")
+                self.durable = True
+            self.written = data
+        except Exception as e:
+            self.last_error = e
+        finally:
+            with self.lock:
+                self.carried = None
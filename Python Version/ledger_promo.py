@@ -1,19 +1,48 @@
-import cv2
+from media_probe import export_video_info
+
+import json
 
 class LedgerPromo:
     # Handle promotional video data
+    # Fragments are cached as in LedgerDJ
+    __slots__ = ("name", "path", "edits", "saved", "exported")
+
     def __init__(self, name, path=""):
         self.name = name
         self.path = path
+        self.edits = 0
+        self.saved = None
+        self.exported = None
+
+    def mark_dirty(self):
+        # Call after changing any field so cached fragments are rebuilt
+        self.edits += 1
 
-    def export(self):
+    def export(self, probes):
         data = {"name": self.name, "path": self.path}
-        vcap = cv2.VideoCapture(self.path)
-        if vcap.isOpened():
-            width = vcap.get(3)
-            height = vcap.get(4)
-            data["resolution"] = [width, height]
+        info = probes.get(self.path)
+        if info:
+            data.update(export_video_info(info))
         return data
 
     def save(self):
-        return {"name": self.name, "path": self.path}
\ No newline at end of file
+        return {"name": self.name, "path": self.path}
+
+    def save_json(self):
+        edits = self.edits
+        saved = self.saved
+        if saved is not None and saved[0] == edits:
+            return saved[1]
+        fragment = json.dumps(self.save())
+        self.saved = (edits, fragment)
+        return fragment
+
+    def export_json(self, probes):
+        edits = self.edits
+        info = probes.get(self.path)
+        exported = self.exported
+        if exported is not None and exported[0] == edits and exported[1] is info:
+            return exported[2]
+        fragment = json.dumps(self.export(probes))
+        self.exported = (edits, info, fragment)
+        return fragment
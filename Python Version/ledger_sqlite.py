@@ -0,0 +1,495 @@
+from settings import DJ_KEY, PROMO_KEY, LEDGER_LOAD_CHUNK, SQLITE_CACHE_ENTRIES
+from ledger import splice_json
+from ledger_dj import LedgerDJ
+from ledger_promo import LedgerPromo
+from schema import check_data, validate_ledger
+from ledger_stream import stream_ledger
+from change_notifier import (
+    ChangeNotifier,
+    CHANGE_CREATE,
+    CHANGE_UPDATE,
+    CHANGE_RENAME,
+    CHANGE_DELETE,
+    CHANGE_RESET,
+    KIND_DJ,
+    KIND_PROMO,
+)
+
+from collections import OrderedDict
+from collections.abc import Mapping
+import json
+import sqlite3
+import threading
+
+# Ledger kept in a sqlite database instead of a JSON file, for archives too
+# big to hold in memory. Entries are read when asked for and kept in a
+# bounded cache, every edit is committed straight away. Has the same methods
+# as Ledger, djs and promos are read-only views over the tables.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS djs (
+    position INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    logo_path TEXT,
+    recording_path TEXT,
+    rtmp_server TEXT,
+    stream_key TEXT,
+    last_live_resolution TEXT
+);
+CREATE INDEX IF NOT EXISTS djs_rtmp_server ON djs (rtmp_server);
+CREATE TABLE IF NOT EXISTS promos (
+    position INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    path TEXT
+);
+"""
+
+DJ_COLUMNS = (
+    "name",
+    "logo_path",
+    "recording_path",
+    "rtmp_server",
+    "stream_key",
+    "last_live_resolution",
+)
+PROMO_COLUMNS = ("name", "path")
+
+# Conditions for query_djs and query_promos filters, matching ledger_index.py
+EMPTY_SQL = "({column} IS NULL OR {column} = '')"
+DJ_FILTERS = {
+    "region": lambda value: (
+        (EMPTY_SQL.format(column="rtmp_server"), ())
+        if not value
+        else ("rtmp_server = ?", (value,))
+    ),
+    "has_logo": lambda value: (
+        ("NOT " if value else "") + EMPTY_SQL.format(column="logo_path"),
+        (),
+    ),
+    "has_recording": lambda value: (
+        ("NOT " if value else "") + EMPTY_SQL.format(column="recording_path"),
+        (),
+    ),
+}
+PROMO_FILTERS = {
+    "has_recording": lambda value: (
+        ("NOT " if value else "") + EMPTY_SQL.format(column="path"),
+        (),
+    ),
+}
+
+# Stay below sqlite's limit on parameters per statement
+NAMES_PER_QUERY = 500
+
+
+def dj_from_row(row):
+    name, logo_path, recording_path, rtmp_server, stream_key, resolution = row
+    return LedgerDJ(
+        name,
+        logo_path,
+        recording_path,
+        rtmp_server,
+        stream_key,
+        json.loads(resolution) if resolution is not None else None,
+    )
+
+
+def dj_to_row(dj):
+    resolution = dj.last_live_resolution
+    return (
+        dj.name,
+        dj.logo_path,
+        dj.recording_path,
+        dj.rtmp_server,
+        dj.stream_key,
+        json.dumps(resolution) if resolution is not None else None,
+    )
+
+
+def dj_entry_row(entry):
+    return dj_to_row(
+        LedgerDJ(
+            entry.get("name"),
+            entry.get("logo_path"),
+            entry.get("recording_path"),
+            entry.get("rtmp_server"),
+            entry.get("stream_key"),
+            entry.get("last_live_resolution"),
+        )
+    )
+
+
+def promo_from_row(row):
+    return LedgerPromo(*row)
+
+
+def promo_to_row(promo):
+    return (promo.name, promo.path)
+
+
+def promo_entry_row(entry):
+    return (entry.get("name"), entry.get("path"))
+
+
+class SqliteTable:
+    # Reads, writes and caches the entries of one table
+    def __init__(self, ledger, table, columns, from_row, to_row, entry_row, filters):
+        self.ledger = ledger
+        self.table = table
+        self.columns = columns
+        self.from_row = from_row
+        self.to_row = to_row
+        self.entry_row = entry_row
+        self.filters = filters
+        self.cache = OrderedDict()
+        self.select_sql = f"SELECT {', '.join(columns)} FROM {table}"
+        self.upsert_sql = (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT(name) DO UPDATE SET "
+            + ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+        )
+
+    def execute(self, sql, parameters=()):
+        return self.ledger.connection.execute(sql, parameters)
+
+    def get(self, name):
+        entry = self.cache.get(name)
+        if entry is not None:
+            self.cache.move_to_end(name)
+            return entry
+        row = self.execute(f"{self.select_sql} WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        entry = self.from_row(row)
+        self.remember(entry)
+        return entry
+
+    def remember(self, entry):
+        self.cache[entry.name] = entry
+        self.cache.move_to_end(entry.name)
+        while len(self.cache) > self.ledger.cache_size:
+            self.cache.popitem(last=False)
+
+    def contains(self, name):
+        if name in self.cache:
+            return True
+        sql = f"SELECT 1 FROM {self.table} WHERE name = ?"
+        return self.execute(sql, (name,)).fetchone() is not None
+
+    def count(self):
+        return self.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def names(self):
+        sql = f"SELECT name FROM {self.table} ORDER BY position"
+        return [row[0] for row in self.execute(sql)]
+
+    def rows(self, names=None):
+        # Rows in table order, or in the order of names when given
+        if names is None:
+            return self.execute(f"{self.select_sql} ORDER BY position").fetchall()
+        found = {}
+        for start in range(0, len(names), NAMES_PER_QUERY):
+            chunk = names[start : start + NAMES_PER_QUERY]
+            sql = f"{self.select_sql} WHERE name IN ({', '.join('?' for _ in chunk)})"
+            for row in self.execute(sql, chunk):
+                found[row[0]] = row
+        return [found[name] for name in names if name in found]
+
+    def free_name(self, base):
+        taken = {
+            row[0]
+            for row in self.execute(
+                f"SELECT name FROM {self.table} WHERE substr(name, 1, ?) = ?",
+                (len(base), base),
+            )
+        }
+        name = base
+        post_fix = 0
+        while name in taken:
+            post_fix += 1
+            name = f"{base}{post_fix}"
+        return name
+
+    def insert(self, entry):
+        sql = (
+            f"INSERT INTO {self.table} ({', '.join(self.columns)}) "
+            f"VALUES ({', '.join('?' for _ in self.columns)})"
+        )
+        self.execute(sql, self.to_row(entry))
+        self.remember(entry)
+
+    def write(self, entry):
+        assignments = ", ".join(f"{column} = ?" for column in self.columns[1:])
+        sql = f"UPDATE {self.table} SET {assignments} WHERE name = ?"
+        self.execute(sql, self.to_row(entry)[1:] + (entry.name,))
+
+    def rename(self, old_name, new_name):
+        if old_name != new_name and self.contains(new_name):
+            raise Exception(f"An entry named {new_name} already exists")
+        self.execute(f"UPDATE {self.table} SET name = ? WHERE name = ?", (new_name, old_name))
+        entry = self.cache.pop(old_name, None)
+        if entry is not None:
+            entry.name = new_name
+            entry.mark_dirty()
+            self.remember(entry)
+
+    def delete(self, name):
+        self.execute(f"DELETE FROM {self.table} WHERE name = ?", (name,))
+        self.cache.pop(name, None)
+
+    def load(self, entries):
+        # Insert or replace entries read from a ledger file, in one statement
+        self.ledger.connection.executemany(
+            self.upsert_sql, [self.entry_row(entry) for entry in entries]
+        )
+
+    def clear(self):
+        self.execute(f"DELETE FROM {self.table}")
+        self.cache.clear()
+
+    def query(self, text, prefix, filters):
+        conditions = []
+        parameters = []
+        for field, value in filters.items():
+            if field not in self.filters:
+                raise Exception(f"Cannot filter on {field}")
+            if value is None:
+                continue
+            condition, condition_parameters = self.filters[field](value)
+            conditions.append(condition)
+            parameters += condition_parameters
+        if text:
+            conditions.append("instr(lower_name(name), ?) > 0")
+            parameters.append(text.lower())
+        if prefix:
+            conditions.append("substr(lower_name(name), 1, ?) = ?")
+            parameters += [len(prefix), prefix.lower()]
+        if not conditions:
+            return self.names()
+        sql = f"SELECT name FROM {self.table} WHERE {' AND '.join(conditions)} ORDER BY position"
+        return [row[0] for row in self.execute(sql, parameters)]
+
+    def save_json(self):
+        # Save fragments in table order, cached entries may have theirs already
+        fragments = []
+        for row in self.rows():
+            entry = self.cache.get(row[0])
+            if entry is None:
+                entry = self.from_row(row)
+            fragments.append(entry.save_json())
+        return fragments
+
+
+class SqliteEntries(Mapping):
+    # Read-only name -> entry view of a table, for code written against
+    # Ledger.djs and Ledger.promos
+    def __init__(self, ledger, table):
+        self.ledger = ledger
+        self.table = table
+
+    def __getitem__(self, name):
+        with self.ledger.lock:
+            entry = self.table.get(name)
+        if entry is None:
+            raise KeyError(name)
+        return entry
+
+    def __contains__(self, name):
+        with self.ledger.lock:
+            return self.table.contains(name)
+
+    def __iter__(self):
+        with self.ledger.lock:
+            return iter(self.table.names())
+
+    def __len__(self):
+        with self.ledger.lock:
+            return self.table.count()
+
+
+class SqliteLedger(ChangeNotifier):
+    # Renaming only changes the name, the row keeps its position
+    renames_keep_place = True
+
+    def __init__(self, db_path, cache_size=SQLITE_CACHE_ENTRIES):
+        super().__init__()
+        self.db_path = db_path
+        self.cache_size = cache_size
+        # Loading and exporting run on task threads while the UI edits
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        # sqlite's lower() only folds ascii, match ledger_index.py instead
+        self.connection.create_function("lower_name", 1, str.lower, deterministic=True)
+        self.dj_table = SqliteTable(
+            self, "djs", DJ_COLUMNS, dj_from_row, dj_to_row, dj_entry_row, DJ_FILTERS
+        )
+        self.promo_table = SqliteTable(
+            self,
+            "promos",
+            PROMO_COLUMNS,
+            promo_from_row,
+            promo_to_row,
+            promo_entry_row,
+            PROMO_FILTERS,
+        )
+        self.djs = SqliteEntries(self, self.dj_table)
+        self.promos = SqliteEntries(self, self.promo_table)
+        # Only set by JSON ledger files, kept for stream_ledger
+        self.journal_mark = None
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def load_data(self, data):
+        # Replace the whole ledger with the contents of a ledger file
+        check_data(validate_ledger, data, "ledger")
+        with self.lock, self.connection:
+            self.dj_table.clear()
+            self.promo_table.clear()
+            self.dj_table.load(data[DJ_KEY])
+            self.promo_table.load(data[PROMO_KEY])
+        self.notify(CHANGE_RESET, None, None)
+
+    def import_file(self, ledger_path, progress=None):
+        # Add a JSON ledger file's entries, replacing those with the same
+        # name. Nothing is kept if the file turns out to be invalid.
+        with self.lock, self.connection:
+            for fraction in stream_ledger(ledger_path, self):
+                if progress:
+                    progress(fraction)
+
+    def load_stream(self, entries, chunk_size=LEDGER_LOAD_CHUNK):
+        # For stream_ledger, the caller commits once everything is read
+        loaded = 0
+        chunk = {DJ_KEY: [], PROMO_KEY: []}
+        for key, entry in entries:
+            if key in chunk:
+                chunk[key].append(entry)
+            loaded += 1
+            if loaded % chunk_size == 0:
+                self.load_chunk(chunk)
+                yield loaded
+        self.load_chunk(chunk)
+        self.dj_table.cache.clear()
+        self.promo_table.cache.clear()
+        self.notify(CHANGE_RESET, None, None)
+        yield loaded
+
+    def load_chunk(self, chunk):
+        self.dj_table.load(chunk[DJ_KEY])
+        self.promo_table.load(chunk[PROMO_KEY])
+        chunk[DJ_KEY] = []
+        chunk[PROMO_KEY] = []
+
+    def get_dj_by_name(self, dj_name) -> "LedgerDJ":
+        with self.lock:
+            dj = self.dj_table.get(dj_name)
+        if dj:
+            return dj
+        raise Exception(f"Could not find dj by name: {dj_name}")
+
+    def get_promo_by_name(self, promo_name) -> "LedgerPromo":
+        with self.lock:
+            promo = self.promo_table.get(promo_name)
+        if promo:
+            return promo
+        raise Exception(f"Could not find promo by name: {promo_name}")
+
+    def create_dj_entry(self):
+        with self.lock, self.connection:
+            dj_name = self.dj_table.free_name("new-dj")
+            self.dj_table.insert(LedgerDJ(dj_name))
+        self.notify(CHANGE_CREATE, KIND_DJ, dj_name)
+        return dj_name
+
+    def create_promo_entry(self):
+        with self.lock, self.connection:
+            promo_name = self.promo_table.free_name("new-dj")
+            self.promo_table.insert(LedgerPromo(promo_name))
+        self.notify(CHANGE_CREATE, KIND_PROMO, promo_name)
+        return promo_name
+
+    def update_dj(self, dj_name, name, logo_path, recording_path, rtmp, stream_key):
+        dj = self.get_dj_by_name(dj_name)
+        with self.batch():
+            with self.lock, self.connection:
+                if dj_name != name:
+                    self.dj_table.rename(dj_name, name)
+                dj.logo_path = logo_path
+                dj.recording_path = recording_path
+                dj.rtmp_server = rtmp
+                dj.stream_key = stream_key
+                dj.mark_dirty()
+                self.dj_table.write(dj)
+            if dj_name != name:
+                self.notify(CHANGE_RENAME, KIND_DJ, dj_name, name)
+            self.notify(CHANGE_UPDATE, KIND_DJ, name)
+
+    def update_promo(self, promo_name, name, path):
+        promo = self.get_promo_by_name(promo_name)
+        with self.batch():
+            with self.lock, self.connection:
+                if promo_name != name:
+                    self.promo_table.rename(promo_name, name)
+                promo.path = path
+                promo.mark_dirty()
+                self.promo_table.write(promo)
+            if promo_name != name:
+                self.notify(CHANGE_RENAME, KIND_PROMO, promo_name, name)
+            self.notify(CHANGE_UPDATE, KIND_PROMO, name)
+
+    def rename_dj(self, old_name, new_name):
+        with self.lock, self.connection:
+            self.dj_table.rename(old_name, new_name)
+        self.notify(CHANGE_RENAME, KIND_DJ, old_name, new_name)
+
+    def rename_promo(self, old_name, new_name):
+        with self.lock, self.connection:
+            self.promo_table.rename(old_name, new_name)
+        self.notify(CHANGE_RENAME, KIND_PROMO, old_name, new_name)
+
+    def delete_dj(self, dj_name):
+        with self.lock, self.connection:
+            self.dj_table.delete(dj_name)
+        self.notify(CHANGE_DELETE, KIND_DJ, dj_name)
+
+    def delete_promo(self, promo_name):
+        with self.lock, self.connection:
+            self.promo_table.delete(promo_name)
+        self.notify(CHANGE_DELETE, KIND_PROMO, promo_name)
+
+    def query_djs(self, text="", prefix="", **filters):
+        with self.lock:
+            return self.dj_table.query(text, prefix, filters)
+
+    def query_promos(self, text="", prefix="", **filters):
+        with self.lock:
+            return self.promo_table.query(text, prefix, filters)
+
+    def save(self):
+        # The same JSON as Ledger.save, for exporting to a ledger file
+        with self.lock:
+            return splice_json(
+                {
+                    "djs": self.dj_table.save_json(),
+                    "promos": self.promo_table.save_json(),
+                }
+            )
+
+    def to_treeview_values(self, dj_names=None, promo_names=None):
+        # Same rows as Ledger.to_treeview_values, straight from the tables
+        with self.lock:
+            dj_rows = self.dj_table.rows(dj_names)
+            promo_rows = self.promo_table.rows(promo_names)
+        return (
+            [
+                (name, logo_path != "", rtmp_server, recording_path != "")
+                for name, logo_path, recording_path, rtmp_server, _, _ in dj_rows
+            ],
+            [(name, path != "") for name, path in promo_rows],
+        )
@@ -0,0 +1,131 @@
+from settings import LEDGER_LOAD_CHUNK, LEDGER_READ_SIZE, JOURNAL_KEY
+from schema import StreamValidator, LEDGER_ENTRIES, LEDGER_VALUES
+
+import codecs
+import json
+import os
+import re
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+DELIMITERS = ",]} \t\n\r"
+
+
+class LedgerStream:
+    # Iterate (key, entry) pairs of a ledger file's top level arrays, reading
+    # it in blocks so only a block and the current entry are held in memory
+    def __init__(self, f, read_size=LEDGER_READ_SIZE):
+        self.f = f
+        self.read_size = read_size
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+        # Top level keys whose value was an array, and the other top level values
+        self.array_keys = set()
+        self.values = {}
+        try:
+            self.total_bytes = os.fstat(f.fileno()).st_size
+        except (AttributeError, OSError):
+            self.total_bytes = 0
+
+    def progress(self):
+        if not self.total_bytes:
+            return 1.0 if self.eof else 0.0
+        return min(self.bytes_read / self.total_bytes, 1.0)
+
+    def __iter__(self):
+        self.expect("{")
+        if self.peek() == "}":
+            return
+        while True:
+            key = self.decode()
+            self.expect(":")
+            if self.peek() == "[":
+                self.array_keys.add(key)
+                self.expect("[")
+                if self.peek() == "]":
+                    self.expect("]")
+                else:
+                    while True:
+                        yield key, self.decode()
+                        if self.next_char(",]") == "]":
+                            break
+            else:
+                # Not an entry list, kept aside for the loader
+                self.values[key] = self.decode()
+            if self.next_char(",}") == "}":
+                return
+
+    def fill(self):
+        data = self.f.read(self.read_size)
+        self.bytes_read += len(data)
+        text = self.text_decoder.decode(data, final=not data)
+        self.eof = not data
+        self.buffer = self.buffer[self.pos :] + text
+        self.pos = 0
+
+    def skip_whitespace(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return
+            self.fill()
+
+    def peek(self):
+        self.skip_whitespace()
+        if self.pos >= len(self.buffer):
+            raise Exception("Unexpected end of ledger file")
+        return self.buffer[self.pos]
+
+    def next_char(self, expected):
+        char = self.peek()
+        if char not in expected:
+            raise Exception(
+                f"Invalid ledger file, expected one of {expected} but found {char}"
+            )
+        self.pos += 1
+        return char
+
+    def expect(self, expected):
+        self.next_char(expected)
+
+    def decode(self):
+        # Decode one value, reading more when it runs past the buffer. A number
+        # cut off by the buffer still decodes, so only trust one that is
+        # followed by a delimiter or the end of the file.
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+                if (
+                    self.eof
+                    or isinstance(value, (dict, list, str))
+                    or (end < len(self.buffer) and self.buffer[end] in DELIMITERS)
+                ):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def stream_ledger(ledger_path, ledger, chunk_size=LEDGER_LOAD_CHUNK):
+    # Load a ledger file into ledger a chunk at a time, yielding the fraction
+    # of the file read after each chunk. Invalid entries are skipped and
+    # reported together in a SchemaError once the whole file has been read.
+    validator = StreamValidator("ledger file", LEDGER_ENTRIES, LEDGER_VALUES)
+    with open(ledger_path, "rb") as f:
+        stream = LedgerStream(f)
+        entries = (
+            (key, entry) for key, entry in stream if validator.check_entry(key, entry)
+        )
+        for _ in ledger.load_stream(entries, chunk_size):
+            yield stream.progress()
+    if JOURNAL_KEY in stream.values and validator.check_value(
+        JOURNAL_KEY, stream.values[JOURNAL_KEY]
+    ):
+        ledger.journal_mark = stream.values[JOURNAL_KEY]
+    validator.finish(stream.array_keys)
@@ -1,35 +1,104 @@
-from settings import DJ_KEY, PROMO_KEY
-from ledger import Ledger
+from settings import DJ_KEY, PROMO_KEY, PROBE_WORKERS
+from ledger import Ledger, splice_json
+from lineup_dj import LineupDJ
+from media_probe import ProbeCache
+from lineup_binary import encode_lineup
+from schema import check_data, validate_lineup
+from change_notifier import (
+    ChangeNotifier,
+    CHANGE_ADD,
+    CHANGE_REMOVE,
+    CHANGE_MOVE,
+    CHANGE_RENAME,
+    CHANGE_UPDATE,
+    CHANGE_RESET,
+    KIND_DJ,
+    KIND_PROMO,
+)
 
 import json
 
-class Lineup:
+def video_paths(djs, promos):
+    # Videos an export probes for entries from Lineup.ledger_entries, live
+    # djs have none
+    paths = [dj.recording_path for dj, is_live in djs if not is_live]
+    paths += [promo.path for promo in promos]
+    return paths
+
+
+class Lineup(ChangeNotifier):
     def __init__(self, djs: list["str"], promos: list["str"], ledger: "Ledger"):
+        super().__init__()
         self.dj_entries = []
         for dj_name in djs:
             dj = ledger.get_dj_by_name(dj_name)
             if dj.recording_path is None:
-                self.dj_entries.append([dj_name, True])
+                self.dj_entries.append(LineupDJ(dj_name, True))
             else:
-                self.dj_entries.append([dj_name, False])
+                self.dj_entries.append(LineupDJ(dj_name, False))
         self.promo_entries = promos
         self.ledger = ledger
+        # Names load_data left out as they are not in the ledger
+        self.missing = []
+        # Name -> position in dj_entries/promo_entries
+        self.dj_index = {}
+        self.promo_index = {}
+        self.reindex_djs()
+        self.reindex_promos()
     
     def load_data(self, json_data):
+        check_data(validate_lineup, json_data, "lineup")
+        # Entries that are not in the ledger could not be exported, they are
+        # left out and listed in missing for the caller to warn about
         for dj_entry in json_data[DJ_KEY]:
-            self.dj_entries.append([dj_entry.get("name"), "url" in dj_entry])
+            if dj_entry["name"] in self.ledger.djs:
+                self.dj_entries.append(LineupDJ(dj_entry["name"], "url" in dj_entry))
+            else:
+                self.missing.append(dj_entry["name"])
         for promo_entry in json_data[PROMO_KEY]:
-            self.promo_entries.append(promo_entry.get("name"))
+            if promo_entry["name"] in self.ledger.promos:
+                self.promo_entries.append(promo_entry["name"])
+            else:
+                self.missing.append(promo_entry["name"])
+        self.reindex_djs()
+        self.reindex_promos()
+        self.notify(CHANGE_RESET, None, None)
+
+    def to_rows(self):
+        # (name, is_live) pairs and promo names, for session snapshots
+        return [(dj.name, dj.is_live) for dj in self.dj_entries], list(self.promo_entries)
+
+    def load_rows(self, dj_rows, promo_rows):
+        # Inverse of to_rows, every name has to be in the ledger
+        missing = [name for name, _ in dj_rows if name not in self.ledger.djs]
+        missing += [name for name in promo_rows if name not in self.ledger.promos]
+        if missing:
+            raise Exception("Lineup entries are not in the ledger: " + ", ".join(missing))
+        for name, is_live in dj_rows:
+            self.dj_entries.append(LineupDJ(name, is_live))
+        self.promo_entries += promo_rows
+        self.reindex_djs()
+        self.reindex_promos()
+        self.notify(CHANGE_RESET, None, None)
+
+    def reindex_djs(self, start=0):
+        # Positions only shift after start, earlier entries keep theirs
+        for index in range(start, len(self.dj_entries)):
+            self.dj_index[self.dj_entries[index].name] = index
+
+    def reindex_promos(self, start=0):
+        for index in range(start, len(self.promo_entries)):
+            self.promo_index[self.promo_entries[index]] = index
 
     def has_dj(self, dj_name):
-        for dj_entry in self.dj_entries:
-            if dj_name == dj_entry[0]:
-                return dj_entry
+        index = self.dj_index.get(dj_name)
+        if index is not None:
+            return self.dj_entries[index]
 
     def has_promo(self, promo_name):
-        for promo_entry in self.promo_entries:
-            if promo_name == promo_entry:
-                return promo_entry
+        index = self.promo_index.get(promo_name)
+        if index is not None:
+            return self.promo_entries[index]
 
     def get_dj_by_name(self, dj_name):
         return self.has_dj(dj_name)
@@ -37,56 +106,158 @@ class Lineup:
     def add_dj(self, dj_name, is_live=False):
         if self.has_dj(dj_name):
             raise Exception("DJ entry already in lineup")
-        self.dj_entries.append([dj_name, is_live])
+        self.dj_index[dj_name] = len(self.dj_entries)
+        self.dj_entries.append(LineupDJ(dj_name, is_live))
+        self.notify(CHANGE_ADD, KIND_DJ, dj_name)
 
     def add_promo(self, promo_name):
         if self.has_promo(promo_name):
             raise Exception("Promo entry already in lineup")
+        self.promo_index[promo_name] = len(self.promo_entries)
         self.promo_entries.append(promo_name)
+        self.notify(CHANGE_ADD, KIND_PROMO, promo_name)
 
     def remove_dj(self, dj_name):
-        found_dj = self.has_dj(dj_name)
+        index = self.dj_index.pop(dj_name, None)
 
-        if found_dj:
-            self.dj_entries.remove(found_dj)
+        if index is not None:
+            del self.dj_entries[index]
+            self.reindex_djs(index)
+            self.notify(CHANGE_REMOVE, KIND_DJ, dj_name)
         else:
             raise Exception(f"No dj found in lineup for {dj_name}")
 
     def remove_promo(self, promo_name):
-        found_promo = self.has_promo(promo_name)
+        index = self.promo_index.pop(promo_name, None)
 
-        if found_promo:
-            self.promo_entries.remove(found_promo)
+        if index is not None:
+            del self.promo_entries[index]
+            self.reindex_promos(index)
+            self.notify(CHANGE_REMOVE, KIND_PROMO, promo_name)
         else:
-            raise Exception(f"No promo found in lineup for {found_promo}")
+            raise Exception(f"No promo found in lineup for {promo_name}")
+
+    def rename_dj(self, old_name, new_name):
+        index = self.dj_index.pop(old_name, None)
+        if index is None:
+            raise Exception(f"No dj found in lineup for {old_name}")
+        self.dj_entries[index].name = new_name
+        self.dj_index[new_name] = index
+        self.notify(CHANGE_RENAME, KIND_DJ, old_name, new_name)
+
+    def rename_promo(self, old_name, new_name):
+        index = self.promo_index.pop(old_name, None)
+        if index is None:
+            raise Exception(f"No promo found in lineup for {old_name}")
+        self.promo_entries[index] = new_name
+        self.promo_index[new_name] = index
+        self.notify(CHANGE_RENAME, KIND_PROMO, old_name, new_name)
 
     def swap_djs(self, first_index, second_index):
         temp = self.dj_entries[first_index]
         self.dj_entries[first_index] = self.dj_entries[second_index]
         self.dj_entries[second_index] = temp
+        self.dj_index[self.dj_entries[first_index].name] = first_index
+        self.dj_index[self.dj_entries[second_index].name] = second_index
+        with self.batch():
+            self.notify(CHANGE_MOVE, KIND_DJ, self.dj_entries[first_index].name)
+            self.notify(CHANGE_MOVE, KIND_DJ, self.dj_entries[second_index].name)
 
     def swap_promos(self, first_index, second_index):
         temp = self.promo_entries[first_index]
         self.promo_entries[first_index] = self.promo_entries[second_index]
         self.promo_entries[second_index] = temp
+        self.promo_index[self.promo_entries[first_index]] = first_index
+        self.promo_index[self.promo_entries[second_index]] = second_index
+        with self.batch():
+            self.notify(CHANGE_MOVE, KIND_PROMO, self.promo_entries[first_index])
+            self.notify(CHANGE_MOVE, KIND_PROMO, self.promo_entries[second_index])
 
     def update_dj(self, dj_name, is_live):
         found_dj = self.has_dj(dj_name)
         if found_dj:
-            index = self.dj_entries.index(found_dj)
-            self.dj_entries[index][1] = is_live
+            found_dj.is_live = is_live
+            self.notify(CHANGE_UPDATE, KIND_DJ, dj_name)
         else:
             raise Exception("No dj found in lineup")
 
-    def export(self):
+    def export(self, probe_cache=None, max_workers=PROBE_WORKERS, progress=None, pool=None):
+        # (JSON text, probe errors by path). Spliced from each entry's cached
+        # fragment, only entries edited or re-probed since the last export
+        # are serialised again.
+        djs, promos, probes, errors = self.export_entries(
+            probe_cache, max_workers, progress, pool
+        )
+        data = splice_json(
+            {
+                "djs": [dj.export_json(is_live, probes) for dj, is_live in djs],
+                "promos": [promo.export_json(probes) for promo in promos],
+            }
+        )
+        return data, errors
+
+    def export_binary(
+        self, probe_cache=None, max_workers=PROBE_WORKERS, progress=None, pool=None
+    ):
+        data, errors = self.export_data(probe_cache, max_workers, progress, pool)
+        return encode_lineup(data), errors
+
+    def export_data(self, probe_cache=None, max_workers=PROBE_WORKERS, progress=None, pool=None):
+        djs, promos, probes, errors = self.export_entries(
+            probe_cache, max_workers, progress, pool
+        )
         data = {"djs": [], "promos": []}
-        for dj_name, is_live in self.dj_entries:
-            dj = self.ledger.get_dj_by_name(dj_name)
-            data["djs"].append(dj.export(is_live))
-        for promo_name in self.promo_entries:
-            data["promos"].append(self.ledger.get_promo_by_name(promo_name).export())
+        for dj, is_live in djs:
+            data["djs"].append(dj.export(is_live, probes))
+        for promo in promos:
+            data["promos"].append(promo.export(probes))
+
+        return data, errors
+
+    def export_entries(self, probe_cache, max_workers, progress, pool=None):
+        # Ledger entries to export with the probes for their videos and the
+        # errors of those that could not be probed. Nothing is kept on the
+        # lineup, exports may run on several threads at once.
+        if probe_cache is None:
+            probe_cache = ProbeCache()
+        djs, promos = self.ledger_entries()
+
+        # Probe every video up front, the pool keeps results keyed by path
+        probes, errors = probe_cache.get_many(
+            video_paths(djs, promos), max_workers, progress, pool
+        )
+        return djs, promos, probes, errors
+
+    def ledger_entries(self):
+        # (LedgerDJ, is_live) pairs and LedgerPromos in lineup order. May run
+        # on a worker thread, so work from copies of the entries.
+        djs = [
+            (self.ledger.get_dj_by_name(dj_entry.name), dj_entry.is_live)
+            for dj_entry in list(self.dj_entries)
+        ]
+        promos = [
+            self.ledger.get_promo_by_name(promo_name)
+            for promo_name in list(self.promo_entries)
+        ]
+        return djs, promos
 
-        return json.dumps(data)
+    def save(self):
+        # Names and live flags only, enough for load_data without any probing
+        dj_entries = list(self.dj_entries)
+        promo_entries = list(self.promo_entries)
+        return json.dumps(
+            {
+                "djs": [
+                    {"name": dj_entry.name, "url": ""} if dj_entry.is_live
+                    else {"name": dj_entry.name}
+                    for dj_entry in dj_entries
+                ],
+                "promos": [{"name": promo_name} for promo_name in promo_entries],
+            }
+        )
 
     def to_treeview_values(self):
-        return self.dj_entries, self.promo_entries
\ No newline at end of file
+        return (
+            [dj_entry.to_treeview_values() for dj_entry in self.dj_entries],
+            self.promo_entries,
+        )
\ No newline at end of file
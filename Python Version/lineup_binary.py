@@ -0,0 +1,133 @@
+import struct
+
+# Binary form of an exported lineup, holding the same values as the JSON
+# export. obs_hijack_script.py carries its own copy of the reader, keep the
+# two in step and bump LINEUP_FORMAT_VERSION on any change to the layout.
+#
+# Layout: magic, version (u16), key count (u16), each key as u16 length +
+# utf-8, then the root value. Values start with a tag byte, dict entries
+# refer to their key by its u16 index in the key table.
+
+LINEUP_MAGIC = b"SHZL"
+LINEUP_FORMAT_VERSION = 1
+
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT = 3
+TAG_FLOAT = 4
+TAG_STR = 5
+TAG_LIST = 6
+TAG_DICT = 7
+
+HEADER = struct.Struct(">4sHH")
+U16 = struct.Struct(">H")
+U32 = struct.Struct(">I")
+INT = struct.Struct(">q")
+FLOAT = struct.Struct(">d")
+
+
+def encode_lineup(data):
+    keys = {}
+    body = bytearray()
+    encode_value(data, body, keys)
+    if len(keys) > 0xFFFF:
+        raise Exception("Too many distinct keys for a binary lineup")
+
+    out = bytearray(HEADER.pack(LINEUP_MAGIC, LINEUP_FORMAT_VERSION, len(keys)))
+    for key in keys:
+        encoded = key.encode("utf-8")
+        out += U16.pack(len(encoded))
+        out += encoded
+    out += body
+    return bytes(out)
+
+
+def encode_value(value, out, keys):
+    if value is None:
+        out.append(TAG_NONE)
+    elif value is True:
+        out.append(TAG_TRUE)
+    elif value is False:
+        out.append(TAG_FALSE)
+    elif isinstance(value, int):
+        if not -(1 << 63) <= value < 1 << 63:
+            raise Exception(f"Integer {value} does not fit in a binary lineup")
+        out.append(TAG_INT)
+        out += INT.pack(value)
+    elif isinstance(value, float):
+        out.append(TAG_FLOAT)
+        out += FLOAT.pack(value)
+    elif isinstance(value, str):
+        encoded = value.encode("utf-8")
+        out.append(TAG_STR)
+        out += U32.pack(len(encoded))
+        out += encoded
+    elif isinstance(value, (list, tuple)):
+        out.append(TAG_LIST)
+        out += U32.pack(len(value))
+        for item in value:
+            encode_value(item, out, keys)
+    elif isinstance(value, dict):
+        out.append(TAG_DICT)
+        out += U32.pack(len(value))
+        for key, item in value.items():
+            out += U16.pack(keys.setdefault(key, len(keys)))
+            encode_value(item, out, keys)
+    else:
+        raise Exception(f"Cannot store {type(value).__name__} in a binary lineup")
+
+
+def decode_lineup(buffer):
+    # buffer is anything supporting the buffer protocol, e.g. bytes or mmap
+    with memoryview(buffer) as view:
+        magic, version, key_count = HEADER.unpack_from(view, 0)
+        if magic != LINEUP_MAGIC:
+            raise Exception("Not a binary lineup file")
+        if version > LINEUP_FORMAT_VERSION:
+            raise Exception(f"Binary lineup version {version} is not supported")
+        offset = HEADER.size
+        keys = []
+        for _ in range(key_count):
+            length = U16.unpack_from(view, offset)[0]
+            offset += 2
+            keys.append(str(view[offset : offset + length], "utf-8"))
+            offset += length
+        value, _ = decode_value(view, offset, keys)
+        return value
+
+
+def decode_value(view, offset, keys):
+    tag = view[offset]
+    offset += 1
+    if tag == TAG_STR:
+        length = U32.unpack_from(view, offset)[0]
+        offset += 4
+        return str(view[offset : offset + length], "utf-8"), offset + length
+    if tag == TAG_DICT:
+        count = U32.unpack_from(view, offset)[0]
+        offset += 4
+        value = {}
+        for _ in range(count):
+            key = keys[U16.unpack_from(view, offset)[0]]
+            value[key], offset = decode_value(view, offset + 2, keys)
+        return value, offset
+    if tag == TAG_LIST:
+        count = U32.unpack_from(view, offset)[0]
+        offset += 4
+        value = []
+        for _ in range(count):
+            item, offset = decode_value(view, offset, keys)
+            value.append(item)
+        return value, offset
+    if tag == TAG_FLOAT:
+        return FLOAT.unpack_from(view, offset)[0], offset + 8
+    if tag == TAG_INT:
+        return INT.unpack_from(view, offset)[0], offset + 8
+    if tag == TAG_NONE:
+        return None, offset
+    if tag == TAG_TRUE:
+        return True, offset
+    if tag == TAG_FALSE:
+        return False, offset
+    raise Exception(f"Invalid binary lineup, unknown tag {tag}")
@@ -0,0 +1,10 @@
+class LineupDJ:
+    # A DJ's place in the lineup, the rest of their data lives in the ledger
+    __slots__ = ("name", "is_live")
+
+    def __init__(self, name, is_live=False):
+        self.name = name
+        self.is_live = is_live
+
+    def to_treeview_values(self):
+        return (self.name, self.is_live)
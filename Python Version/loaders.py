@@ -0,0 +1,41 @@
+from settings import SQLITE_LEDGER_EXTENSIONS
+from ledger import Ledger
+from lineup import Lineup
+from ledger_stream import stream_ledger
+from ledger_journal import replay_journal
+from ledger_sqlite import SqliteLedger
+from lineup_binary import LINEUP_MAGIC, decode_lineup
+
+import json
+import os
+
+# Opening ledger and lineup files, shared by the GUI and shizu_cli.py
+
+
+def load_ledger(ledger_path, progress=None):
+    if not os.path.exists(ledger_path):
+        raise Exception("Ledger file does not exist at: " + ledger_path)
+    if ledger_path.lower().endswith(SQLITE_LEDGER_EXTENSIONS):
+        # Entries are read from the database as they are needed
+        return SqliteLedger(ledger_path)
+    ledger = Ledger()
+    for fraction in stream_ledger(ledger_path, ledger):
+        if progress:
+            progress(fraction)
+    # Edits logged since the file was last written
+    replay_journal(ledger, ledger_path)
+    return ledger
+
+
+def load_lineup(lineup_path, ledger):
+    if not os.path.exists(lineup_path):
+        raise Exception("Lineup file does not exist at: " + lineup_path)
+    with open(lineup_path, "rb") as f:
+        raw = f.read()
+    if raw.startswith(LINEUP_MAGIC):
+        data = decode_lineup(raw)
+    else:
+        data = json.loads(raw)
+    lineup = Lineup([], [], ledger)
+    lineup.load_data(data)
+    return lineup
@@ -0,0 +1,167 @@
+from settings import PROBE_BACKEND, PROBE_WORKERS
+from container_probe import probe_headers
+from storage import atomic_write
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
+
+# Bump when probes return new fields, older cache entries are probed again
+PROBE_CACHE_VERSION = 2
+
+
+def probe_video(path):
+    # Open the video once and read the stream properties used on export.
+    # OpenCV takes a long time to import, so only load it on first use.
+    import cv2
+
+    vcap = cv2.VideoCapture(path)
+    try:
+        if not vcap.isOpened():
+            return None
+        fps = vcap.get(cv2.CAP_PROP_FPS)
+        frame_count = vcap.get(cv2.CAP_PROP_FRAME_COUNT)
+        fourcc = int(vcap.get(cv2.CAP_PROP_FOURCC))
+        # Orientation and sample aspect are only reported by newer builds
+        rotation = 0
+        if hasattr(cv2, "CAP_PROP_ORIENTATION_META"):
+            rotation = int(vcap.get(cv2.CAP_PROP_ORIENTATION_META))
+        sample_aspect = 1.0
+        if hasattr(cv2, "CAP_PROP_SAR_NUM"):
+            sar_num = vcap.get(cv2.CAP_PROP_SAR_NUM)
+            sar_den = vcap.get(cv2.CAP_PROP_SAR_DEN)
+            if sar_num > 0 and sar_den > 0:
+                sample_aspect = sar_num / sar_den
+        return {
+            "width": vcap.get(cv2.CAP_PROP_FRAME_WIDTH),
+            "height": vcap.get(cv2.CAP_PROP_FRAME_HEIGHT),
+            "fps": fps,
+            "duration": frame_count / fps if fps else None,
+            "codec": "".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip("\x00"),
+            "rotation": rotation % 360,
+            "sample_aspect": sample_aspect,
+        }
+    finally:
+        vcap.release()
+
+
+def probe_video_headers(path):
+    # Parse container headers directly, OpenCV only for unknown containers
+    info = probe_headers(path)
+    if info is None:
+        return probe_video(path)
+    return info
+
+
+def export_video_info(info):
+    # Lineup fields for a probed video. resolution stays the coded size for
+    # older scripts, display_resolution is how it shows once the sample
+    # aspect and rotation are applied.
+    width = round(info["width"] * info["sample_aspect"])
+    height = round(info["height"])
+    if info["rotation"] in (90, 270):
+        width, height = height, width
+    return {
+        "resolution": [info["width"], info["height"]],
+        "display_resolution": [width, height],
+        "rotation": info["rotation"],
+        "sample_aspect": info["sample_aspect"],
+    }
+
+
+PROBE_BACKENDS = {
+    "header": probe_video_headers,
+    "opencv": probe_video,
+}
+
+
+class ProbeCache:
+    # Media probe results keyed by path, reused while size and mtime match.
+    # entries skips reading cache_path when its contents are already known,
+    # such as from a session snapshot.
+    def __init__(self, cache_path=None, backend=PROBE_BACKEND, entries=None):
+        if backend not in PROBE_BACKENDS:
+            raise Exception(f"Unknown probe backend: {backend}")
+        self.cache_path = cache_path
+        self.probe = PROBE_BACKENDS[backend]
+        self.entries = {}
+        self.dirty = False
+        if entries is not None:
+            self.entries = entries
+        elif cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                # A broken cache only costs a re-probe
+                self.entries = {}
+
+    def get(self, path):
+        if not path:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        entry = self.entries.get(path)
+        if (
+            entry
+            and entry.get("version") == PROBE_CACHE_VERSION
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime_ns
+        ):
+            return entry["info"]
+
+        info = self.probe(path)
+        self.entries[path] = {
+            "version": PROBE_CACHE_VERSION,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "info": info,
+        }
+        self.dirty = True
+        return info
+
+    def get_many(self, paths, max_workers=PROBE_WORKERS, progress=None, pool=None):
+        # Probe each distinct path on a bounded pool, a failing file only
+        # lands in errors instead of aborting the rest. progress gets the
+        # fraction done, anything it raises cancels the remaining probes.
+        # pool is an executor shared with other callers, used instead of a
+        # pool of max_workers for this call alone.
+        unique_paths = list(dict.fromkeys(path for path in paths if path))
+        if not unique_paths:
+            return {}, {}
+        if pool is None:
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+                return self.probe_on(pool, unique_paths, progress)
+        return self.probe_on(pool, unique_paths, progress)
+
+    def probe_on(self, pool, unique_paths, progress):
+        results = {}
+        errors = {}
+        futures = {pool.submit(self.get, path): path for path in unique_paths}
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    errors[path] = e
+                if progress:
+                    progress(done / len(futures))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        # Completion order varies, hand results back in the order asked for
+        results = {path: results[path] for path in unique_paths if path in results}
+        errors = {path: errors[path] for path in unique_paths if path in errors}
+        return results, errors
+
+    def save(self):
+        if not self.cache_path or not self.dirty:
+            return
+        self.dirty = False
+        # Copy first, probes on other threads may still be adding entries
+        atomic_write(self.cache_path, json.dumps(dict(self.entries)))
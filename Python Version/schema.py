@@ -0,0 +1,279 @@
+from settings import DJ_KEY, PROMO_KEY, JOURNAL_KEY
+
+# Validation of ledger and lineup files before anything is built from them.
+# Every field is checked by hand, one validator per kind of entry. A
+# validator returns None when the value is valid, otherwise a list of
+# (path parts, message) with paths relative to the value. Paths are only
+# built for errors.
+
+# Exact types, so a bool never passes for a number as it would with isinstance
+JSON_TYPES = {
+    "object": {dict},
+    "array": {list},
+    "string": {str},
+    "number": {int, float},
+    "integer": {int},
+    "boolean": {bool},
+    "null": {type(None)},
+}
+
+OPTIONAL_STRING = frozenset({str, type(None)})
+NUMBER = frozenset(JSON_TYPES["number"])
+
+# Optional string fields of each kind of entry, besides the required name
+LEDGER_DJ_FIELDS = ("logo_path", "recording_path", "rtmp_server", "stream_key")
+LEDGER_PROMO_FIELDS = ("path",)
+# Lineups are either saved (names and live flags) or exported with the
+# ledger fields filled in, both only need names to load
+LINEUP_DJ_FIELDS = ("url", "recording_path", "logo_path")
+LINEUP_PROMO_FIELDS = ("path",)
+
+
+class SchemaError(Exception):
+    # Every problem found in one pass, as "<json path>: <message>"
+    def __init__(self, what, errors):
+        self.errors = errors
+        shown = "\n".join(errors[:10])
+        more = f"\n...and {len(errors) - 10} more" if len(errors) > 10 else ""
+        super().__init__(f"Invalid {what}, {len(errors)} error(s):\n{shown}{more}")
+
+
+def format_path(parts, root="$"):
+    return root + "".join(
+        f"[{part}]" if isinstance(part, int) else f".{part}" for part in parts
+    )
+
+
+def add_error(errors, parts, message):
+    if errors is None:
+        errors = []
+    errors.append((parts, message))
+    return errors
+
+
+def add_errors(errors, part, found):
+    # Errors of a nested value, with their paths prefixed by its key or index
+    if errors is None:
+        errors = []
+    errors += [((part,) + parts, message) for parts, message in found]
+    return errors
+
+
+def type_error(expected, value):
+    return [((), f"expected {expected}, found {type_name(value)}")]
+
+
+def check_required(errors, value, keys):
+    for key in keys:
+        if key not in value:
+            errors = add_error(errors, (key,), "is required")
+    return errors
+
+
+def check_name(errors, entry):
+    # A required, non empty string
+    if "name" not in entry:
+        return add_error(errors, ("name",), "is required")
+    name = entry["name"]
+    if type(name) is not str:
+        return add_error(errors, ("name",), "expected string, found " + type_name(name))
+    if not name:
+        return add_error(errors, ("name",), "must be at least 1 character(s)")
+    return errors
+
+
+def check_entry(entry, fields):
+    # An object with a name and optional string fields
+    if type(entry) is not dict:
+        return None, type_error("object", entry)
+    errors = check_name(None, entry)
+    for key in fields:
+        if key in entry and type(entry[key]) not in OPTIONAL_STRING:
+            errors = add_error(
+                errors, (key,), "expected string or null, found " + type_name(entry[key])
+            )
+    return entry, errors
+
+
+def validate_ledger_dj(entry):
+    entry, errors = check_entry(entry, LEDGER_DJ_FIELDS)
+    if entry is None or "last_live_resolution" not in entry:
+        return errors
+    # "" until a live set has been seen, then [width, height]
+    resolution = entry["last_live_resolution"]
+    if type(resolution) is list:
+        if len(resolution) < 2:
+            errors = add_error(
+                errors,
+                ("last_live_resolution",),
+                f"expected at least 2 item(s), found {len(resolution)}",
+            )
+        if len(resolution) > 2:
+            errors = add_error(
+                errors,
+                ("last_live_resolution",),
+                f"expected at most 2 item(s), found {len(resolution)}",
+            )
+        for index, size in enumerate(resolution):
+            if type(size) not in NUMBER:
+                errors = add_error(
+                    errors,
+                    ("last_live_resolution", index),
+                    "expected number, found " + type_name(size),
+                )
+    elif type(resolution) not in OPTIONAL_STRING:
+        errors = add_error(
+            errors,
+            ("last_live_resolution",),
+            "expected string or array or null, found " + type_name(resolution),
+        )
+    return errors
+
+
+def validate_ledger_promo(entry):
+    return check_entry(entry, LEDGER_PROMO_FIELDS)[1]
+
+
+def validate_lineup_dj(entry):
+    return check_entry(entry, LINEUP_DJ_FIELDS)[1]
+
+
+def validate_lineup_promo(entry):
+    return check_entry(entry, LINEUP_PROMO_FIELDS)[1]
+
+
+def validate_journal(value):
+    # Written by ledger_journal.py, the journal records the snapshot already holds
+    if type(value) is not dict:
+        return type_error("object", value)
+    errors = check_required(None, value, ("id", "seq"))
+    if "id" in value:
+        record_id = value["id"]
+        if type(record_id) is not str:
+            errors = add_error(errors, ("id",), "expected string, found " + type_name(record_id))
+        elif not record_id:
+            errors = add_error(errors, ("id",), "must be at least 1 character(s)")
+    if "seq" in value and type(value["seq"]) is not int:
+        errors = add_error(errors, ("seq",), "expected integer, found " + type_name(value["seq"]))
+    return errors
+
+
+def check_entries(errors, data, key, validate_entry):
+    # The array at data[key], every entry valid and every name unique
+    if key not in data:
+        return errors
+    entries = data[key]
+    if type(entries) is not list:
+        return add_errors(errors, key, type_error("array", entries))
+    names = set()
+    for index, entry in enumerate(entries):
+        found = validate_entry(entry)
+        if found:
+            errors = add_errors(errors, key, add_errors(None, index, found))
+        if type(entry) is dict:
+            name = entry.get("name")
+            if type(name) is str:
+                if name in names:
+                    errors = add_error(errors, (key, index, "name"), f"duplicate name {name!r}")
+                names.add(name)
+    return errors
+
+
+def check_document(data, entry_validators, value_validators):
+    # A ledger or lineup, an object holding an array per kind of entry
+    if type(data) is not dict:
+        return type_error("object", data)
+    errors = check_required(None, data, entry_validators)
+    for key, validate_entry in entry_validators.items():
+        errors = check_entries(errors, data, key, validate_entry)
+    for key, validate_value in value_validators.items():
+        if key in data:
+            found = validate_value(data[key])
+            if found:
+                errors = add_errors(errors, key, found)
+    return errors
+
+
+# Validators for the entries of each top level array, and for other values
+LEDGER_ENTRIES = {DJ_KEY: validate_ledger_dj, PROMO_KEY: validate_ledger_promo}
+LEDGER_VALUES = {JOURNAL_KEY: validate_journal}
+LINEUP_ENTRIES = {DJ_KEY: validate_lineup_dj, PROMO_KEY: validate_lineup_promo}
+
+
+def validate_ledger(data):
+    return check_document(data, LEDGER_ENTRIES, LEDGER_VALUES)
+
+
+def validate_lineup(data):
+    return check_document(data, LINEUP_ENTRIES, {})
+
+
+def type_name(value):
+    for name, types in JSON_TYPES.items():
+        if type(value) in types:
+            return name
+    return type(value).__name__
+
+
+def check_data(validator, data, what):
+    # Raise one SchemaError listing everything wrong with data
+    errors = validator(data)
+    if errors:
+        raise SchemaError(what, [f"{format_path(parts)}: {message}" for parts, message in errors])
+
+
+class StreamValidator:
+    # Checks a document's top level arrays one entry at a time, for loaders
+    # that never hold the whole document. Invalid entries are reported by
+    # check_entry and should be skipped, other top level values by
+    # check_value. finish raises for everything found.
+    def __init__(self, what, entry_validators, value_validators):
+        self.what = what
+        self.required = list(entry_validators)
+        self.item_validators = entry_validators
+        self.value_validators = value_validators
+        self.counts = {}
+        self.seen = {}
+        self.errors = []
+
+    def check_entry(self, key, entry):
+        index = self.counts.get(key, 0)
+        self.counts[key] = index + 1
+        validator = self.item_validators.get(key)
+        if validator is None:
+            return True
+        entry_errors = validator(entry)
+        if entry_errors:
+            self.errors += [
+                f"{format_path((key, index) + parts)}: {message}"
+                for parts, message in entry_errors
+            ]
+            return False
+        seen = self.seen.setdefault(key, set())
+        name = entry["name"]
+        if name in seen:
+            self.errors.append(f"{format_path((key, index, 'name'))}: duplicate name {name!r}")
+            return False
+        seen.add(name)
+        return True
+
+    def check_value(self, key, value):
+        validator = self.value_validators.get(key)
+        if validator is None:
+            return True
+        value_errors = validator(value)
+        if value_errors:
+            self.errors += [
+                f"{format_path((key,) + parts)}: {message}" for parts, message in value_errors
+            ]
+            return False
+        return True
+
+    def finish(self, array_keys):
+        # array_keys are the top level keys that held an array
+        for key in self.required:
+            if key not in array_keys:
+                self.errors.append(f"{format_path((key,))}: is required and must be an array")
+        if self.errors:
+            raise SchemaError(self.what, self.errors)
+
@@ -0,0 +1,133 @@
+from ledger import Ledger
+from ledger_sqlite import SqliteLedger
+from lineup import Lineup
+from storage import atomic_write
+
+from contextlib import contextmanager
+import gc
+import io
+import os
+import pickle
+import struct
+
+# The last session's ledger, lineup and probe results in one file, so the next
+# launch restores them with one read instead of parsing and validating the
+# files they came from again. A snapshot is only used while those files still
+# have the size and mtime recorded for them, edits made since the last save
+# come back with it.
+#
+# Layout: magic, version (u16), then a pickle of the session dict. Entries are
+# stored as plain tuples and the reader refuses anything but builtin values,
+# bump SNAPSHOT_VERSION on any change to what the dict holds.
+
+SNAPSHOT_MAGIC = b"SHZS"
+SNAPSHOT_VERSION = 1
+
+HEADER = struct.Struct(">4sH")
+
+
+def file_stamp(path):
+    # (size, mtime in ns) standing in for a file's contents, None when missing
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+@contextmanager
+def paused_gc():
+    # Restoring creates a lot of objects and no cycles, collections triggered
+    # by the allocations alone would only walk them again and again
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class PlainUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"Session snapshots cannot hold {module}.{name}")
+
+
+def save_snapshot(snapshot_path, ledger, ledger_path, lineup, lineup_path, sources, probe_cache):
+    # sources maps each file the session was read from or last saved to onto
+    # its file_stamp at that time
+    if isinstance(ledger, SqliteLedger):
+        # The database is always current, only remember where it is
+        ledger_data = {"sqlite": ledger.db_path}
+    else:
+        ledger_data = {"rows": ledger.to_rows(), "journal_mark": ledger.journal_mark}
+    session = {
+        "sources": sources,
+        "ledger_path": ledger_path,
+        "ledger": ledger_data,
+        "lineup_path": lineup_path,
+        "lineup": lineup.to_rows(),
+        "probe_cache": {
+            "path": probe_cache.cache_path,
+            "stamp": file_stamp(probe_cache.cache_path) if probe_cache.cache_path else None,
+            "entries": dict(probe_cache.entries),
+        },
+    }
+    data = HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION)
+    data += pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL)
+    atomic_write(snapshot_path, data)
+
+
+def load_snapshot(snapshot_path):
+    # The session dict, or None when there is no usable snapshot or any of
+    # its sources changed since it was written
+    try:
+        with open(snapshot_path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        return None
+    if len(raw) < HEADER.size or HEADER.unpack_from(raw) != (SNAPSHOT_MAGIC, SNAPSHOT_VERSION):
+        return None
+    try:
+        f = io.BytesIO(raw)
+        f.seek(HEADER.size)
+        with paused_gc():
+            session = PlainUnpickler(f).load()
+    except Exception:
+        # A broken snapshot only costs opening the files again
+        return None
+    for path, stamp in session["sources"].items():
+        if file_stamp(path) != stamp:
+            return None
+    sqlite_path = session["ledger"].get("sqlite")
+    if sqlite_path and not os.path.exists(sqlite_path):
+        return None
+    return session
+
+
+def restore_ledger(session):
+    sqlite_path = session["ledger"].get("sqlite")
+    if sqlite_path:
+        return SqliteLedger(sqlite_path)
+    ledger = Ledger()
+    dj_rows, promo_rows = session["ledger"]["rows"]
+    with paused_gc():
+        ledger.load_rows(dj_rows, promo_rows)
+    ledger.journal_mark = session["ledger"]["journal_mark"]
+    return ledger
+
+
+def restore_lineup(session, ledger):
+    lineup = Lineup([], [], ledger)
+    dj_rows, promo_rows = session["lineup"]
+    lineup.load_rows(dj_rows, promo_rows)
+    return lineup
+
+
+def restore_probe_entries(session, cache_path):
+    # The probe cache entries saved with the session, None when cache_path
+    # has been written since and should be read instead
+    probe_cache = session["probe_cache"]
+    if probe_cache["path"] != cache_path or probe_cache["stamp"] != file_stamp(cache_path):
+        return None
+    return probe_cache["entries"]
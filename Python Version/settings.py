@@ -7,4 +7,27 @@ DJ_KEY = "djs"
 PROMO_KEY = "promos"
 LEDGERS_BACKUP = "ledgers_backup"
 LINEUP_BACKUP = "lineup_backup"
+BACKUP_CHUNK_ENTRIES = 16
+BACKUP_KEEP_LAST = 20
+BACKUP_KEEP_DAILY = 14
+BACKUP_KEEP_WEEKLY = 12
+PROBE_CACHE = "probe_cache.json"
+PROBE_WORKERS = 4
+PROBE_BACKEND = "header"
+LEDGER_LOAD_CHUNK = 500
+LEDGER_READ_SIZE = 1 << 16
+AUTOSAVE_DIR = "autosave"
+AUTOSAVE_DEBOUNCE = 2.0
+AUTOSAVE_CHECK_MS = 500
+TASK_WORKERS = 2
+TASK_POLL_MS = 50
+LINEUP_BINARY_EXTENSION = ".shzl"
+LEDGER_JOURNAL = False
+JOURNAL_KEY = "journal"
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_COMPACT_BYTES = 1 << 20
+SQLITE_LEDGER_EXTENSIONS = (".db", ".sqlite")
+SQLITE_CACHE_ENTRIES = 256
+RESTORE_SESSION = True
+SESSION_SNAPSHOT = "session.snapshot"
 RTMP_BASE = "anisonhijack.com/live/"
\ No newline at end of file
@@ -1,15 +1,55 @@
 # Simple local GUI equiped python assistant to manage JSON files for Hijack events.
 # Provided as is, use at your own risk.
 # Contact linkcube @ Anison Hijack for assistance.
+import time
+
+IMPORTS_START = time.perf_counter()
+
 from ledger import Ledger
 from lineup import Lineup
+from media_probe import ProbeCache
+from loaders import load_ledger, load_lineup
+from ledger_journal import LedgerJournal
+from ledger_sqlite import SqliteLedger
+from ledger_journal import journal_path
+from session_snapshot import (
+    file_stamp,
+    save_snapshot,
+    load_snapshot,
+    restore_ledger,
+    restore_lineup,
+    restore_probe_entries,
+)
+from storage import atomic_write
+from backup_store import BackupStore
+from ledger_index import sort_by, sort_key, Descending
+from autosave import AutosaveWorker
+from tasks import TaskRunner, TaskCancelled
+from change_notifier import (
+    CHANGE_RENAME,
+    CHANGE_DELETE,
+    CHANGE_RESET,
+    KIND_DJ,
+    KIND_PROMO,
+)
 from settings import (
     SOFTWARE_VERSION,
     RTMP_VALUES,
     LEDGERS_BACKUP,
-    LINEUP_BACKUP
+    LINEUP_BACKUP,
+    PROBE_CACHE,
+    AUTOSAVE_DIR,
+    AUTOSAVE_CHECK_MS,
+    LINEUP_BINARY_EXTENSION,
+    LEDGER_JOURNAL,
+    SQLITE_LEDGER_EXTENSIONS,
+    RESTORE_SESSION,
+    SESSION_SNAPSHOT,
 )
 
+APP_IMPORTS_DONE = time.perf_counter()
+
+from bisect import bisect_left
 import json
 from functools import partial
 import importlib.util
@@ -17,8 +57,11 @@ from tkinter import *
 from tkinter import ttk
 from tkinter import filedialog
 import os
-import time
+import sys
+
+IMPORTS_DONE = time.perf_counter()
 
+# Only check that opencv is present, importing it is deferred to the first probe
 spec = importlib.util.find_spec("cv2")
 if spec is None:
     raise Exception(
@@ -26,31 +69,15 @@ if spec is None:
     )
 
 
-def load_ledger(ledger_path):
-    if not os.path.exists(ledger_path):
-        raise Exception("Ledger file does not exist at: " + ledger_path)
-    with open(ledger_path, "r") as f:
-        data = json.load(f)
-    ledger = Ledger()
-    ledger.load_data(data)
-    return ledger
-
-def load_lineup(lineup_path, ledger):
-    if not os.path.exists(lineup_path):
-        raise Exception("Lineup file does not exist at: " + lineup_path)
-    with open(lineup_path, "r") as f:
-        data = json.load(f)
-    lineup = Lineup([], [], ledger)
-    lineup.load_data(data)
-    return lineup
-
-
 # tkinter GUI
 
 
 class ShizuApp(Tk):
     def __init__(self):
+        self.startup_timings = []
+        self.startup_mark = time.perf_counter()
         Tk.__init__(self)
+        self.mark_startup("Tk root")
 
         self.geometry("800x920")
         self.title("Shizu Assistance")
@@ -58,8 +85,20 @@ class ShizuApp(Tk):
         style.configure("Treeview", rowheight=40)
         self.resizable(0, 0)
 
-        self.ledger = Ledger()
-        self.lineup = Lineup([], [], self.ledger)
+        self.autosave = AutosaveWorker()
+        self.autosave.start()
+        self.checking_writes = False
+        self.shown_journal_error = None
+        self.tasks = TaskRunner(self)
+        self.ledger = None
+        self.lineup = None
+        self.journal = None
+        # Files the ledger and lineup were read from or last saved to, as
+        # (path, file_stamp) or None
+        self.ledger_source = None
+        self.lineup_source = None
+        session_message = self.restore_session()
+        self.mark_startup("Session")
 
         # Setup page frames
         self.container_frame = Frame(self)
@@ -69,7 +108,7 @@ class ShizuApp(Tk):
 
         bottom_label_frame = Frame(self, background="Black")
         info_label = Label(bottom_label_frame, fg="yellow", bg="black")
-        self.info_stringvar = StringVar(value="...")
+        self.info_stringvar = StringVar(value=session_message or "...")
         info_label["textvariable"] = self.info_stringvar
         info_label.pack(side="left")
 
@@ -79,6 +118,7 @@ class ShizuApp(Tk):
             frame = FrameClass(parent=self.container_frame, controller=self)
             self.frames[page_name] = frame
             frame.grid(row=0, column=0, sticky="nsew")
+            self.mark_startup(page_name)
 
         bottom_label_frame.pack(fill=X)
         self.navigate_to_page("HomePage")
@@ -95,6 +135,7 @@ class ShizuApp(Tk):
         menu_file.add_command(label="Save Ledger", command=self.save_ledger)
         menu_file.add_command(label="Open Lineup", command=self.open_lineup)
         menu_file.add_command(label="Export Lineup", command=self.export_lineup)
+        menu_file.add_command(label="Cancel Running Tasks", command=self.cancel_tasks)
         menu_file.add_separator()
         menu_file.add_command(label="Reset Data", command=self.create_ledger)
         menu_file.add_command(label="Close", command=self.close_app)
@@ -115,6 +156,76 @@ class ShizuApp(Tk):
         menu_help.add_command(label="About", command=self.open_about)
         menu_help.add_command(label="There is no more help")
         self["menu"] = menubar
+        self.protocol("WM_DELETE_WINDOW", self.close_app)
+        self.mark_startup("Menus")
+
+    def restore_session(self):
+        # Pick up where the last session's snapshot left off while the files
+        # it came from are unchanged, otherwise start empty. Returns a status
+        # message, None for a plain start.
+        snapshot_path = os.path.join(os.getcwd(), SESSION_SNAPSHOT)
+        probe_cache_path = os.path.join(os.getcwd(), PROBE_CACHE)
+        session = load_snapshot(snapshot_path) if RESTORE_SESSION else None
+        message = None
+        probe_entries = None
+        self.set_ledger(Ledger())
+        self.set_lineup(Lineup([], [], self.ledger))
+        if session is None and RESTORE_SESSION and os.path.exists(snapshot_path):
+            message = "Files from the last session changed, open them again"
+        elif session is not None:
+            try:
+                ledger = restore_ledger(session)
+                self.set_ledger(ledger)
+                self.set_lineup(restore_lineup(session, ledger))
+                self.ledger_source = self.make_source(session["ledger_path"])
+                self.lineup_source = self.make_source(session["lineup_path"])
+                if session["ledger_path"]:
+                    self.set_journal(session["ledger_path"])
+                probe_entries = restore_probe_entries(session, probe_cache_path)
+                message = f"Restored {len(ledger.djs)} DJs and {len(ledger.promos)} promos"
+            except Exception as e:
+                self.set_ledger(Ledger())
+                self.set_lineup(Lineup([], [], self.ledger))
+                message = f"Could not restore the last session: {e}"
+        self.probe_cache = ProbeCache(probe_cache_path, entries=probe_entries)
+        return message
+
+    def make_source(self, path):
+        if path is None:
+            return None
+        return (path, file_stamp(path))
+
+    def save_session(self):
+        # Run at exit once nothing else writes the ledger or probe cache
+        sources = dict(source for source in (self.ledger_source, self.lineup_source) if source)
+        ledger_path = self.ledger_source[0] if self.ledger_source else None
+        if isinstance(self.ledger, SqliteLedger):
+            # Changes with every edit, and is read again on restore anyway
+            sources.pop(ledger_path, None)
+        elif self.journal:
+            # Compacting rewrote the ledger file during the session
+            sources[ledger_path] = file_stamp(ledger_path)
+            sources[journal_path(ledger_path)] = file_stamp(journal_path(ledger_path))
+        self.probe_cache.save()
+        try:
+            save_snapshot(
+                os.path.join(os.getcwd(), SESSION_SNAPSHOT),
+                self.ledger,
+                ledger_path,
+                self.lineup,
+                self.lineup_source[0] if self.lineup_source else None,
+                sources,
+                self.probe_cache,
+            )
+        except OSError:
+            # Only costs opening the files again next time
+            pass
+
+    def mark_startup(self, label):
+        # Record the time spent since the previous startup checkpoint
+        now = time.perf_counter()
+        self.startup_timings.append((label, now - self.startup_mark))
+        self.startup_mark = now
     
     def open_about(self):
         from tkinter import messagebox
@@ -127,66 +238,269 @@ class ShizuApp(Tk):
         frame.tkraise()
         self.current_frame = page_name
 
-    def create_ledger(self):
-        self.ledger = Ledger()
-        self.lineup = Lineup([], [], self.ledger)
+    def set_ledger(self, ledger):
+        # Swap in a ledger and follow its changes
+        if self.journal:
+            self.journal.stop()
+            self.journal = None
+        if self.ledger:
+            self.ledger.unsubscribe(self.on_ledger_changed)
+        self.ledger = ledger
+        self.ledger.subscribe(self.on_ledger_changed)
+        if self.lineup:
+            self.lineup.ledger = ledger
+
+    def set_journal(self, ledger_path):
+        # With journaling on, log every ledger edit beside the ledger file
+        # instead of waiting for a save
+        if self.journal:
+            self.journal.stop()
+            self.journal = None
+        if LEDGER_JOURNAL and not isinstance(self.ledger, SqliteLedger):
+            self.journal = LedgerJournal(self.ledger, ledger_path)
+            self.journal.start()
+
+    def set_lineup(self, lineup):
+        if self.lineup:
+            self.lineup.unsubscribe(self.on_lineup_changed)
+        self.lineup = lineup
+        self.lineup.subscribe(self.on_lineup_changed)
+
+    def on_ledger_changed(self, events):
+        # Keep lineup entries pointing at renamed ledger entries
+        with self.lineup.batch():
+            for event in events:
+                if event.action != CHANGE_RENAME:
+                    continue
+                if event.kind == KIND_DJ and self.lineup.has_dj(event.name):
+                    self.lineup.rename_dj(event.name, event.new_name)
+                elif event.kind == KIND_PROMO and self.lineup.has_promo(event.name):
+                    self.lineup.rename_promo(event.name, event.new_name)
+        self.frames["LedgerPage"].apply_events(events)
+        # The journal or database already holds every edit
+        if self.is_edit(events) and self.journal:
+            self.check_writes_soon()
+        elif self.is_edit(events) and not isinstance(self.ledger, SqliteLedger):
+            self.schedule_autosave("ledger.json", self.ledger.save)
+
+    def on_lineup_changed(self, events):
+        self.frames["LineupPage"].apply_events(events)
+        if self.is_edit(events):
+            self.schedule_autosave("lineup.json", self.lineup.save)
+
+    def schedule_autosave(self, file_name, serialize):
+        self.autosave.schedule(os.path.join(os.getcwd(), AUTOSAVE_DIR, file_name), serialize)
+        self.check_writes_soon()
+
+    def check_writes_soon(self):
+        if not self.checking_writes:
+            self.checking_writes = True
+            self.after(AUTOSAVE_CHECK_MS, self.check_writes)
+
+    def check_writes(self):
+        # Autosaves and journal compactions fail on their own threads, report
+        # them from the Tk thread while writes are pending
+        journal = self.journal
+        busy = self.autosave.busy() or bool(journal and journal.busy())
+        errors = self.autosave.take_errors()
+        if errors:
+            target_file, error = errors[-1]
+            self.info_stringvar.set(f"Autosave of {os.path.basename(target_file)} failed: {error}")
+        error = journal.last_error if journal else None
+        if error is not None and error is not self.shown_journal_error:
+            self.shown_journal_error = error
+            self.info_stringvar.set(f"Could not write the ledger journal: {error}")
+        if busy:
+            self.after(AUTOSAVE_CHECK_MS, self.check_writes)
+        else:
+            self.checking_writes = False
 
-    def open_ledger(self):
-        self.ledger = load_ledger(filedialog.askopenfilename())
-        self.lineup.ledger = self.ledger
+    def is_edit(self, events):
+        # Loading a file is not worth autosaving
+        return any(event.action != CHANGE_RESET for event in events)
+
+    def reload_frames(self):
         for _, frame in self.frames.items():
             frame.reload()
+
+    def create_ledger(self):
+        self.set_ledger(Ledger())
+        self.set_lineup(Lineup([], [], self.ledger))
+        self.ledger_source = None
+        self.lineup_source = None
+        self.reload_frames()
+
+    def open_ledger(self):
+        ledger_path = filedialog.askopenfilename()
+        if ledger_path:
+            self.tasks.submit(
+                "Loading ledger",
+                lambda task: load_ledger(ledger_path, task.report),
+                on_done=partial(self.ledger_loaded, ledger_path),
+                on_progress=self.show_task_progress,
+                on_error=self.task_failed,
+            )
+
+    def ledger_loaded(self, ledger_path, task, ledger):
+        self.set_ledger(ledger)
+        self.ledger_source = self.make_source(ledger_path)
+        self.set_journal(ledger_path)
+        self.reload_frames()
+        self.info_stringvar.set(f"Loaded {len(ledger.djs)} DJs and {len(ledger.promos)} promos")
     
     def open_lineup(self):
-        self.lineup = load_lineup(filedialog.askopenfilename(), self.ledger)
-        for _, frame in self.frames.items():
-            frame.reload()
+        lineup_path = filedialog.askopenfilename()
+        if lineup_path:
+            ledger = self.ledger
+            self.tasks.submit(
+                "Loading lineup",
+                lambda task: load_lineup(lineup_path, ledger),
+                on_done=partial(self.lineup_loaded, lineup_path),
+                on_error=self.task_failed,
+            )
+
+    def lineup_loaded(self, lineup_path, task, lineup):
+        self.set_lineup(lineup)
+        self.lineup_source = self.make_source(lineup_path)
+        self.reload_frames()
+        if lineup.missing:
+            self.info_stringvar.set(
+                f"Lineup loaded, left out {len(lineup.missing)} entries not in the ledger: "
+                + ", ".join(lineup.missing)
+            )
+        else:
+            self.info_stringvar.set("Lineup loaded")
 
     def save_ledger(self):
         target_file = filedialog.askopenfilename()
-        if target_file:
-            data = self.ledger.save()
-            with open(target_file, "w") as f:
-                f.write(data)
-            backup_path = os.path.join(os.getcwd(), LEDGERS_BACKUP)
-            if not os.path.isdir(backup_path):
-                os.mkdir(backup_path)
-            with open(os.path.join(backup_path, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.path.split(target_file)[1]}"), 'w') as f:
-                f.write(data)
+        if not target_file:
+            return
+        if target_file.lower().endswith(SQLITE_LEDGER_EXTENSIONS):
+            if isinstance(self.ledger, SqliteLedger) and os.path.abspath(
+                target_file
+            ) == os.path.abspath(self.ledger.db_path):
+                self.info_stringvar.set("Ledger saved, edits are written to it as they are made")
+                return
+            self.tasks.submit(
+                "Saving ledger",
+                partial(self.save_sqlite_ledger_task, self.ledger, target_file),
+                on_done=lambda task, result: self.info_stringvar.set("Ledger saved"),
+                on_error=self.task_failed,
+            )
+            return
+        if self.journal and os.path.abspath(target_file) == os.path.abspath(
+            self.journal.ledger_path
+        ):
+            # Every edit is saved already, fold the journal into the file
+            self.journal.compact()
+            self.tasks.submit(
+                "Saving ledger",
+                partial(self.compact_ledger_task, self.journal),
+                on_done=lambda task, result: self.info_stringvar.set("Ledger saved"),
+                on_error=self.task_failed,
+            )
+            return
+        self.tasks.submit(
+            "Saving ledger",
+            partial(self.save_ledger_task, self.ledger, target_file),
+            on_done=partial(self.ledger_saved, target_file),
+            on_error=self.task_failed,
+        )
+
+    def save_ledger_task(self, ledger, target_file, task):
+        data = ledger.save()
+        atomic_write(target_file, data)
+        self.backup(LEDGERS_BACKUP, target_file, data)
+
+    def save_sqlite_ledger_task(self, ledger, target_file, task):
+        # Replaces whatever the database held, as saving over a file would
+        sqlite_ledger = SqliteLedger(target_file)
+        try:
+            sqlite_ledger.load_data(json.loads(ledger.save()))
+        finally:
+            sqlite_ledger.close()
+
+    def compact_ledger_task(self, journal, task):
+        journal.compactor.join()
+        if journal.last_error:
+            raise journal.last_error
+        self.backup(LEDGERS_BACKUP, journal.ledger_path, journal.written)
+
+    def ledger_saved(self, target_file, task, result):
+        self.ledger_source = self.make_source(target_file)
+        self.set_journal(target_file)
+        self.info_stringvar.set("Ledger saved")
 
     def export_lineup(self):
         target_file = filedialog.askopenfilename()
         if target_file:
-            data = self.lineup.export()
-            with open(target_file, "w") as f:
-                f.write(data)
-            backup_path = os.path.join(os.getcwd(), LINEUP_BACKUP)
-            if not os.path.isdir(backup_path):
-                os.mkdir(backup_path)
-            with open(os.path.join(backup_path, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.path.split(target_file)[1]}"), 'w') as f:
-                f.write(data)
+            self.tasks.submit(
+                "Exporting lineup",
+                partial(self.export_lineup_task, self.lineup, target_file),
+                on_done=partial(self.lineup_exported, target_file),
+                on_progress=self.show_task_progress,
+                on_error=self.task_failed,
+            )
+
+    def export_lineup_task(self, lineup, target_file, task):
+        if target_file.endswith(LINEUP_BINARY_EXTENSION):
+            data, probe_errors = lineup.export_binary(self.probe_cache, progress=task.report)
+        else:
+            data, probe_errors = lineup.export(self.probe_cache, progress=task.report)
+        self.probe_cache.save()
+        atomic_write(target_file, data)
+        self.backup(LINEUP_BACKUP, target_file, data)
+        return probe_errors
+
+    def lineup_exported(self, target_file, task, probe_errors):
+        # Exported lineups load back as the same lineup
+        self.lineup_source = self.make_source(target_file)
+        if probe_errors:
+            self.info_stringvar.set(
+                f"Could not probe {len(probe_errors)} file(s): "
+                + ", ".join(os.path.basename(path) for path in probe_errors)
+            )
+        else:
+            self.info_stringvar.set("Lineup exported")
+
+    def show_task_progress(self, task, progress):
+        self.info_stringvar.set(f"{task.name}... {progress:.0%}")
+
+    def task_failed(self, task, error):
+        if isinstance(error, TaskCancelled):
+            self.info_stringvar.set(f"{task.name} cancelled")
+        else:
+            self.info_stringvar.set(f"{task.name} failed: {error}")
+
+    def cancel_tasks(self):
+        self.tasks.cancel_all()
+
+    def backup(self, backup_dir, target_file, data):
+        store = BackupStore(os.path.join(os.getcwd(), backup_dir))
+        store.add(os.path.basename(target_file), data)
+        store.prune()
 
     def create_dj_entry(self):
         new_dj_name = self.ledger.create_dj_entry()
         ledger_frame = self.frames["LedgerPage"]
-        if self.current_frame == "LedgerPage":
-            ledger_frame.reload()
-        else:
+        if self.current_frame != "LedgerPage":
             self.navigate_to_page("LedgerPage")
         ledger_frame.open_dj_edit_window(new_dj_name)
 
     def create_promo_entry(self):
         new_promo_name = self.ledger.create_promo_entry()
         ledger_frame = self.frames["LedgerPage"]
-        if self.current_frame == "LedgerPage":
-            ledger_frame.reload()
-        else:
+        if self.current_frame != "LedgerPage":
             self.navigate_to_page("LedgerPage")
         ledger_frame.open_promo_edit_window(new_promo_name)
 
-    def get_ledger_treeview_values(self):
+    def get_ledger_treeview_values(self, search=""):
         if self.ledger:
-            return self.ledger.to_treeview_values()
+            if not search:
+                return self.ledger.to_treeview_values()
+            return self.ledger.to_treeview_values(
+                self.ledger.query_djs(text=search), self.ledger.query_promos(text=search)
+            )
 
     def get_lineup_treeview_values(self):
         if self.lineup:
@@ -194,6 +508,13 @@ class ShizuApp(Tk):
         return [], []
 
     def close_app(self):
+        self.tasks.shutdown()
+        self.autosave.stop()
+        if self.journal:
+            self.journal.stop()
+        self.save_session()
+        if isinstance(self.ledger, SqliteLedger):
+            self.ledger.close()
         self.destroy()
 
 
@@ -211,18 +532,6 @@ class PageFrame(Frame):
         # raise Exception("Not implemented")
 
 
-def treeview_sort_column(tv, col, reverse):
-    l = [(tv.set(k, col), k) for k in tv.get_children("")]
-    l.sort(reverse=reverse)
-
-    # rearrange items in sorted positions
-    for index, (val, k) in enumerate(l):
-        tv.move(k, "", index)
-
-    # reverse sort next time
-    tv.heading(col, command=lambda: treeview_sort_column(tv, col, not reverse))
-
-
 class PopupWindow(Toplevel):
     def __init__(self, parent):
         super().__init__(parent)
@@ -255,31 +564,19 @@ class TreeManagingPageFrame(PageFrame):
         self.dj_tree = ttk.Treeview(self, column=dj_columns, show="headings")
         self.promo_tree = ttk.Treeview(self, column=promo_columns, show="headings")
 
-        for col in dj_columns:
-            self.dj_tree.heading(
-                col,
-                text=col,
-                command=lambda _col=col: treeview_sort_column(
-                    self.dj_tree, _col, False
+        # Sorting is done on the rows from the model, as (column index, reverse)
+        self.sort_columns = {self.dj_tree: None, self.promo_tree: None}
+        for tree, columns in ((self.dj_tree, dj_columns), (self.promo_tree, promo_columns)):
+            for index, col in enumerate(columns):
+                tree.heading(
+                    col,
+                    text=col,
+                    command=partial(self.sort_tree, tree, index) if sortable else None,
                 )
-                if sortable
-                else None,
-            )
-            self.dj_tree.column(col, anchor=CENTER)
-
-        for col in promo_columns:
-            self.promo_tree.heading(
-                col,
-                text=col,
-                command=lambda _col=col: treeview_sort_column(
-                    self.promo_tree, _col, False
-                )
-                if sortable
-                else None,
-            )
-            self.promo_tree.column(col, anchor=CENTER)
+                tree.column(col, anchor=CENTER)
 
-        Label(self, text="DJ Entries").pack(fill=X, expand=True)
+        self.dj_label = Label(self, text="DJ Entries")
+        self.dj_label.pack(fill=X, expand=True)
         self.dj_tree.pack(fill=BOTH, expand=True)
         Label(self, text="Promotional Videos").pack(fill=X, expand=True)
         self.promo_tree.pack(fill=BOTH, expand=True)
@@ -287,6 +584,12 @@ class TreeManagingPageFrame(PageFrame):
         self.dj_tree.bind("<Double-1>", self.double_click_dj_tree)
         self.promo_tree.bind("<Double-1>", self.double_click_promo_tree)
         self.edit_window = None
+        # Rows currently shown in each tree, item id -> values, the items in
+        # display order, and each item's rank in the model order before sorting
+        self.view_models = {self.dj_tree: {}, self.promo_tree: {}}
+        self.display_order = {self.dj_tree: [], self.promo_tree: []}
+        self.ranks = {self.dj_tree: {}, self.promo_tree: {}}
+        self.next_rank = {self.dj_tree: 0, self.promo_tree: 0}
 
     def close_edit_window(self):
         self.edit_window.destroy()
@@ -316,11 +619,123 @@ class TreeManagingPageFrame(PageFrame):
         else:
             self.open_promo_edit_window(item)
 
+    def get_tree_rows(self):
+        # (item id, values) pairs for the dj and promo trees
+        return [], []
+
+    def sort_tree(self, tree, column):
+        # Sort by column, reversing when it is already sorted by it
+        sort_column = self.sort_columns[tree]
+        reverse = sort_column == (column, False)
+        self.sort_columns[tree] = (column, reverse)
+        ranks = self.ranks[tree]
+        self.show_rows(
+            tree, sorted(self.view_models[tree].items(), key=lambda row: ranks[row[0]])
+        )
+
+    def sort_rows(self, tree, rows):
+        if self.sort_columns[tree] is None:
+            return rows
+        column, reverse = self.sort_columns[tree]
+        return sort_by(rows, [values[column] for _, values in rows], reverse)
+
     def reload(self):
-        for i in self.dj_tree.get_children():
-            self.dj_tree.delete(i)
-        for i in self.promo_tree.get_children():
-            self.promo_tree.delete(i)
+        dj_rows, promo_rows = self.get_tree_rows()
+        self.show_rows(self.dj_tree, dj_rows)
+        self.show_rows(self.promo_tree, promo_rows)
+
+    def show_rows(self, tree, rows):
+        # rows are (item id, values) pairs in model order
+        self.ranks[tree] = {item: rank for rank, (item, _) in enumerate(rows)}
+        self.next_rank[tree] = len(rows)
+        self.sync_tree(tree, self.sort_rows(tree, rows))
+
+    def display_key(self, tree, item):
+        # Where item sorts among the shown rows, ranks break ties and make
+        # every key unique
+        rank = self.ranks[tree][item]
+        if self.sort_columns[tree] is None:
+            return (rank,)
+        column, reverse = self.sort_columns[tree]
+        key = sort_key(self.view_models[tree][item][column])
+        return (Descending(key) if reverse else key, rank)
+
+    def find_row(self, tree, item):
+        # Index of a shown item in display_order, by bisecting
+        return bisect_left(
+            self.display_order[tree],
+            self.display_key(tree, item),
+            key=partial(self.display_key, tree),
+        )
+
+    def remove_row(self, tree, item):
+        if item not in self.view_models[tree]:
+            return
+        del self.display_order[tree][self.find_row(tree, item)]
+        del self.view_models[tree][item]
+        del self.ranks[tree][item]
+        tree.delete(item)
+
+    def place_row(self, tree, item, values, rank=None):
+        # Show one row where it sorts, without touching the others. rank None
+        # keeps a shown item's rank and puts a new one last in model order.
+        values = tuple(values)
+        order = self.display_order[tree]
+        shown = item in self.view_models[tree]
+        if shown:
+            old_index = self.find_row(tree, item)
+            del order[old_index]
+            old_values = self.view_models[tree][item]
+        if rank is None:
+            rank = self.ranks[tree].get(item)
+        if rank is None:
+            rank = self.next_rank[tree]
+            self.next_rank[tree] += 1
+        self.ranks[tree][item] = rank
+        self.view_models[tree][item] = values
+        index = self.find_row(tree, item)
+        order.insert(index, item)
+        if not shown:
+            tree.insert("", index, item, text=item, values=values)
+            return
+        if index != old_index:
+            tree.move(item, "", index)
+        if old_values != values:
+            tree.item(item, values=values)
+
+    def sync_tree(self, tree, rows):
+        # Apply only the deletes, inserts, moves and value changes between the
+        # view model and the new rows instead of rebuilding the tree
+        old_rows = self.view_models[tree]
+        new_rows = {}
+        for item, values in rows:
+            new_rows[item] = tuple(values)
+
+        removed = [item for item in old_rows if item not in new_rows]
+        if removed:
+            tree.delete(*removed)
+
+        # Walk the displayed order, dragging moves items directly, alongside
+        # the new one. Once the first index rows are placed the tree holds
+        # them followed by the unplaced rest of order, so an item is already
+        # in place when it is the next unplaced one, anything else is moved.
+        positions = {item: index for index, item in enumerate(new_rows)}
+        order = [item for item in tree.get_children() if item in new_rows]
+        cursor = 0
+        for index, (item, values) in enumerate(new_rows.items()):
+            while cursor < len(order) and positions[order[cursor]] < index:
+                cursor += 1
+            if item not in old_rows:
+                tree.insert("", index, item, text=item, values=values)
+                continue
+            if cursor < len(order) and order[cursor] == item:
+                cursor += 1
+            else:
+                tree.move(item, "", index)
+            if old_rows[item] != values:
+                tree.item(item, values=values)
+        self.view_models[tree] = new_rows
+        self.display_order[tree] = list(new_rows)
 
 
 class LedgerDjEditWindow(PopupWindow):
@@ -427,7 +842,6 @@ class LedgerDjEditWindow(PopupWindow):
             self.rtmp_stringvar.get(),
             self.stream_key.get(),
         )
-        self.parent.reload()
         self.exit()
 
     def delete(self):
@@ -435,7 +849,6 @@ class LedgerDjEditWindow(PopupWindow):
         try:
             self.ledger_page.controller.lineup.remove_dj(self.original_data.name)
         finally:
-            self.ledger_page.reload()
             self.exit()
 
 
@@ -506,7 +919,6 @@ class LedgerPromoEditWindow(PopupWindow):
         self.controller.ledger.update_promo(
             self.original_data.name, self.promo_name.get(), self.recording_path.get()
         )
-        self.parent.reload()
         self.exit()
 
     def delete(self):
@@ -514,7 +926,6 @@ class LedgerPromoEditWindow(PopupWindow):
         try:
             self.controller.lineup.remove_promo(self.original_data.name)
         finally:
-            self.parent.reload()
             self.exit()
 
 
@@ -526,18 +937,69 @@ class LedgerPage(TreeManagingPageFrame):
         self.title = "Shizu Assistance - Ledger"
         self.info = "Manage DJ and promotional video data"
 
-    def reload(self):
-        super().reload()
+        search_frame = ttk.Frame(self)
+        Label(search_frame, text="Search:").pack(side=LEFT)
+        self.search = StringVar()
+        self.search.trace_add("write", lambda *_: self.reload())
+        ttk.Entry(search_frame, textvariable=self.search).pack(side=LEFT, fill=X, expand=True)
+        search_frame.pack(fill=X, before=self.dj_label)
 
-        dj_rows, promo_rows = self.controller.get_ledger_treeview_values()
-        for dj_values in dj_rows:
-            self.dj_tree.insert(
-                "", "end", dj_values[0], text=dj_values[0], values=dj_values
-            )
-        for promo_values in promo_rows:
-            self.promo_tree.insert(
-                "", "end", promo_values[0], text=promo_values[0], values=promo_values
-            )
+    def get_tree_rows(self):
+        dj_rows, promo_rows = self.controller.get_ledger_treeview_values(
+            self.search.get().strip()
+        )
+        return (
+            [(dj_values[0], dj_values) for dj_values in dj_rows],
+            [(promo_values[0], promo_values) for promo_values in promo_rows],
+        )
+
+    def apply_events(self, events):
+        # Place, update or remove only the rows the ledger events name, a
+        # reset reloads
+        if any(event.action == CHANGE_RESET for event in events):
+            self.reload()
+            return
+        ledger = self.controller.ledger
+        text = self.search.get().strip().lower()
+        for kind, tree, entries in (
+            (KIND_DJ, self.dj_tree, ledger.djs),
+            (KIND_PROMO, self.promo_tree, ledger.promos),
+        ):
+            # Name -> rank its row takes, None for its own or, if new, last
+            names = {}
+            for event in events:
+                if event.kind != kind:
+                    continue
+                if event.action == CHANGE_RENAME:
+                    rank = names.pop(event.name, None)
+                    if rank is None:
+                        rank = self.ranks[tree].get(event.name)
+                    self.remove_row(tree, event.name)
+                    if not ledger.renames_keep_place:
+                        rank = None
+                    elif rank is None and text:
+                        # Hidden by the search so far, where it goes among
+                        # the shown rows is unknown
+                        self.reload()
+                        return
+                    names[event.new_name] = rank
+                elif event.action == CHANGE_DELETE:
+                    names.pop(event.name, None)
+                    self.remove_row(tree, event.name)
+                else:
+                    names.setdefault(event.name, None)
+            if not names:
+                continue
+
+            shown = [name for name in names if name in entries and text in name.lower()]
+            for name in set(names).difference(shown):
+                self.remove_row(tree, name)
+            if kind == KIND_DJ:
+                rows = ledger.to_treeview_values(dj_names=shown, promo_names=[])[0]
+            else:
+                rows = ledger.to_treeview_values(dj_names=[], promo_names=shown)[1]
+            for values in rows:
+                self.place_row(tree, values[0], values, names[values[0]])
 
     def open_dj_edit_window(self, dj_name):
         self.edit_window = LedgerDjEditWindow(
@@ -612,12 +1074,10 @@ class LineupDjEditWindow(PopupWindow):
 
     def save(self):
         self.controller.lineup.update_dj(self.dj_name, self.is_live.get())
-        self.parent.reload()
         self.exit()
 
     def delete(self):
         self.controller.lineup.remove_dj(self.dj_name)
-        self.parent.reload()
         self.exit()
 
 
@@ -656,7 +1116,6 @@ class LineupPromoEditWindow(PopupWindow):
 
     def delete(self):
         self.controller.lineup.remove_promo(self.promo_name)
-        self.parent.reload()
         self.exit()
 
 
@@ -686,7 +1145,7 @@ class LineupPage(TreeManagingPageFrame):
     def open_dj_edit_window(self, dj_tree_item):
         dj_info = self.controller.lineup.get_dj_by_name(dj_tree_item)
         self.edit_window = LineupDjEditWindow(
-            self, self.controller.ledger.get_dj_by_name(dj_tree_item), dj_info[1]
+            self, self.controller.ledger.get_dj_by_name(dj_tree_item), dj_info.is_live
         )
         self.edit_window.protocol("WM_DELETE_WINDOW", self.close_edit_window)
 
@@ -730,18 +1189,58 @@ class LineupPage(TreeManagingPageFrame):
             self.changeOrder(target_widget, widget, tree_index, tree)
         self.config(cursor="arrow")
 
-    def reload(self):
-        super().reload()
-
+    def apply_events(self, events):
+        # Add, move, update or remove only the rows the lineup events name, a
+        # reset reloads. Rows follow the lineup's own positions, so the ranks
+        # used for sorting the ledger page are not kept here.
+        if any(event.action == CHANGE_RESET for event in events):
+            self.reload()
+            return
+        lineup = self.controller.lineup
+        for kind, tree, positions in (
+            (KIND_DJ, self.dj_tree, lineup.dj_index),
+            (KIND_PROMO, self.promo_tree, lineup.promo_index),
+        ):
+            names = set()
+            for event in events:
+                if event.kind == kind:
+                    names.add(event.name)
+                    if event.new_name is not None:
+                        names.add(event.new_name)
+            if not names:
+                continue
+
+            # With the named rows taken out the rest are in lineup order, so
+            # putting them back by ascending position lands each in place
+            view_model = self.view_models[tree]
+            detached = [name for name in names if name in view_model]
+            if detached:
+                tree.detach(*detached)
+            placed = sorted((positions[name], name) for name in names if name in positions)
+            for index, name in placed:
+                if kind == KIND_DJ:
+                    values = tuple(lineup.has_dj(name).to_treeview_values())
+                else:
+                    values = (name,)
+                if name in view_model:
+                    tree.move(name, "", index)
+                    if view_model[name] != values:
+                        tree.item(name, values=values)
+                else:
+                    tree.insert("", index, name, text=name, values=values)
+                view_model[name] = values
+            removed = [name for name in detached if name not in positions]
+            if removed:
+                tree.delete(*removed)
+                for name in removed:
+                    del view_model[name]
+
+    def get_tree_rows(self):
         dj_rows, promo_rows = self.controller.get_lineup_treeview_values()
-        for dj_values in dj_rows:
-            self.dj_tree.insert(
-                "", "end", dj_values[0], text=dj_values[0], values=dj_values
-            )
-        for promo_values in promo_rows:
-            self.promo_tree.insert(
-                "", "end", promo_values, text=promo_values, values=promo_values
-            )
+        return (
+            [(dj_values[0], dj_values) for dj_values in dj_rows],
+            [(promo_name, (promo_name,)) for promo_name in promo_rows],
+        )
 
 
 class HomePage(PageFrame):
@@ -840,6 +1339,27 @@ class HomePage(PageFrame):
 
 
 
-if __name__ == "__main__":
+def profile_startup():
+    # Print the launch time breakdown, then close without entering the main loop
     app = ShizuApp()
-    app.mainloop()
+    app.update()
+    app.mark_startup("First draw")
+
+    rows = [
+        ("Import app modules", APP_IMPORTS_DONE - IMPORTS_START),
+        ("Import tkinter and stdlib", IMPORTS_DONE - APP_IMPORTS_DONE),
+    ]
+    rows += app.startup_timings
+    for label, seconds in rows:
+        print(f"{label:<28}{seconds * 1000:9.1f} ms")
+    print(f"{'Total':<28}{sum(seconds for _, seconds in rows) * 1000:9.1f} ms")
+    print(f"cv2 imported: {'cv2' in sys.modules}")
+    app.destroy()
+
+
+if __name__ == "__main__":
+    if "--profile-startup" in sys.argv:
+        profile_startup()
+    else:
+        app = ShizuApp()
+        app.mainloop()
@@ -0,0 +1,152 @@
+# Command line use of the assistant, for preparing lineups without the GUI.
+# Usage: python shizu_cli.py export <ledger> <lineup> [<lineup> ...] --output-dir <dir>
+from settings import PROBE_CACHE, PROBE_WORKERS, LINEUP_BACKUP, LINEUP_BINARY_EXTENSION
+from loaders import load_ledger, load_lineup
+from lineup import video_paths
+from ledger_sqlite import SqliteLedger
+from media_probe import ProbeCache
+from backup_store import BackupStore
+from storage import atomic_write
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import time
+
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def output_path(lineup_path, output_dir, binary):
+    name = os.path.splitext(os.path.basename(lineup_path))[0]
+    return os.path.join(output_dir, name + (LINEUP_BINARY_EXTENSION if binary else ".json"))
+
+
+def export_lineups(args):
+    # Load the ledger once, probe the videos of every lineup together on one
+    # pool so a video shared by several lineups is probed once, then export
+    # each lineup from the warm probe cache. Returns the exit status.
+    targets = [output_path(path, args.output_dir, args.binary) for path in args.lineups]
+    if len(set(targets)) < len(targets):
+        raise Exception("Lineups with the same file name would overwrite each other's export")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    ledger = load_ledger(args.ledger)
+    print(
+        f"Loaded {len(ledger.djs)} DJs and {len(ledger.promos)} promos from {args.ledger}"
+        f" in {elapsed_ms(start):.1f} ms"
+    )
+    probe_cache = ProbeCache(args.probe_cache)
+    backups = None if args.no_backup else BackupStore(os.path.join(os.getcwd(), LINEUP_BACKUP))
+
+    # lineup path -> {"lineup", "load", "export", "probe_errors", "write", "error"}
+    results = {}
+    for path in args.lineups:
+        start = time.perf_counter()
+        try:
+            results[path] = {"lineup": load_lineup(path, ledger), "error": None}
+        except Exception as e:
+            results[path] = {"lineup": None, "error": e}
+        results[path]["load"] = elapsed_ms(start)
+    loaded = [result["lineup"] for result in results.values() if result["lineup"]]
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            start = time.perf_counter()
+            paths = []
+            for lineup in loaded:
+                paths += video_paths(*lineup.ledger_entries())
+            probes, _ = probe_cache.get_many(paths, pool=pool)
+            print(
+                f"Probed {len(probes)} videos for {len(loaded)} lineup(s)"
+                f" in {elapsed_ms(start):.1f} ms"
+            )
+
+            for path, target in zip(args.lineups, targets):
+                result = results[path]
+                lineup = result["lineup"]
+                if lineup is None:
+                    continue
+                try:
+                    start = time.perf_counter()
+                    if args.binary:
+                        data, result["probe_errors"] = lineup.export_binary(
+                            probe_cache, pool=pool
+                        )
+                    else:
+                        data, result["probe_errors"] = lineup.export(probe_cache, pool=pool)
+                    result["export"] = elapsed_ms(start)
+                    start = time.perf_counter()
+                    atomic_write(target, data)
+                    if backups:
+                        backups.add(os.path.basename(target), data)
+                    result["write"] = elapsed_ms(start)
+                except Exception as e:
+                    result["error"] = e
+        if backups:
+            backups.prune()
+    finally:
+        probe_cache.save()
+        if isinstance(ledger, SqliteLedger):
+            ledger.close()
+
+    print_summary(results)
+    return 1 if any(result["error"] for result in results.values()) else 0
+
+
+def print_summary(results):
+    print(f"{'lineup':<32}{'djs':>5}{'promos':>7}{'load':>10}{'export':>10}{'write':>10}")
+    for path, result in results.items():
+        lineup = result["lineup"]
+        name = os.path.basename(path)
+        if lineup is None or result["error"]:
+            print(f"{name:<32} failed: {result['error']}")
+            continue
+        print(
+            f"{name:<32}{len(lineup.dj_entries):>5}{len(lineup.promo_entries):>7}"
+            f"{result['load']:>7.1f} ms{result['export']:>7.1f} ms{result['write']:>7.1f} ms"
+        )
+        if lineup.missing:
+            print(
+                f"{'':<32} left out {len(lineup.missing)} entries not in the ledger: "
+                + ", ".join(lineup.missing)
+            )
+        probe_errors = result["probe_errors"]
+        if probe_errors:
+            print(
+                f"{'':<32} could not probe {len(probe_errors)} file(s): "
+                + ", ".join(os.path.basename(video) for video in probe_errors)
+            )
+
+
+COMMANDS = {
+    "export": export_lineups,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shizu Assistant without the GUI")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export lineups built from one ledger")
+    export_parser.add_argument("ledger")
+    export_parser.add_argument("lineups", nargs="+")
+    export_parser.add_argument(
+        "--output-dir", required=True, help="Where exports are written, named after each lineup"
+    )
+    export_parser.add_argument(
+        "--binary", action="store_true", help=f"Write {LINEUP_BINARY_EXTENSION} files"
+    )
+    export_parser.add_argument(
+        "--workers", type=int, default=PROBE_WORKERS, help="Videos probed at once"
+    )
+    export_parser.add_argument("--probe-cache", default=os.path.join(os.getcwd(), PROBE_CACHE))
+    export_parser.add_argument(
+        "--no-backup", action="store_true", help=f"Skip the copy kept in {LINEUP_BACKUP}"
+    )
+
+    args = parser.parse_args()
+    sys.exit(COMMANDS[args.command](args))
@@ -0,0 +1,94 @@
+from settings import TASK_WORKERS, TASK_POLL_MS
+
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import threading
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Task:
+    # Handed to the work function to report progress and notice cancellation
+    def __init__(self, name):
+        self.name = name
+        self.progress = None
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def report(self, progress):
+        # Also the point where a cancelled task stops
+        self.progress = progress
+        if self.cancel_event.is_set():
+            raise TaskCancelled(self.name)
+
+
+class TaskRunner:
+    # Runs work on worker threads and calls back on the Tk thread, polling
+    # with after() since Tk must only be touched from the thread running it
+    def __init__(self, root, max_workers=TASK_WORKERS, poll_ms=TASK_POLL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.running = []
+        self.polling = False
+
+    def submit(self, name, work, on_done=None, on_progress=None, on_error=None):
+        # work(task) runs on a worker, the callbacks run on the Tk thread
+        task = Task(name)
+        future = self.pool.submit(work, task)
+        self.running.append((task, future, on_done, on_progress, on_error))
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.poll_ms, self.poll)
+        return task
+
+    def poll(self):
+        # running is settled before any callback, which may submit more tasks
+        finished = []
+        still_running = []
+        for entry in self.running:
+            (finished if entry[1].done() else still_running).append(entry)
+        self.running = still_running
+        try:
+            for task, future, on_done, on_progress, on_error in still_running:
+                if on_progress and task.progress is not None:
+                    self.call(on_progress, task, task.progress)
+            for task, future, on_done, on_progress, on_error in finished:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if on_error:
+                        self.call(on_error, task, e)
+                    elif not isinstance(e, TaskCancelled):
+                        self.root.report_callback_exception(type(e), e, e.__traceback__)
+                else:
+                    if on_done:
+                        self.call(on_done, task, result)
+        finally:
+            if self.running:
+                self.root.after(self.poll_ms, self.poll)
+            else:
+                self.polling = False
+
+    def call(self, callback, *args):
+        # A failing callback is reported like any other Tk callback error,
+        # without skipping the rest or stopping the polling
+        try:
+            callback(*args)
+        except Exception:
+            self.root.report_callback_exception(*sys.exc_info())
+
+    def is_busy(self):
+        return bool(self.running)
+
+    def cancel_all(self):
+        for task, *_ in self.running:
+            task.cancel()
+
+    def shutdown(self):
+        self.cancel_all()
+        self.pool.shutdown(wait=False, cancel_futures=True)
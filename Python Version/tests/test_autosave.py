@@ -0,0 +1,44 @@
+from autosave import AutosaveWorker
+
+import time
+
+
+def wait_until_idle(worker, timeout=5):
+    deadline = time.monotonic() + timeout
+    while worker.busy():
+        assert time.monotonic() < deadline, "autosave never finished"
+        time.sleep(0.01)
+
+
+def test_failed_writes_are_kept_until_taken(tmp_path):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    worker = AutosaveWorker(debounce=0)
+    worker.start()
+    try:
+        worker.schedule(str(blocker / "ledger.json"), lambda: "{}")
+        worker.schedule(str(tmp_path / "autosave" / "lineup.json"), lambda: "{}")
+        wait_until_idle(worker)
+    finally:
+        worker.stop()
+
+    errors = worker.take_errors()
+    assert [target_file for target_file, _ in errors] == [str(blocker / "ledger.json")]
+    assert worker.take_errors() == []
+    assert (tmp_path / "autosave" / "lineup.json").read_text() == "{}"
+
+
+def test_a_burst_of_edits_ends_in_one_write(tmp_path):
+    writes = []
+    worker = AutosaveWorker(debounce=0.05)
+    worker.start()
+    try:
+        for index in range(5):
+            worker.schedule(
+                str(tmp_path / "lineup.json"), lambda index=index: writes.append(index) or "{}"
+            )
+        wait_until_idle(worker)
+    finally:
+        worker.stop()
+    assert writes == [4]
+    assert worker.take_errors() == []
@@ -0,0 +1,31 @@
+from backup_store import BackupStore
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+
+def make_ledger_text(size, edited):
+    return json.dumps(
+        {"djs": [{"name": f"dj-{i}", "key": f"{edited}-{i % 7}"} for i in range(size)]}
+    )
+
+
+def test_overlapping_saves_and_prunes_leave_every_version_readable(tmp_path):
+    backup_dir = str(tmp_path / "backup")
+    payloads = [make_ledger_text(400, edit) for edit in range(24)]
+
+    def save(index):
+        # A fresh store per save, as the app opens one for each backup
+        store = BackupStore(backup_dir)
+        version_id = store.add(f"ledger-{index % 3}.json", payloads[index])
+        store.prune(keep_last=2, keep_daily=0, keep_weekly=0)
+        return version_id
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(save, range(len(payloads))))
+
+    store = BackupStore(backup_dir)
+    versions = store.list_versions()
+    assert len(versions) == 6
+    for version_id in versions:
+        assert store.restore(version_id) in payloads
@@ -0,0 +1,126 @@
+from ledger import Ledger
+from ledger_journal import LedgerJournal, journal_path
+import ledger_journal
+from loaders import load_ledger
+
+import json
+import os
+import threading
+
+
+def write_ledger(path, size=5):
+    ledger = Ledger()
+    ledger.load_data(
+        {
+            "djs": [
+                {
+                    "name": f"dj-{i}",
+                    "logo_path": "",
+                    "recording_path": "",
+                    "rtmp_server": "",
+                    "stream_key": "",
+                    "last_live_resolution": "",
+                }
+                for i in range(size)
+            ],
+            "promos": [{"name": "promo", "path": "promo.mp4"}],
+        }
+    )
+    with open(path, "w") as f:
+        f.write(ledger.save())
+
+
+def test_starting_a_journal_leaves_the_ledger_file_alone(tmp_path):
+    ledger_path = str(tmp_path / "ledger.json")
+    write_ledger(ledger_path)
+    with open(ledger_path, "rb") as f:
+        before = f.read()
+
+    journal = LedgerJournal(load_ledger(ledger_path), ledger_path)
+    journal.start()
+    journal.stop()
+
+    with open(ledger_path, "rb") as f:
+        assert f.read() == before
+    assert not os.path.exists(journal_path(ledger_path))
+
+
+def test_first_change_compacts_and_later_changes_replay(tmp_path):
+    ledger_path = str(tmp_path / "ledger.json")
+    write_ledger(ledger_path)
+    ledger = load_ledger(ledger_path)
+    journal = LedgerJournal(ledger, ledger_path)
+    journal.start()
+
+    ledger.update_dj("dj-0", "dj-0", "logo.png", "", "japan", "first")
+    journal.compactor.join()
+    with open(ledger_path, "r") as f:
+        assert json.load(f)["journal"] == {"id": journal.id, "seq": 1}
+
+    ledger.update_dj("dj-1", "renamed", "", "", "us-west", "second")
+    ledger.delete_promo("promo")
+    journal.stop()
+    assert journal.last_error is None
+
+    reloaded = load_ledger(ledger_path)
+    assert reloaded.save() == ledger.save()
+    assert reloaded.get_dj_by_name("dj-0").stream_key == "first"
+    assert reloaded.get_dj_by_name("renamed").rtmp_server == "us-west"
+
+
+def test_changes_made_after_a_failed_compaction_are_written_by_the_next(tmp_path, monkeypatch):
+    ledger_path = str(tmp_path / "ledger.json")
+    write_ledger(ledger_path)
+    ledger = load_ledger(ledger_path)
+    journal = LedgerJournal(ledger, ledger_path)
+    journal.start()
+
+    def fail(path, data):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(ledger_journal, "atomic_write", fail)
+    ledger.update_dj("dj-0", "dj-0", "logo.png", "", "japan", "first")
+    journal.compactor.join()
+    assert isinstance(journal.last_error, OSError)
+    assert not journal.durable
+
+    monkeypatch.undo()
+    ledger.update_dj("dj-1", "renamed", "", "", "us-west", "second")
+    journal.compactor.join()
+    assert journal.last_error is None
+    ledger.delete_promo("promo")
+    journal.stop()
+
+    reloaded = load_ledger(ledger_path)
+    assert reloaded.save() == ledger.save()
+    assert reloaded.get_dj_by_name("dj-0").stream_key == "first"
+
+
+def test_compacting_while_a_compaction_runs_does_not_wait(tmp_path, monkeypatch):
+    ledger_path = str(tmp_path / "ledger.json")
+    write_ledger(ledger_path)
+    ledger = load_ledger(ledger_path)
+    journal = LedgerJournal(ledger, ledger_path)
+    journal.start()
+
+    release = threading.Event()
+    write = ledger_journal.atomic_write
+
+    def slow_write(path, data):
+        release.wait(5)
+        write(path, data)
+
+    monkeypatch.setattr(ledger_journal, "atomic_write", slow_write)
+    ledger.update_dj("dj-0", "dj-0", "logo.png", "", "japan", "first")
+    running = journal.compactor
+    # Logged while the first compaction writes, then carried into its journal
+    ledger.update_dj("dj-1", "renamed", "", "", "us-west", "second")
+    journal.compact()
+    assert journal.compactor is running and journal.busy()
+
+    release.set()
+    journal.stop()
+    assert journal.last_error is None
+    reloaded = load_ledger(ledger_path)
+    assert reloaded.save() == ledger.save()
+    assert reloaded.get_dj_by_name("renamed").stream_key == "second"
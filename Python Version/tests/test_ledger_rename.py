@@ -0,0 +1,45 @@
+from ledger import Ledger
+from ledger_sqlite import SqliteLedger
+
+import pytest
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def ledger(request, tmp_path):
+    if request.param == "json":
+        yield Ledger()
+        return
+    ledger = SqliteLedger(str(tmp_path / "ledger.db"))
+    yield ledger
+    ledger.close()
+
+
+def test_renaming_onto_an_existing_name_raises(ledger):
+    first = ledger.create_dj_entry()
+    second = ledger.create_dj_entry()
+    promo = ledger.create_promo_entry()
+    other_promo = ledger.create_promo_entry()
+
+    with pytest.raises(Exception, match="already exists"):
+        ledger.rename_dj(first, second)
+    with pytest.raises(Exception, match="already exists"):
+        ledger.rename_promo(promo, other_promo)
+    with pytest.raises(Exception, match="already exists"):
+        ledger.update_dj(first, second, "logo.png", "", "japan", "key")
+    with pytest.raises(Exception, match="already exists"):
+        ledger.update_promo(promo, other_promo, "promo.mp4")
+
+    # Nothing changed, both entries of each kind are still there
+    assert ledger.get_dj_by_name(first).logo_path != "logo.png"
+    ledger.get_dj_by_name(second)
+    assert ledger.get_promo_by_name(promo).path != "promo.mp4"
+    ledger.get_promo_by_name(other_promo)
+
+
+def test_renaming_to_a_free_name(ledger):
+    name = ledger.create_dj_entry()
+    ledger.rename_dj(name, "renamed")
+    ledger.update_dj("renamed", "renamed", "logo.png", "", "japan", "key")
+    assert ledger.get_dj_by_name("renamed").logo_path == "logo.png"
+    with pytest.raises(Exception):
+        ledger.get_dj_by_name(name)
@@ -0,0 +1,117 @@
+from ledger import Ledger
+from lineup import Lineup
+from lineup_binary import encode_lineup, decode_lineup
+import lineup_binary
+from media_probe import ProbeCache
+from container_probe import make_info
+
+import json
+import os
+import sys
+
+import pytest
+
+# obs_hijack_script.py carries its own decoder, it runs here against the
+# obspython stand-in from obs_bench
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(REPO_ROOT, "obs_bench"))
+sys.path.insert(0, REPO_ROOT)
+import obs_hijack_script  # noqa: E402
+
+ROUND_TRIP_VALUES = [
+    None,
+    True,
+    False,
+    0,
+    -1,
+    (1 << 63) - 1,
+    -(1 << 63),
+    0.1,
+    -0.0,
+    1e308,
+    5e-324,
+    "",
+    "ｼｽﾞ DJ ✨ 日本語",
+    [],
+    {},
+    {"nested": [{"a": [1, 2.5, None]}, [], {"": "empty key"}], "ключ": "значение"},
+]
+
+
+@pytest.mark.parametrize("value", ROUND_TRIP_VALUES)
+def test_decode_inverts_encode(value):
+    assert decode_lineup(encode_lineup(value)) == value
+
+
+def test_integers_past_64_bits_are_rejected():
+    with pytest.raises(Exception, match="does not fit"):
+        encode_lineup({"value": 1 << 63})
+
+
+def test_obs_script_tags_match():
+    for name in ("MAGIC", "FORMAT_VERSION"):
+        script_value = getattr(obs_hijack_script, f"LINEUP_{name}")
+        assert script_value == getattr(lineup_binary, f"LINEUP_{name}")
+    for name in ("NONE", "FALSE", "TRUE", "INT", "FLOAT", "STR", "LIST", "DICT"):
+        script_value = getattr(obs_hijack_script, f"LINEUP_TAG_{name}")
+        assert script_value == getattr(lineup_binary, f"TAG_{name}")
+
+
+def make_lineup(directory):
+    # Recordings with and without probe data, live sets with and without a
+    # known resolution, unicode names and paths
+    ledger = Ledger()
+    recordings = []
+    for index, name in enumerate(["ｼｽﾞ", "DJ ✨", "plain", "Ünïcödé"]):
+        path = os.path.join(directory, f"{name}-{index}.mp4")
+        recordings.append(path)
+        ledger.load_entry(
+            "djs",
+            {
+                "name": name,
+                "logo_path": os.path.join(directory, f"{name}.png"),
+                "recording_path": path,
+                "rtmp_server": "japan",
+                "stream_key": f"key-{index}",
+                "last_live_resolution": [3840, 2160] if index == 1 else "",
+            },
+        )
+    ledger.load_entry("promos", {"name": "プロモ", "path": os.path.join(directory, "promo.mp4")})
+    ledger.load_entry("promos", {"name": "missing", "path": os.path.join(directory, "nope.mp4")})
+    for path in recordings[:2] + [os.path.join(directory, "promo.mp4")]:
+        with open(path, "wb") as f:
+            f.write(b"video")
+
+    lineup = Lineup([], [], ledger)
+    lineup.add_dj("ｼｽﾞ")
+    lineup.add_dj("DJ ✨", is_live=True)
+    lineup.add_dj("plain")
+    lineup.add_dj("Ünïcödé", is_live=True)
+    lineup.add_promo("プロモ")
+    lineup.add_promo("missing")
+    return lineup
+
+
+def fake_probe(path):
+    # Large and fractional values, with anamorphic pixels
+    return make_info(7680, 4320, 59.94, 1e7 / 3, "hevc", rotation=90, sample_aspect=4 / 3)
+
+
+def test_obs_script_reads_binary_export_as_json_export(tmp_path):
+    lineup = make_lineup(str(tmp_path))
+    probe_cache = ProbeCache()
+    probe_cache.probe = fake_probe
+
+    json_text, json_errors = lineup.export(probe_cache)
+    data, binary_errors = lineup.export_binary(probe_cache)
+    assert json_errors == binary_errors == {}
+    expected = json.loads(json_text)
+    assert "display_resolution" in expected["djs"][0]
+    assert "resolution" not in expected["djs"][2]
+    assert expected["djs"][3]["resolution"] == ""
+
+    binary_path = tmp_path / "lineup.shzl"
+    binary_path.write_bytes(data)
+    assert decode_lineup(data) == expected
+    assert obs_hijack_script.Hijack().load_binary_file(str(binary_path)) == expected
+    assert obs_hijack_script.Hijack().load_lineup_file(str(binary_path)) == expected
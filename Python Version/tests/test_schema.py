@@ -0,0 +1,48 @@
+from ledger import Ledger
+from lineup import Lineup
+from schema import SchemaError, check_data, validate_ledger
+
+import pytest
+
+
+def test_invalid_ledger_lists_every_error():
+    data = {
+        "djs": [
+            {"name": "a", "last_live_resolution": [1920, "1080"]},
+            {"name": "a", "logo_path": 3},
+            {"logo_path": None},
+            "b",
+        ],
+        "journal": {"id": "", "seq": True},
+    }
+
+    with pytest.raises(SchemaError) as raised:
+        check_data(validate_ledger, data, "ledger")
+    assert raised.value.errors == [
+        "$.promos: is required",
+        "$.djs[0].last_live_resolution[1]: expected number, found string",
+        "$.djs[1].logo_path: expected string or null, found number",
+        "$.djs[1].name: duplicate name 'a'",
+        "$.djs[2].name: is required",
+        "$.djs[3]: expected object, found string",
+        "$.journal.id: must be at least 1 character(s)",
+        "$.journal.seq: expected integer, found boolean",
+    ]
+
+
+def test_lineup_leaves_out_names_not_in_the_ledger():
+    ledger = Ledger()
+    dj = ledger.create_dj_entry()
+    promo = ledger.create_promo_entry()
+    lineup = Lineup([], [], ledger)
+
+    lineup.load_data(
+        {
+            "djs": [{"name": "gone"}, {"name": dj, "url": "rtmp://example"}],
+            "promos": [{"name": promo}, {"name": "old promo"}],
+        }
+    )
+
+    assert [(entry.name, entry.is_live) for entry in lineup.dj_entries] == [(dj, True)]
+    assert lineup.promo_entries == [promo]
+    assert lineup.missing == ["gone", "old promo"]
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_modules_used_at_startup_leave_cv2_unloaded(tmp_path):
+    # A stand-in cv2 first on the path, so importing it would be seen even
+    # where OpenCV is not installed
+    (tmp_path / "cv2.py").write_text("")
+    code = (
+        "import sys\n"
+        "import ledger, lineup, shizu_cli, loaders\n"
+        "assert 'cv2' not in sys.modules, 'cv2 was imported'\n"
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), APP_DIR]))
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=APP_DIR, env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
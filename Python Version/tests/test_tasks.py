@@ -0,0 +1,89 @@
+from tasks import TaskRunner
+
+from concurrent.futures import wait
+import threading
+
+
+class FakeRoot:
+    # Stands in for Tk: after() only queues, run_pending() plays the queue
+    def __init__(self):
+        self.pending = []
+        self.errors = []
+
+    def after(self, ms, callback):
+        self.pending.append(callback)
+
+    def report_callback_exception(self, exc_type, value, traceback):
+        self.errors.append(value)
+
+    def run_pending(self):
+        pending, self.pending = self.pending, []
+        for callback in pending:
+            callback()
+
+
+def run_until_idle(root, runner):
+    while root.pending:
+        wait([future for _, future, *_ in runner.running])
+        root.run_pending()
+
+
+def test_failing_callback_does_not_stop_later_tasks():
+    root = FakeRoot()
+    runner = TaskRunner(root)
+
+    def fail(task, result):
+        raise ValueError("callback failed")
+
+    runner.submit("first", lambda task: 1, on_done=fail)
+    run_until_idle(root, runner)
+    assert [str(error) for error in root.errors] == ["callback failed"]
+    assert not runner.is_busy()
+
+    results = []
+    runner.submit("second", lambda task: 2, on_done=lambda task, result: results.append(result))
+    run_until_idle(root, runner)
+    assert results == [2]
+    runner.shutdown()
+
+
+def test_failing_progress_and_error_callbacks_are_reported():
+    root = FakeRoot()
+    runner = TaskRunner(root)
+    release = threading.Event()
+
+    def work(task):
+        task.report(0.5)
+        release.wait()
+        raise KeyError("work failed")
+
+    def bad_progress(task, progress):
+        raise ValueError("progress failed")
+
+    def bad_error(task, error):
+        raise ValueError("error handler failed")
+
+    runner.submit("slow", work, on_progress=bad_progress, on_error=bad_error)
+    while runner.running[0][0].progress is None:
+        pass
+    root.run_pending()
+    release.set()
+    run_until_idle(root, runner)
+    assert [str(error) for error in root.errors] == ["progress failed", "error handler failed"]
+    assert not runner.is_busy()
+    runner.shutdown()
+
+
+def test_task_submitted_from_a_callback_runs():
+    root = FakeRoot()
+    runner = TaskRunner(root)
+    results = []
+
+    def chain(task, result):
+        runner.submit("next", lambda task: result + 1, on_done=lambda task, r: results.append(r))
+
+    runner.submit("first", lambda task: 1, on_done=chain)
+    run_until_idle(root, runner)
+    assert results == [2]
+    assert len(root.pending) == 0
+    runner.shutdown()
@@ -0,0 +1,90 @@
+# Times obs_hijack_script.py scene generation against the obspython stand-in
+# in this directory, on synthetic lineups.
+# Usage: python obs_bench/benchmark.py [--sizes 10 100 1000] [--mode reconcile]
+import obspython
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import obs_hijack_script  # noqa: E402
+
+
+def make_lineup(size, edited=False):
+    # Mix of recordings and live sets, logos and names, with a vj every fifth.
+    # edited changes the stream url of every tenth dj, as a small lineup edit.
+    djs = []
+    for i in range(size):
+        dj_entry = {
+            "name": f"dj-{i}",
+            "logo_path": f"C:/hijack/logos/dj-{i}.png" if i % 3 else "",
+            "resolution": [1920, 1080] if i % 4 else "",
+        }
+        if i % 2:
+            dj_entry["url"] = f"rtmp://live.example/dj-{i}"
+            if edited and i % 10 == 1:
+                dj_entry["url"] += "-2"
+        else:
+            dj_entry["recording_path"] = f"C:/hijack/recordings/dj-{i}.mp4"
+        if i % 5 == 0:
+            dj_entry["vj"] = f"vj-{i}"
+        djs.append(dj_entry)
+    promos = [
+        {"name": f"promo-{i}", "path": f"C:/hijack/promos/promo-{i}.mp4"}
+        for i in range(max(size // 10, 1))
+    ]
+    return {obs_hijack_script.DJ_KEY: djs, obs_hijack_script.PROMO_KEY: promos}
+
+
+def run(hijack, lineup_path, lineup_data):
+    with open(lineup_path, "w") as f:
+        json.dump(lineup_data, f)
+    obspython.calls.clear()
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        hijack.begin()
+    elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, output.getvalue()
+
+
+def report(label, elapsed, output):
+    leaked = obspython.leaked()
+    summary = [line for line in output.splitlines() if line.startswith(("Scene", "Generation"))]
+    print(f"  {label:<8} {elapsed:9.2f} ms, {sum(obspython.calls.values()):7} calls, {len(leaked)} leaked refs")
+    for line in summary:
+        print(f"           {line}")
+    for name, count in obspython.calls.most_common(5):
+        print(f"           {count:7} {name}")
+    for obs_object in leaked[:5]:
+        print(f"           leaked {obs_object} x{obs_object.refs}")
+    for error in obspython.errors[:5]:
+        print(f"           error {error}")
+
+
+def bench(args):
+    lineup_path = os.path.join(tempfile.mkdtemp(), "lineup.json")
+    for size in args.sizes:
+        obspython.reset()
+        obspython.add_scene(obs_hijack_script.OVERLAY_SCENE)
+        hijack = obs_hijack_script.Hijack()
+        hijack.lineup_path = lineup_path
+        hijack.reconcile = args.mode == "reconcile"
+        print(f"{size} djs, {args.mode}")
+
+        report("first", *run(hijack, lineup_path, make_lineup(size)))
+        report("same", *run(hijack, lineup_path, make_lineup(size)))
+        report("edited", *run(hijack, lineup_path, make_lineup(size, edited=True)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OBS scene generation benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--mode", choices=["reconcile", "full"], default="reconcile")
+    bench(parser.parse_args())
@@ -0,0 +1,336 @@
+# Stand-in for the obspython module OBS gives its scripts, so
+# obs_hijack_script.py can run outside of OBS. Every call is counted, and
+# references handed to the script are tracked so unreleased ones show up.
+# Only the parts of the API the hijack script uses are provided.
+from collections import Counter
+import json
+
+OBS_PATH_FILE = 0
+OBS_ORDER_MOVE_BOTTOM = 3
+
+calls = Counter()
+objects = []
+sources = {}
+timers = []
+errors = []
+
+
+def reset():
+    # Forget everything, as if OBS was started with an empty scene collection
+    calls.clear()
+    objects.clear()
+    sources.clear()
+    timers.clear()
+    errors.clear()
+
+
+def recorded(func):
+    def wrapper(*args):
+        calls[func.__name__] += 1
+        return func(*args)
+
+    wrapper.__name__ = func.__name__
+    return wrapper
+
+
+class ObsObject:
+    # refs only counts references held by the script, OBS' own are not modelled
+    def __init__(self, kind, refs=1):
+        self.kind = kind
+        self.refs = refs
+        objects.append(self)
+
+    def add_ref(self):
+        self.refs += 1
+        return self
+
+    def release(self):
+        self.refs -= 1
+        if self.refs < 0:
+            errors.append(f"{self} released more often than referenced")
+
+    def __repr__(self) -> str:
+        return f"<{self.kind} {getattr(self, 'name', '')}>"
+
+
+class ObsData(ObsObject):
+    def __init__(self, settings=None, refs=1):
+        super().__init__("data", refs)
+        self.settings = settings if settings is not None else {}
+
+
+class ObsSource(ObsObject):
+    def __init__(self, source_id, name, settings, kind="source"):
+        super().__init__(kind)
+        self.source_id = source_id
+        self.name = name
+        self.settings = settings
+        self.removed = False
+        sources[name] = self
+
+
+class ObsScene(ObsSource):
+    # OBS keeps a scene and its source apart, one object is enough here
+    def __init__(self, name):
+        super().__init__("scene", name, {}, kind="scene")
+        self.items = []
+
+
+class ObsSceneItem:
+    def __init__(self, scene, source):
+        self.scene = scene
+        self.source = source
+        self.pos = None
+        self.scale = None
+        self.alignment = None
+
+
+class vec2:
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+
+
+def add_scene(name):
+    # A scene the user made in OBS, without a reference held by the script
+    scene = ObsScene(name)
+    scene.refs = 0
+    return scene
+
+
+def leaked():
+    return [obs_object for obs_object in objects if obs_object.refs > 0]
+
+
+def run_timers():
+    # OBS calls timers every interval, here each is called once per run_timers
+    for callback in list(timers):
+        callback()
+
+
+def settings_of(data):
+    return data.settings if data is not None else {}
+
+
+def with_defaults(source_id, settings):
+    # OBS fills in keys the script never set, VLC marks each playlist item
+    if source_id == "vlc_source":
+        settings["playlist"] = [
+            {"selected": False, **playlist_item} for playlist_item in settings.get("playlist", [])
+        ]
+    return settings
+
+
+@recorded
+def obs_data_create():
+    return ObsData()
+
+
+@recorded
+def obs_data_create_from_json(json_string):
+    return ObsData(json.loads(json_string))
+
+
+@recorded
+def obs_data_release(data):
+    data.release()
+
+
+@recorded
+def obs_data_set_string(data, name, value):
+    data.settings[name] = value
+
+
+@recorded
+def obs_data_set_obj(data, name, obj):
+    data.settings[name] = obj.settings
+
+
+@recorded
+def obs_data_get_json(data):
+    return json.dumps(data.settings)
+
+
+@recorded
+def obs_data_get_string(data, name):
+    return data.settings.get(name, "")
+
+
+@recorded
+def obs_data_get_bool(data, name):
+    return data.settings.get(name, False)
+
+
+@recorded
+def obs_data_set_default_bool(data, name, value):
+    data.settings.setdefault(name, value)
+
+
+@recorded
+def obs_source_create(source_id, name, settings, hotkey_data):
+    return ObsSource(source_id, name, with_defaults(source_id, dict(settings_of(settings))))
+
+
+@recorded
+def obs_source_release(source):
+    source.release()
+
+
+@recorded
+def obs_source_remove(source):
+    source.removed = True
+    if sources.get(source.name) is source:
+        del sources[source.name]
+
+
+@recorded
+def obs_source_update(source, settings):
+    source.settings.update(with_defaults(source.source_id, dict(settings_of(settings))))
+
+
+@recorded
+def obs_source_get_settings(source):
+    return ObsData(dict(source.settings))
+
+
+@recorded
+def obs_source_get_name(source):
+    return source.name
+
+
+@recorded
+def obs_source_get_unversioned_id(source):
+    return source.source_id
+
+
+@recorded
+def obs_source_get_width(source):
+    # Nothing is ever rendered here
+    return 0
+
+
+@recorded
+def obs_source_get_height(source):
+    return 0
+
+
+@recorded
+def obs_get_source_by_name(name):
+    source = sources.get(name)
+    return source.add_ref() if source is not None else None
+
+
+@recorded
+def obs_scene_create(name):
+    return ObsScene(name)
+
+
+@recorded
+def obs_scene_release(scene):
+    scene.release()
+
+
+@recorded
+def obs_get_scene_by_name(name):
+    scene = sources.get(name)
+    if not isinstance(scene, ObsScene):
+        return None
+    return scene.add_ref()
+
+
+@recorded
+def obs_scene_get_source(scene):
+    return scene
+
+
+@recorded
+def obs_scene_from_source(source):
+    # None for any other kind of source, like OBS
+    return source if isinstance(source, ObsScene) else None
+
+
+@recorded
+def obs_scene_add(scene, source):
+    item = ObsSceneItem(scene, source)
+    scene.items.append(item)
+    return item
+
+
+@recorded
+def obs_scene_find_source(scene, name):
+    for item in scene.items:
+        if item.source.name == name and not item.source.removed:
+            return item
+    return None
+
+
+@recorded
+def obs_sceneitem_get_source(item):
+    return item.source
+
+
+@recorded
+def obs_sceneitem_set_pos(item, pos):
+    item.pos = (pos.x, pos.y)
+
+
+@recorded
+def obs_sceneitem_set_scale(item, scale):
+    item.scale = (scale.x, scale.y)
+
+
+@recorded
+def obs_sceneitem_set_alignment(item, alignment):
+    item.alignment = alignment
+
+
+@recorded
+def obs_sceneitem_set_order_position(item, position):
+    item.scene.items.remove(item)
+    item.scene.items.insert(position, item)
+
+
+@recorded
+def obs_frontend_get_scenes():
+    return [
+        source.add_ref()
+        for source in sources.values()
+        if isinstance(source, ObsScene)
+    ]
+
+
+@recorded
+def source_list_release(source_list):
+    for source in source_list:
+        source.release()
+
+
+@recorded
+def timer_add(callback, milliseconds):
+    timers.append(callback)
+
+
+@recorded
+def timer_remove(callback):
+    if callback in timers:
+        timers.remove(callback)
+
+
+@recorded
+def obs_properties_create():
+    return []
+
+
+@recorded
+def obs_properties_add_path(props, name, description, path_type, filter, default_path):
+    props.append(name)
+
+
+@recorded
+def obs_properties_add_bool(props, name, description):
+    props.append(name)
+
+
+@recorded
+def obs_properties_add_button(props, name, text, callback):
+    props.append(name)
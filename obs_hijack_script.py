@@ -4,7 +4,10 @@
 
 import obspython as S
 import json
+import mmap
 import os
+import struct
+import time
 
 
 DJ_KEY = "djs"
@@ -13,22 +16,70 @@ TARGET_VIDEO_WIDTH = 1530
 TARGET_VIDEO_HEIGHT = 857
 OVERLAY_OFFSET_X = 20
 OVERLAY_OFFSET_Y = 20
+# Videos this close to the target's aspect fill it instead of being boxed
+ASPECT_TOLERANCE = 0.01
 
 OVERLAY_SCENE = "# - Overlay"
 STARTING_SCENE = "! - Starting"
 ENDING_SCENE = "! - Ending"
 PROMOS_SCENE = "promos"
 
+# From OBS c obs-defs.h
+ALIGN_RIGHT = 1 << 1
+ALIGN_BOTTOM = 1 << 3
+ALIGN_BOTTOM_RIGHT = ALIGN_RIGHT | ALIGN_BOTTOM
+
+TEXT_FONT_JSON = json.dumps({"face": "Arial", "style": "Regular", "size": 200, "flags": 0})
+
+# Marks the shared overlay in a scene plan, it is reused rather than created
+OVERLAY_SOURCE_ID = "overlay"
+PLACE_NONE = "none"
+PLACE_VIDEO = "video"
+PLACE_CORNER = "corner"
+PLACE_CORNER_TEXT = "corner_text"
+PLACE_FILL = "fill"
+
+# String fields of lineup entries, checked before any scene is generated
+LINEUP_STRING_FIELDS = {
+    DJ_KEY: ("logo_path", "recording_path", "url", "vj"),
+    PROMO_KEY: ("path",),
+}
+
+# Binary lineups written by the assistant, see lineup_binary.py there
+LINEUP_MAGIC = b"SHZL"
+LINEUP_FORMAT_VERSION = 1
+LINEUP_TAG_NONE = 0
+LINEUP_TAG_FALSE = 1
+LINEUP_TAG_TRUE = 2
+LINEUP_TAG_INT = 3
+LINEUP_TAG_FLOAT = 4
+LINEUP_TAG_STR = 5
+LINEUP_TAG_LIST = 6
+LINEUP_TAG_DICT = 7
+
+# Sources without a known size are checked this often, for about a minute
+RESCALE_INTERVAL_MS = 500
+RESCALE_ATTEMPTS = 120
+
+# Sources this script names after a dj's scene, the first two hold the video
+DJ_SOURCE_SUFFIXES = ("_recording", "_live", "_logo", "_text", "_vj")
+PROMOS_SCENE_NAME = "Promotional Videos"
+PROMOS_SOURCE = "promo_videos"
+
 
 class Hijack:
     lineup_path = None
+    reconcile = True
     render_width = 1920
     render_height = 1080
     overlay_scene = None
 
+    def __init__(self):
+        self.rescaler = DeferredRescale()
+
     def begin(self):        
         if self.lineup_path:
-            lineup_data = self.validate_json_file(self.lineup_path)
+            lineup_data = self.load_lineup_file(self.lineup_path)
         else:
             raise Exception("No lineup submitted")
         
@@ -38,10 +89,41 @@ class Hijack:
 
         print("Data processed! Beginning scene generation..")
 
-        self.generate_scenes(lineup)
+        counts = self.generate_scenes(lineup, self.reconcile)
 
-        print(f"Generation is done! {len(lineup)} scenes created.")
+        print(
+            f"Generation is done! {counts['created']} scenes created, {counts['updated']} updated,"
+            f" {counts['unchanged']} unchanged, {counts['removed']} removed,"
+            f" {counts['skipped']} skipped."
+        )
     
+    def load_lineup_file(self, path):
+        # Binary lineups are recognised by their magic, anything else is JSON
+        if not os.path.exists(path):
+            raise Exception("Supplied file does not exist at: " + path)
+        with open(path, 'rb') as f:
+            magic = f.read(len(LINEUP_MAGIC))
+        if magic == LINEUP_MAGIC:
+            return self.load_binary_file(path)
+        return self.validate_json_file(path)
+
+    def load_binary_file(self, path):
+        # Decode straight from the mapped file, only the strings are copied out
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                with memoryview(data) as view:
+                    version, key_count = struct.unpack_from(">HH", view, 4)
+                    if version > LINEUP_FORMAT_VERSION:
+                        raise Exception(f"Lineup format version {version} is newer than this script supports")
+                    offset = 8
+                    keys = []
+                    for _ in range(key_count):
+                        length = struct.unpack_from(">H", view, offset)[0]
+                        keys.append(str(view[offset + 2:offset + 2 + length], "utf-8"))
+                        offset += 2 + length
+                    value, _ = decode_lineup_value(view, offset, keys)
+                    return value
+
     def validate_json_file(self, path):
         # Validate file exists, and load JSON data
         if not os.path.exists(path):
@@ -50,8 +132,41 @@ class Hijack:
             data = json.load(f)
         return data
     
+    def check_lineup_data(self, lineup_data):
+        # Find every problem before any scene is touched, as "<json path>: <message>"
+        if not isinstance(lineup_data, dict):
+            return ["$: expected an object"]
+        errors = []
+        for key, fields in LINEUP_STRING_FIELDS.items():
+            entries = lineup_data.get(key)
+            if not isinstance(entries, list):
+                errors.append(f"$.{key}: expected an array")
+                continue
+            for index, entry in enumerate(entries):
+                path = f"$.{key}[{index}]"
+                if not isinstance(entry, dict):
+                    errors.append(f"{path}: expected an object")
+                    continue
+                if not isinstance(entry.get("name"), str) or not entry["name"]:
+                    errors.append(f"{path}.name: expected a non-empty string")
+                for field in fields:
+                    if not isinstance(entry.get(field, ""), (str, type(None))):
+                        errors.append(f"{path}.{field}: expected a string")
+                for field in ("resolution", "display_resolution"):
+                    value = entry.get(field)
+                    if value and not (
+                        isinstance(value, list)
+                        and len(value) == 2
+                        and all(isinstance(size, (int, float)) and size > 0 for size in value)
+                    ):
+                        errors.append(f"{path}.{field}: expected [width, height]")
+        return errors
+
     def init_lineup_data(self, lineup_data):
         # Initialize djs->promos scenes in memory
+        errors = self.check_lineup_data(lineup_data)
+        if errors:
+            raise Exception(f"Invalid lineup, {len(errors)} error(s):\n" + "\n".join(errors))
         lineup_scenes = []
         for dj_entry in lineup_data[DJ_KEY]:
             print(dj_entry)
@@ -63,6 +178,8 @@ class Hijack:
                 None,
                 dj_entry.get("resolution")
             )
+            dj_scene.display_resolution = dj_entry.get("display_resolution")
+            dj_scene.rotation = dj_entry.get("rotation") or 0
             if dj_entry.get("url"):
                 dj_scene.stream_url = dj_entry.get("url")
             else:
@@ -76,176 +193,425 @@ class Hijack:
 
         return lineup_scenes
 
-    def generate_scenes(self, lineup: list['ObsSceneValue']):
-        # Fetch static information
-        self.overlay_scene = S.obs_get_scene_by_name(OVERLAY_SCENE)
-        # Create scenes in OBS
-        for scene_values in lineup:
-            scene = S.obs_scene_create(scene_values.name)
-            # generate sources
-            if scene_values.is_dj:
-                self.setup_dj_scene_items(scene, scene_values)
-            else:
-                self.setup_promo_scene_items(scene, scene_values)
+    def generate_scenes(self, lineup: list['ObsSceneValue'], reconcile=False):
+        timer = StageTimer()
+
+        # Work out every source and its settings before touching OBS
+        plans = [self.plan_scene(scene_values) for scene_values in lineup]
+        timer.mark("prepare")
 
+        # Objects shared by every scene
+        self.overlay_scene = S.obs_get_scene_by_name(OVERLAY_SCENE)
+        overlay_source = S.obs_scene_get_source(self.overlay_scene)
+        font_data = S.obs_data_create_from_json(TEXT_FONT_JSON)
+        timer.mark("shared")
+
+        counts = {"created": 0, "updated": 0, "unchanged": 0, "removed": 0, "skipped": 0}
+        if reconcile:
+            # Leave scenes from an earlier run in place, only new ones are created below
+            counts["removed"] = self.remove_dropped_scenes({plan.name for plan in plans})
+            timer.mark("remove")
+            plans = self.reconcile_scenes(plans, overlay_source, font_data, counts)
+            timer.mark("reconcile")
+        counts["created"] = len(plans)
+
+        for plan in plans:
+            for source_plan in plan.sources:
+                if source_plan.source_id == OVERLAY_SOURCE_ID:
+                    source_plan.source = overlay_source
+                else:
+                    source_plan.source = self.create_source(source_plan, font_data)
+        timer.mark("sources")
+
+        for plan in plans:
+            scene = S.obs_scene_create(plan.name)
+            for source_plan in plan.sources:
+                item = S.obs_scene_add(scene, source_plan.source)
+                self.place_item(item, source_plan)
             S.obs_scene_release(scene)
+        timer.mark("scenes")
+
+        for plan in plans:
+            for source_plan in plan.sources:
+                if source_plan.source_id != OVERLAY_SOURCE_ID:
+                    S.obs_source_release(source_plan.source)
+                source_plan.source = None
+        S.obs_data_release(font_data)
         S.obs_scene_release(self.overlay_scene)
-    
-    def setup_dj_scene_items(self, scene, scene_values: 'ObsSceneValue'):
+        timer.mark("release")
+        print(f"Scene generation timings: {timer}")
+        return counts
+
+    def remove_dropped_scenes(self, planned_names):
+        # Remove scenes this script made that are no longer in the lineup,
+        # recognised by the video source every generated scene holds
+        removed = 0
+        scene_sources = S.obs_frontend_get_scenes()
+        for scene_source in scene_sources:
+            name = S.obs_source_get_name(scene_source)
+            if name in planned_names:
+                continue
+            scene = S.obs_scene_from_source(scene_source)
+            owned_names = [f"{name}{suffix}" for suffix in DJ_SOURCE_SUFFIXES]
+            if name == PROMOS_SCENE_NAME:
+                owned_names.append(PROMOS_SOURCE)
+            items = [S.obs_scene_find_source(scene, owned_name) for owned_name in owned_names]
+            if not any(items[:2]) and not (name == PROMOS_SCENE_NAME and items[-1]):
+                continue
+            for item in items:
+                if item:
+                    S.obs_source_remove(S.obs_sceneitem_get_source(item))
+            S.obs_source_remove(scene_source)
+            removed += 1
+        S.source_list_release(scene_sources)
+        return removed
+
+    def reconcile_scenes(self, plans, overlay_source, font_data, counts):
+        # Bring existing scenes up to date in place and return the plans of
+        # scenes that still need creating. Sources whose settings match are
+        # not touched, so their media stays open.
+        new_plans = []
+        for plan in plans:
+            scene_source = S.obs_get_source_by_name(plan.name)
+            if scene_source is None:
+                new_plans.append(plan)
+                continue
+            scene = S.obs_scene_from_source(scene_source)
+            if scene is None:
+                # A source that is not a scene already has this name, leave it alone
+                print(f"Skipped {plan.name}, a source that is not a scene has the same name")
+                S.obs_source_release(scene_source)
+                counts["skipped"] += 1
+                continue
+            changed = False
+            planned_names = {source_plan.name for source_plan in plan.sources}
+
+            # Sources the lineup no longer wants, e.g. a logo replaced by text
+            for suffix in DJ_SOURCE_SUFFIXES:
+                source_name = f"{plan.name}{suffix}"
+                item = S.obs_scene_find_source(scene, source_name)
+                if item and source_name not in planned_names:
+                    S.obs_source_remove(S.obs_sceneitem_get_source(item))
+                    changed = True
+
+            for position, source_plan in enumerate(plan.sources):
+                if self.reconcile_source(scene, position, source_plan, overlay_source, font_data):
+                    changed = True
+            S.obs_source_release(scene_source)
+            counts["updated" if changed else "unchanged"] += 1
+        return new_plans
+
+    def reconcile_source(self, scene, position, source_plan: 'ObsSourcePlan', overlay_source, font_data):
+        # Returns whether anything in the scene had to change. Added items go
+        # to position from the bottom, as new items otherwise land on top.
+        item = S.obs_scene_find_source(scene, source_plan.name)
+        if source_plan.source_id == OVERLAY_SOURCE_ID:
+            if item:
+                return False
+            S.obs_sceneitem_set_order_position(S.obs_scene_add(scene, overlay_source), position)
+            return True
+
+        source = S.obs_get_source_by_name(source_plan.name)
+        if source is not None and S.obs_source_get_unversioned_id(source) != source_plan.source_id:
+            # Same name but another kind of source, e.g. an unrelated user source
+            S.obs_source_remove(source)
+            S.obs_source_release(source)
+            source = None
+            item = None
+
+        if source is None:
+            source = self.create_source(source_plan, font_data)
+            source_plan.source = source
+            item = S.obs_scene_add(scene, source)
+            S.obs_sceneitem_set_order_position(item, position)
+            self.place_item(item, source_plan)
+            S.obs_source_release(source)
+            source_plan.source = None
+            return True
+
+        changed = False
+        existing_data = S.obs_source_get_settings(source)
+        existing = json.loads(S.obs_data_get_json(existing_data))
+        S.obs_data_release(existing_data)
+        if not settings_match(source_plan.settings, existing):
+            settings = S.obs_data_create_from_json(source_plan.settings_json)
+            S.obs_source_update(source, settings)
+            S.obs_data_release(settings)
+            changed = True
+        if not item:
+            item = S.obs_scene_add(scene, source)
+            S.obs_sceneitem_set_order_position(item, position)
+            changed = True
+        if changed:
+            source_plan.source = source
+            self.place_item(item, source_plan)
+            source_plan.source = None
+        S.obs_source_release(source)
+        return changed
+
+    def plan_scene(self, scene_values: 'ObsSceneValue'):
+        if scene_values.is_dj:
+            return ObsScenePlan(scene_values.name, self.plan_dj_sources(scene_values))
+        return ObsScenePlan(scene_values.name, self.plan_promo_sources(scene_values))
+
+    def plan_dj_sources(self, scene_values: 'ObsSceneValue'):
+        sources = []
         # Load recording or setup vlc stream
         if scene_values.recording_path:
-            video_source_name = f"{scene_values.name}_recording"
-            json_settings = {
-                "local_file": scene_values.recording_path,
-                "hw_decode": True
-            }
-            video_settings = S.obs_data_create_from_json(json.dumps(json_settings))
-            video_source = S.obs_source_create("ffmpeg_source", video_source_name, video_settings, None)
+            sources.append(ObsSourcePlan(
+                f"{scene_values.name}_recording",
+                "ffmpeg_source",
+                {"local_file": scene_values.recording_path, "hw_decode": True},
+                PLACE_VIDEO,
+                resolution=scene_values.resolution,
+                display_resolution=scene_values.display_resolution,
+                rotation=scene_values.rotation,
+            ))
         else:
-            video_source_name = f"{scene_values.name}_live"
-            json_settings = {
-                "playlist": [
-                    {
-                        "hidden": False,
-                        "value": scene_values.stream_url
-                    }
-                ]
-            }
-            video_settings = S.obs_data_create_from_json(json.dumps(json_settings))
-            video_source = S.obs_source_create("vlc_source", video_source_name, video_settings, None)
-
-        video_item = S.obs_scene_add(scene, video_source)
-
-        pos = S.vec2()
-        # Offset for overlay
-        pos.x = OVERLAY_OFFSET_X
-        pos.y = OVERLAY_OFFSET_Y
-        S.obs_sceneitem_set_pos(video_item, pos)
-        source_width = S.obs_source_get_width(video_source)
-        source_height = S.obs_source_get_height(video_source)
-        if scene_values.resolution:
-            source_width = scene_values.resolution[0]
-            source_height = scene_values.resolution[1]
-
-        # Fallback if no frame is rendered
-        if source_width == 0 or source_height == 0:
-            source_width = 1920
-            source_height = 1080
-        scale = S.vec2()
-        scale.x = TARGET_VIDEO_WIDTH / source_width
-        scale.y = TARGET_VIDEO_HEIGHT / source_height
-        S.obs_sceneitem_set_scale(video_item, scale)
-
-        S.obs_data_release(video_settings)
-        S.obs_source_release(video_source)
+            sources.append(ObsSourcePlan(
+                f"{scene_values.name}_live",
+                "vlc_source",
+                {"playlist": [{"hidden": False, "value": scene_values.stream_url}]},
+                PLACE_VIDEO,
+                resolution=scene_values.resolution,
+            ))
 
         # Insert overlay
-        S.obs_scene_add(scene, S.obs_scene_get_source(self.overlay_scene))
+        sources.append(ObsSourcePlan(OVERLAY_SCENE, OVERLAY_SOURCE_ID, None, PLACE_NONE))
 
-        # Load logo
+        # Load logo, or fall back to the name as text
         if scene_values.logo_path:
-            logo_source_name = f"{scene_values.name}_logo"
-            logo_settings = S.obs_data_create()
-            S.obs_data_set_string(logo_settings, "file", scene_values.logo_path)
-            logo_source = S.obs_source_create("image_source", logo_source_name, logo_settings, None)
-            logo_item = S.obs_scene_add(scene, logo_source)
-
-            # From OBS c obs-defs.h
-            align_right = 1 << 1
-            align_bottom = 1 << 3
-
-            alignment = align_right | align_bottom
-            S.obs_sceneitem_set_alignment(logo_item, alignment)
-
-            pos = S.vec2()
-            pos.x = self.render_width
-            pos.y = self.render_height
-            S.obs_sceneitem_set_pos(logo_item, pos)
-
-            S.obs_data_release(logo_settings)
-            S.obs_source_release(logo_source)
+            sources.append(ObsSourcePlan(
+                f"{scene_values.name}_logo",
+                "image_source",
+                {"file": scene_values.logo_path},
+                PLACE_CORNER,
+            ))
         else:
-            text_source_name = f"{scene_values.name}_text"
-            text_settings = S.obs_data_create()
-            S.obs_data_set_string(text_settings, "text", scene_values.name)
-            font_data_obj = S.obs_data_create_from_json(json.dumps({"face":"Arial","style":"Regular","size":200,"flags":0}))
-            S.obs_data_set_obj(text_settings, "font", font_data_obj)
-            text_source = S.obs_source_create("text_gdiplus", text_source_name, text_settings, None)
-            text_item = S.obs_scene_add(scene, text_source)
-
-            # From OBS c obs-defs.h
-            align_right = 1 << 1
-            align_bottom = 1 << 3
-
-            alignment = align_right | align_bottom
-            S.obs_sceneitem_set_alignment(text_item, alignment)
-
-            pos = S.vec2()
-            pos.x = self.render_width
-            pos.y = self.render_height
-            S.obs_sceneitem_set_pos(text_item, pos)
-
-            scale = S.vec2()
-            scale.x = 1
-            scale.y = 1
-            S.obs_sceneitem_set_scale(text_item, scale)
-
-            S.obs_data_release(text_settings)
-            S.obs_source_release(text_source)
-    
+            sources.append(ObsSourcePlan(
+                f"{scene_values.name}_text",
+                "text_gdiplus",
+                {"text": scene_values.name},
+                PLACE_CORNER_TEXT,
+            ))
+
         # Setup VJ
         if scene_values.vj:
-            text_source_name = f"{scene_values.name}_vj"
-            text_settings = S.obs_data_create()
-            S.obs_data_set_string(text_settings, "text", "VJ: " + scene_values.vj)
-            font_data_obj = S.obs_data_create_from_json(json.dumps({"face":"Arial","style":"Regular","size":200,"flags":0}))
-            S.obs_data_set_obj(text_settings, "font", font_data_obj)
-            text_source = S.obs_source_create("text_gdiplus", text_source_name, text_settings, None)
-            text_item = S.obs_scene_add(scene, text_source)
+            sources.append(ObsSourcePlan(
+                f"{scene_values.name}_vj",
+                "text_gdiplus",
+                {"text": "VJ: " + scene_values.vj},
+                PLACE_CORNER_TEXT,
+            ))
+        return sources
+
+    def plan_promo_sources(self, promotion: 'ObsPromoScene'):
+        # Load all promos into a single VLC playlist
+        playlist = [{"hidden": False, "value": path} for path in promotion.paths]
+        return [ObsSourcePlan(
+            PROMOS_SOURCE, "vlc_source", {"playlist": playlist}, PLACE_FILL
+        )]
+
+    def create_source(self, source_plan: 'ObsSourcePlan', font_data):
+        settings = S.obs_data_create_from_json(source_plan.settings_json)
+        if source_plan.source_id == "text_gdiplus":
+            S.obs_data_set_obj(settings, "font", font_data)
+        source = S.obs_source_create(source_plan.source_id, source_plan.name, settings, None)
+        S.obs_data_release(settings)
+        return source
+
+    def place_item(self, item, source_plan: 'ObsSourcePlan'):
+        if source_plan.placement == PLACE_VIDEO:
+            # No frame has been decoded yet, so trust the exported size. Live
+            # streams can differ from their last size and unprobed recordings
+            # have none, those are checked again once they render.
+            if source_plan.resolution:
+                # OBS scales the coded frame, turned by the media source for
+                # rotated videos, the display size only picks the box it fills
+                frame_width, frame_height = source_plan.resolution
+                if source_plan.rotation in (90, 270):
+                    frame_width, frame_height = frame_height, frame_width
+                set_video_scale(item, frame_width, frame_height, source_plan.display_resolution)
+            else:
+                set_video_scale(item, 1920, 1080)
+            if source_plan.source_id == "vlc_source" or not source_plan.resolution:
+                self.rescaler.add(source_plan.scene_name, source_plan.name)
+        elif source_plan.placement in (PLACE_CORNER, PLACE_CORNER_TEXT):
+            S.obs_sceneitem_set_alignment(item, ALIGN_BOTTOM_RIGHT)
+            S.obs_sceneitem_set_pos(item, make_vec2(self.render_width, self.render_height))
+            if source_plan.placement == PLACE_CORNER_TEXT:
+                S.obs_sceneitem_set_scale(item, make_vec2(1, 1))
+        elif source_plan.placement == PLACE_FILL:
+            S.obs_sceneitem_set_scale(item, make_vec2(1, 1))
+
+
+def settings_match(planned, existing):
+    # Only the keys the script plans are compared, OBS adds its own ones to
+    # saved settings, like selected on every VLC playlist item
+    if isinstance(planned, dict):
+        return isinstance(existing, dict) and all(
+            settings_match(value, existing.get(key)) for key, value in planned.items()
+        )
+    if isinstance(planned, list):
+        return (
+            isinstance(existing, list)
+            and len(planned) == len(existing)
+            and all(map(settings_match, planned, existing))
+        )
+    return planned == existing
+
+
+def decode_lineup_value(view, offset, keys):
+    tag = view[offset]
+    offset += 1
+    if tag == LINEUP_TAG_STR:
+        length = struct.unpack_from(">I", view, offset)[0]
+        offset += 4
+        return str(view[offset:offset + length], "utf-8"), offset + length
+    if tag == LINEUP_TAG_DICT:
+        count = struct.unpack_from(">I", view, offset)[0]
+        offset += 4
+        value = {}
+        for _ in range(count):
+            key = keys[struct.unpack_from(">H", view, offset)[0]]
+            value[key], offset = decode_lineup_value(view, offset + 2, keys)
+        return value, offset
+    if tag == LINEUP_TAG_LIST:
+        count = struct.unpack_from(">I", view, offset)[0]
+        offset += 4
+        value = []
+        for _ in range(count):
+            item, offset = decode_lineup_value(view, offset, keys)
+            value.append(item)
+        return value, offset
+    if tag == LINEUP_TAG_FLOAT:
+        return struct.unpack_from(">d", view, offset)[0], offset + 8
+    if tag == LINEUP_TAG_INT:
+        return struct.unpack_from(">q", view, offset)[0], offset + 8
+    if tag == LINEUP_TAG_NONE:
+        return None, offset
+    if tag == LINEUP_TAG_TRUE:
+        return True, offset
+    if tag == LINEUP_TAG_FALSE:
+        return False, offset
+    raise Exception(f"Invalid binary lineup, unknown tag {tag}")
+
+
+def set_video_scale(item, source_width, source_height, display_resolution=None):
+    # Scale a source rendering source_width x source_height frames into the
+    # video area, offset for the overlay. Frames whose display_resolution has
+    # another aspect than the area are fit inside it and centred.
+    box_width, box_height = TARGET_VIDEO_WIDTH, TARGET_VIDEO_HEIGHT
+    display_width, display_height = display_resolution or (source_width, source_height)
+    aspect = display_width / display_height
+    target_aspect = TARGET_VIDEO_WIDTH / TARGET_VIDEO_HEIGHT
+    if abs(aspect / target_aspect - 1) > ASPECT_TOLERANCE:
+        if aspect > target_aspect:
+            box_height = TARGET_VIDEO_WIDTH / aspect
+        else:
+            box_width = TARGET_VIDEO_HEIGHT * aspect
+    S.obs_sceneitem_set_pos(item, make_vec2(
+        OVERLAY_OFFSET_X + (TARGET_VIDEO_WIDTH - box_width) / 2,
+        OVERLAY_OFFSET_Y + (TARGET_VIDEO_HEIGHT - box_height) / 2
+    ))
+    S.obs_sceneitem_set_scale(item, make_vec2(
+        box_width / source_width,
+        box_height / source_height
+    ))
+
+
+def make_vec2(x, y):
+    vec = S.vec2()
+    vec.x = x
+    vec.y = y
+    return vec
+
+
+class DeferredRescale:
+    # Rescales video items once their source has rendered a frame and knows
+    # its size, polling on an OBS timer until every pending source is done
+    def __init__(self):
+        self.pending = {}
+        self.callback = self.tick
+
+    def add(self, scene_name, source_name):
+        if not self.pending:
+            S.timer_add(self.callback, RESCALE_INTERVAL_MS)
+        self.pending[(scene_name, source_name)] = RESCALE_ATTEMPTS
+
+    def tick(self):
+        for key, attempts in list(self.pending.items()):
+            scene_name, source_name = key
+            source = S.obs_get_source_by_name(source_name)
+            if source is None:
+                del self.pending[key]
+                continue
+            source_width = S.obs_source_get_width(source)
+            source_height = S.obs_source_get_height(source)
+            S.obs_source_release(source)
+
+            if source_width and source_height:
+                scene = S.obs_get_scene_by_name(scene_name)
+                if scene is not None:
+                    item = S.obs_scene_find_source(scene, source_name)
+                    if item:
+                        set_video_scale(item, source_width, source_height)
+                    S.obs_scene_release(scene)
+                del self.pending[key]
+            elif attempts <= 1:
+                # Never got a frame, e.g. a stream that is not live yet
+                del self.pending[key]
+            else:
+                self.pending[key] = attempts - 1
+        if not self.pending:
+            S.timer_remove(self.callback)
 
-            # From OBS c obs-defs.h
-            align_right = 1 << 1
-            align_bottom = 1 << 3
+    def stop(self):
+        if self.pending:
+            self.pending = {}
+            S.timer_remove(self.callback)
 
-            alignment = align_right | align_bottom
-            S.obs_sceneitem_set_alignment(text_item, alignment)
 
-            pos = S.vec2()
-            pos.x = self.render_width
-            pos.y = self.render_height
-            S.obs_sceneitem_set_pos(text_item, pos)
+class StageTimer:
+    def __init__(self):
+        self.stages = []
+        self.last = time.perf_counter()
 
-            scale = S.vec2()
-            scale.x = 1
-            scale.y = 1
-            S.obs_sceneitem_set_scale(text_item, scale)
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
 
-            S.obs_data_release(text_settings)
-            S.obs_source_release(text_source)
+    def __str__(self) -> str:
+        total = sum(seconds for _, seconds in self.stages)
+        stages = ", ".join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in self.stages)
+        return f"{stages}, total {total * 1000:.1f}ms"
 
 
-    def setup_promo_scene_items(self, scene, promotion: 'ObsPromoScene'):
-        # Load all promos into a single VLC playlist
-        video_source_name = f"promo_videos"
-        json_settings = {"playlist": []}
-        for path in promotion.paths:
-            json_settings["playlist"].append({
-                "hidden": False,
-                "value": path
-            })
-        promo_settings = S.obs_data_create_from_json(json.dumps(json_settings))
-        promo_source = S.obs_source_create("vlc_source", video_source_name, promo_settings, None)
-        promo_item = S.obs_scene_add(scene, promo_source)
-
-        pos = S.vec2()
-        pos.x = 0
-        pos.y = 0
-        scale = S.vec2()
-        scale.x = 1
-        scale.y = 1
-        S.obs_sceneitem_set_scale(promo_item, scale)
-        S.obs_data_release(promo_settings)
-        S.obs_source_release(promo_source)
+class ObsScenePlan:
+    def __init__(self, name, sources):
+        self.name = name
+        self.sources = sources
+        for source_plan in sources:
+            source_plan.scene_name = name
+
+
+class ObsSourcePlan:
+    # A source to create in a scene, settings are serialised once up front
+    def __init__(
+        self, name, source_id, settings, placement,
+        resolution=None, display_resolution=None, rotation=0
+    ):
+        self.name = name
+        self.source_id = source_id
+        self.settings = settings
+        self.settings_json = json.dumps(settings) if settings is not None else None
+        self.placement = placement
+        self.resolution = resolution
+        self.display_resolution = display_resolution
+        self.rotation = rotation
+        self.scene_name = None
+        self.source = None
 
 class ObsSceneValue:
     name = None
@@ -254,6 +620,8 @@ class ObsSceneValue:
     recording_path = None
     stream_url = None
     resolution = None
+    display_resolution = None
+    rotation = 0
     vj = None
 
     def __init__(self, name, is_dj, logo_path, recording_path, stream_url, resolution):
@@ -271,7 +639,7 @@ class ObsPromoScene(ObsSceneValue):
     def __init__(self, paths):
         self.paths = paths
         self.is_dj = False
-        self.name = "Promotional Videos"
+        self.name = PROMOS_SCENE_NAME
 
 
 hijack = Hijack()
@@ -283,12 +651,20 @@ def script_description():
 def update_lineup(props, prop):
     hijack.begin()
 
+def script_unload():
+    hijack.rescaler.stop()
+
+def script_defaults(settings):
+    S.obs_data_set_default_bool(settings, "_reconcile", True)
+
 def script_update(settings):
     hijack.lineup_path = S.obs_data_get_string(settings, "_lineup_path")
+    hijack.reconcile = S.obs_data_get_bool(settings, "_reconcile")
 
 def script_properties():  # ui
     props = S.obs_properties_create()
-    S.obs_properties_add_path(props, "_lineup_path", "Location of the Lineup:", S.OBS_PATH_FILE, "*.json", None)
+    S.obs_properties_add_path(props, "_lineup_path", "Location of the Lineup:", S.OBS_PATH_FILE, "Lineups (*.json *.shzl)", None)
+    S.obs_properties_add_bool(props, "_reconcile", "Only update changed scenes")
     S.obs_properties_add_button(
         props, "button", "Update Lineup", update_lineup
     )